@@ -1,35 +1,260 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""Create a sample of the OSM file
 
-import xml.etree.ElementTree as ET  # Use cElementTree or lxml if too slow
+Modes:
 
-OSM_FILE = "data/map.osm"  # Replace this with your osm file
-SAMPLE_FILE = "data/map_sample_2.osm"
+- every:      every k-th top level element (the original scheme);
+- reservoir:  n elements chosen uniformly (reservoir sampling);
+- stratified: n elements of each stratum, the element type (node, way, relation) or
+              its primary map feature (highway, building, ...).
+
+With --complete the nodes of the sampled ways and the members of the sampled relations
+(and the nodes of these ways) are added, so the sample has no reference to an element
+out of it. The elements are written in the order of the file.
+
+The reservoir and stratified modes read the file to choose the elements and again to
+write them, the last read stops when every element chosen was written. With --complete the
+references out of the file (common at the edges of an extract) are not known before the
+file is read, so the last read goes to the end of the file.
+
+With --fast the first elements are kept instead of a uniform choice, so --seed has no
+use, and the first read stops when the quotas are full. In an OSM file sorted by type the
+first elements of the reservoir mode are nodes. The stratified mode only stops early
+with --strata type, when the file has nodes, ways and relations, the strata by feature
+are not known before the end of the file and --fast is refused.
+
+The sample keeps the attributes of the <osm> element and its <bounds>, the speed in
+elements read per second is printed at the end.
+"""
+import argparse
+import pprint
+import random
+import time
+
+import osm_io
+import osm_parser
+from data_wrangling import PRIMARY_MAP_FEATURE
+
+OSM_FILE = "data/map.osm"  # Replace this with your osm file, it can be compressed (gz, bz2, zst or zip)
+SAMPLE_FILE = "data/map_sample_2.osm"  # ending with .gz, .bz2 or .zst the sample is compressed
 
 k = 20  # Parameter: take every k-th top level element
+BACKEND = None  # Parameter: osm_parser backend (lxml, expat or etree), None uses lxml if installed
+
+MODES = ['every', 'reservoir', 'stratified']
+STRATA = ['type', 'feature']
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+ROOT_ATTRIBUTES = ('version', 'generator', 'copyright', 'attribution', 'license')
+WRITE_BUFFER_SIZE = 1024 * 1024  # bytes joined before each write
 
 
-def get_element(osm_file, tags=('node', 'way', 'relation')):
+def get_element(osm_file, tags=('node', 'way', 'relation'), backend=BACKEND):
     """Yield element if it is the right type of tag
 
-    Reference:
-    http://stackoverflow.com/questions/3095434/inserting-newlines-in-xml-file-generated-via-xml-etree-elementtree-in-python
+    The elements are released after the next one is requested (see osm_parser.iterparse).
+    """
+    return osm_parser.iterparse(osm_file, tags, True, backend)
+
+
+def get_records(osm_file, backend=BACKEND):
+    """Yield the OSMRecord of each top level element, used to choose the sample"""
+    return osm_parser.iterrecords(osm_file, osm_parser.MAIN_TAGS, backend)
+
+
+def element_key(element):
+    return element.tag, element.get('id')
+
+
+def sample_item(record):
+    """What is kept of a chosen element: its key and its references"""
+    return element_key(record), tuple(record.node_refs), tuple((m.get('type'), m.get('ref')) for m in record.members)
+
+
+def get_stratum(record, strata):
+    if strata == 'type':
+        return record.tag
+    for key, value in record.tags:
+        if key in PRIMARY_MAP_FEATURE:
+            return '{0}:{1}'.format(record.tag, key)
+    return record.tag
+
+
+def sample_every(records, step, n=None):
+    items = []
+    for i, record in enumerate(records):
+        if i % step == 0:
+            items.append(sample_item(record))
+            if n is not None and len(items) >= n:
+                break
+    return items
+
+
+def sample_reservoir(records, n, rng, fast=False):
+    """Algorithm R: the i-th element replaces one of the n chosen with probability n/i"""
+    items = []
+    for i, record in enumerate(records):
+        if i < n:
+            items.append(sample_item(record))
+        elif fast:
+            break
+        else:
+            j = rng.randint(0, i)
+            if j < n:
+                items[j] = sample_item(record)
+    return items
+
+
+def sample_stratified(records, n, rng, strata='type', fast=False):
+    """One reservoir of n elements for each stratum"""
+    reservoirs = {}
+    seen = {}
+    for record in records:
+        stratum = get_stratum(record, strata)
+        i = seen.get(stratum, 0)
+        seen[stratum] = i + 1
+        reservoir = reservoirs.setdefault(stratum, [])
+        if i < n:
+            reservoir.append(sample_item(record))
+        elif fast:
+            # os tipos sao conhecidos, a leitura para quando todos estao completos
+            if strata == 'type' and len(reservoirs) == len(osm_parser.MAIN_TAGS) and \
+                    all(len(r) >= n for r in reservoirs.values()):
+                break
+        else:
+            j = rng.randint(0, i)
+            if j < n:
+                reservoir[j] = sample_item(record)
+    return [item for reservoir in reservoirs.values() for item in reservoir]
+
+
+def complete_references(osm_file, items, backend=BACKEND):
+    """Return the keys of the items and of the elements referenced by them"""
+    keys = set(key for key, node_refs, members in items)
+    for key, node_refs, members in items:
+        keys.update(('node', ref) for ref in node_refs)
+        keys.update(members)
+
+    # membros das sub relations, poucas relations comparadas aos nodes e ways
+    if any(key[0] == 'relation' for key in keys):
+        relations = dict((element_key(record), [(m.get('type'), m.get('ref')) for m in record.members])
+                         for record in get_records(osm_file, backend) if record.tag == 'relation')
+        pending = [key for key in keys if key[0] == 'relation']
+        while pending:
+            for member in relations.get(pending.pop(), []):
+                if member not in keys:
+                    keys.add(member)
+                    if member[0] == 'relation':
+                        pending.append(member)
+
+    # os nodes das ways que entraram pelas relations, as ways sao lidas antes das relations
+    ways = set(key for key in keys if key[0] == 'way') - set(key for key, node_refs, members in items)
+    if ways:
+        for record in get_records(osm_file, backend):
+            if record.tag == 'way' and element_key(record) in ways:
+                keys.update(('node', ref) for ref in record.node_refs)
+                ways.discard(element_key(record))
+                if not ways:
+                    break
+            elif record.tag == 'relation':
+                break
+    return keys
+
+
+def write_sample(osm_file, sample_file, select, total=None, backend=BACKEND):
+    """Write the elements selected by select(i, element), stopping after total elements
+
+    The root attributes and the <bounds> of the OSM file are kept, the elements are joined
+    in blocks of WRITE_BUFFER_SIZE bytes before each write. Return the elements written.
     """
-    context = iter(ET.iterparse(osm_file, events=('start', 'end')))
-    _, root = next(context)
-    for event, elem in context:
-        if event == 'end' and elem.tag in tags:
-            yield elem
-            root.clear()
+    root, bounds = osm_parser.read_header(osm_file)
+    root = dict((key, value) for key, value in root.items() if key in ROOT_ATTRIBUTES)
+
+    start = time.time()
+    read = written = 0
+    with osm_io.open_output(sample_file) as output:
+        output.write(XML_DECLARATION)
+        output.write(osm_parser.start_tag('osm', root) + b'\n ')
+        if bounds is not None:
+            output.write(osm_parser.start_tag('bounds', bounds, empty=True) + b'\n ')
+
+        buffer = []
+        size = 0
+        for read, element in enumerate(get_element(osm_file, backend=backend), 1):
+            if select(read - 1, element):
+                data = osm_parser.tostring(element)
+                buffer.append(data)
+                size += len(data)
+                written += 1
+                if size >= WRITE_BUFFER_SIZE:
+                    output.write(b''.join(buffer))
+                    buffer = []
+                    size = 0
+                if total is not None and written >= total:
+                    break
+
+        buffer.append(b'</osm>\n')
+        output.write(b''.join(buffer))
+
+    elapsed = max(time.time() - start, 1e-9)
+    pprint.pprint('Amostra: {0} elementos lidos, {1} escritos em {2:.1f}s ({3:.0f} elementos/s)'.format(
+        read, written, elapsed, read / elapsed))
+    return written
+
+
+def main(osm_file=OSM_FILE, sample_file=SAMPLE_FILE, mode='every', step=k, n=None, strata='type',
+         complete=False, seed=None, fast=False, backend=BACKEND):
+    if mode == 'every' and not complete:
+        return write_sample(osm_file, sample_file, lambda i, element: i % step == 0, n, backend)
+
+    if mode != 'every' and n is None:
+        raise ValueError('the {0} mode needs the number of elements (-n)'.format(mode))
+    if fast and mode != 'every' and seed is not None:
+        raise ValueError('--fast keeps the first elements, the --seed is not used')
+    if fast and mode == 'stratified' and strata != 'type':
+        raise ValueError('--fast can not stop before the end of the file with the strata by {0}'.format(strata))
+
+    rng = random.Random(seed)
+    records = get_records(osm_file, backend)
+    if mode == 'every':
+        items = sample_every(records, step, n)
+    elif mode == 'reservoir':
+        items = sample_reservoir(records, n, rng, fast)
+    else:
+        items = sample_stratified(records, n, rng, strata, fast)
+    records.close()
 
+    if complete:
+        # as referencias que nao estao no arquivo nunca sao escritas, a leitura vai ate o fim
+        keys = complete_references(osm_file, items, backend)
+        total = None
+    else:
+        keys = set(key for key, node_refs, members in items)
+        total = len(keys)
+    return write_sample(osm_file, sample_file, lambda i, element: element_key(element) in keys, total, backend)
 
-with open(SAMPLE_FILE, 'wb') as output:
-    output.write('<?xml version="1.0" encoding="UTF-8"?>\n'.encode())
-    output.write('<osm>\n'.encode())
 
-    # Write every kth top level element
-    for i, element in enumerate(get_element(OSM_FILE)):
-        if i % k == 0:
-            output.write(ET.tostring(element, encoding='utf-8'))
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cria uma amostra do arquivo OSM')
+    parser.add_argument('osm_file', nargs='?', default=OSM_FILE)
+    parser.add_argument('sample_file', nargs='?', default=SAMPLE_FILE)
+    parser.add_argument('--mode', choices=MODES, default='every',
+                        help='every: a cada k elementos, reservoir: n elementos aleatorios, '
+                             'stratified: n elementos de cada estrato')
+    parser.add_argument('-k', type=int, default=k, help='intervalo do modo every')
+    parser.add_argument('-n', type=int, default=None, help='elementos da amostra (de cada estrato no stratified)')
+    parser.add_argument('--strata', choices=STRATA, default='type',
+                        help='estrato por tipo do elemento ou pela primary map feature')
+    parser.add_argument('--complete', action='store_true',
+                        help='inclui os nodes das ways e os membros das relations da amostra')
+    parser.add_argument('--seed', type=int, default=None, help='semente para repetir a mesma amostra')
+    parser.add_argument('--fast', action='store_true',
+                        help='mantem os primeiros elementos (sem --seed, num arquivo ordenado o reservoir tem '
+                             'apenas nodes) e para a leitura quando a amostra esta completa, no stratified apenas '
+                             'com --strata type')
+    parser.add_argument('--parser', choices=['auto'] + osm_parser.BACKENDS, default='auto')
+    args = parser.parse_args()
 
-    output.write('</osm>')
+    main(args.osm_file, args.sample_file, args.mode, args.k, args.n, args.strata, args.complete, args.seed,
+         args.fast, args.parser)
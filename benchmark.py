@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark of the scripts over synthetic OSM files (see osm_synthetic)
+
+For each scale (10k to 10m elements) the file is created once in the workdir and each
+stage is executed in a new process, so the peak memory (max RSS) is only the one of the
+stage, and the allocated blocks are the ones still allocated at the end of the stage (the
+documents kept, for the documents stage):
+
+- audit:      audit of the elements (data_wrangling.audit_elements);
+- transform:  the json documents of the elements (data_wrangling.process_json), with the
+              restrictions keys of an audit executed before the measure;
+- documents:  the json documents of every element kept in memory, like data_wrangling.main
+              does before the json is written (packed by osm_document with --compact);
+- json:       data_wrangling.main, audit, transform and the json written (--stream);
+- sample:     amostra_arquivo.main with a reservoir of 1% of the elements;
+- load:       data_insert_in_mongodb.main over the json, with MemoryCollection in place
+              of the mongodb, the reading, the batches and the threads of the loader.
+
+With --compact the documents stage keeps the documents packed (see
+data_wrangling.set_compact_documents).
+
+The results are written in a json file with the commit, so the results of two commits
+can be compared with --compare:
+
+  python benchmark.py --scales 10k 100k --output data/benchmark/before.json
+  python benchmark.py --scales 10k 100k --compare data/benchmark/before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import pprint
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import osm_synthetic
+
+WORKDIR = 'data/benchmark'
+SCALES = ['10k', '100k']
+STAGES = ['audit', 'transform', 'documents', 'json', 'sample', 'load']
+
+
+def peak_memory():
+  """Max RSS of the process in bytes, None if the platform does not have the resource module"""
+  try:
+    import resource
+  except ImportError:
+    return None
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # o linux informa em KB e o macOS em bytes
+  return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def audit_keys(filename, backend):
+  import data_wrangling
+  auditing = data_wrangling.new_auditing_state()
+  for elements in data_wrangling.iter_batches(data_wrangling.iter_elements(filename, backend)):
+    data_wrangling.audit_elements(auditing, elements)
+  return auditing['tag_k_v_yes_no_auditing']
+
+
+def json_filename(filename):
+  return '{0}.json'.format(filename)
+
+
+def run_audit(filename, elements, backend, prepared):
+  import data_wrangling
+  auditing = data_wrangling.new_auditing_state()
+  count = 0
+  for batch in data_wrangling.iter_batches(data_wrangling.iter_elements(filename, backend)):
+    data_wrangling.audit_elements(auditing, batch)
+    count += len(batch)
+  return count
+
+
+def run_transform(filename, elements, backend, restrictions_keys):
+  import data_wrangling
+  count = 0
+  for element in data_wrangling.iter_elements(filename, backend):
+    data_wrangling.process_json(element, restrictions_keys)
+    count += 1
+  return count
+
+
+def run_documents(filename, elements, backend, restrictions_keys):
+  import data_wrangling
+  # a lista e retornada para os blocos alocados serem contados antes de ser liberada
+  return [data_wrangling.keep_document(data_wrangling.process_json(element, restrictions_keys))
+          for element in data_wrangling.iter_elements(filename, backend)]
+
+
+def run_json(filename, elements, backend, prepared):
+  import data_wrangling
+  data_wrangling.main(filename, stream=True, backend=backend)
+  return elements
+
+
+def run_sample(filename, elements, backend, prepared):
+  import amostra_arquivo
+  amostra_arquivo.main(filename, '{0}.sample.osm'.format(filename), mode='reservoir', n=max(1, elements // 100),
+                       seed=0, backend=backend)
+  return elements
+
+
+def run_load(filename, elements, backend, prepared):
+  import data_insert_in_mongodb
+  collection = data_insert_in_mongodb.MemoryCollection()
+  data_insert_in_mongodb.main(json_filename(filename), collection=collection)
+  return collection.count
+
+
+def prepare_transform(filename, backend):
+  return audit_keys(filename, backend)
+
+
+def prepare_load(filename, backend):
+  if not os.path.exists(json_filename(filename)):
+    run_json(filename, 0, backend, None)
+
+
+STAGE_FUNCTIONS = {
+  'audit': (None, run_audit),
+  'transform': (prepare_transform, run_transform),
+  'documents': (prepare_transform, run_documents),
+  'json': (None, run_json),
+  'sample': (None, run_sample),
+  'load': (prepare_load, run_load),
+}
+
+
+def run_stage(stage, filename, elements, backend, compact=False):
+  """Execute the stage in this process, return (seconds, items, baseline memory, peak memory, allocated blocks)"""
+  prepare, run = STAGE_FUNCTIONS[stage]
+  with contextlib.redirect_stdout(io.StringIO()):
+    # os imports e o preparo sao feitos antes da medida
+    import amostra_arquivo, data_insert_in_mongodb, data_wrangling
+    data_wrangling.set_compact_documents(compact)
+    prepared = prepare(filename, backend) if prepare is not None else None
+    baseline = peak_memory()
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    items = run(filename, elements, backend, prepared)
+    seconds = time.perf_counter() - start
+    blocks = sys.getallocatedblocks() - blocks
+  if isinstance(items, list):
+    items = len(items)
+  return seconds, items, baseline, peak_memory(), blocks
+
+
+def run_in_process(function, *args):
+  """Execute the function in a new process, the memory of the previous stages is not counted"""
+  context = multiprocessing.get_context('spawn')
+  pool = context.Pool(1)
+  try:
+    return pool.apply(function, args)
+  finally:
+    pool.close()
+    pool.join()
+
+
+def synthetic_filename(workdir, elements, options):
+  return os.path.join(workdir, 'synthetic-{0}-t{tags_per_element}-o{opening_hours_rate}-a{address_rate}'
+                               '-s{seed}.osm'.format(elements, **options))
+
+
+def get_commit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                   cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def to_mb(value):
+  return None if value is None else round(value / (1024.0 * 1024.0), 1)
+
+
+def run_benchmark(scales=SCALES, stages=STAGES, workdir=WORKDIR, backend=None, repeat=1, options=None, compact=False):
+  """Return the results of the stages for each scale, the best of repeat executions"""
+  options = dict(options or {})
+  options.setdefault('tags_per_element', osm_synthetic.TAGS_PER_ELEMENT)
+  options.setdefault('opening_hours_rate', osm_synthetic.OPENING_HOURS_RATE)
+  options.setdefault('address_rate', osm_synthetic.ADDRESS_RATE)
+  options.setdefault('seed', 0)
+  if not os.path.exists(workdir):
+    os.makedirs(workdir)
+
+  results = []
+  for scale in scales:
+    elements = osm_synthetic.parse_count(scale)
+    filename = synthetic_filename(workdir, elements, options)
+    if not os.path.exists(filename):
+      pprint.pprint('Criando {0} {1}'.format(filename, datetime.now()))
+      osm_synthetic.generate_osm(filename, elements, **options)
+
+    for stage in stages:
+      best = None
+      for i in range(repeat):
+        measure = run_in_process(run_stage, stage, filename, elements, backend, compact)
+        if best is None or measure[0] < best[0]:
+          best = measure
+      seconds, items, baseline, peak, blocks = best
+      result = {'scale': scale, 'elements': elements, 'file_size': os.path.getsize(filename), 'stage': stage,
+                'seconds': round(seconds, 4), 'items': items,
+                'items_per_second': round(items / seconds, 1) if seconds > 0 else None,
+                'baseline_memory_mb': to_mb(baseline), 'peak_memory_mb': to_mb(peak),
+                'allocated_blocks': blocks, 'blocks_per_item': round(blocks / float(items), 2) if items else None}
+      pprint.pprint(result)
+      results.append(result)
+
+  return {'commit': get_commit(), 'date': str(datetime.now()), 'python': platform.python_version(),
+          'platform': platform.platform(), 'backend': backend or 'auto', 'repeat': repeat, 'options': options,
+          'compact': compact, 'results': results}
+
+
+def compare_results(previous, current):
+  """Return (scale, stage, previous items/s, current items/s, ratio, previous blocks/item, current blocks/item)
+  of the measures in both results"""
+  previous_results = dict(((r['scale'], r['stage']), r) for r in previous['results'])
+  rows = []
+  for r in current['results']:
+    p = previous_results.get((r['scale'], r['stage']))
+    if p is None or not p['items_per_second'] or not r['items_per_second']:
+      continue
+    rows.append((r['scale'], r['stage'], p['items_per_second'], r['items_per_second'],
+                 round(r['items_per_second'] / p['items_per_second'], 3),
+                 p.get('blocks_per_item'), r.get('blocks_per_item')))
+  return rows
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark das etapas com arquivos OSM sinteticos')
+  parser.add_argument('--scales', nargs='+', default=SCALES, help='quantidade de elementos, de 10k a 10m')
+  parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+  parser.add_argument('--workdir', default=WORKDIR, help='pasta dos arquivos sinteticos e dos json criados')
+  parser.add_argument('--parser', choices=['auto', 'lxml', 'expat', 'etree'], default='auto')
+  parser.add_argument('--repeat', type=int, default=1, help='execucoes de cada etapa, o melhor tempo e mantido')
+  parser.add_argument('--tags', type=float, default=osm_synthetic.TAGS_PER_ELEMENT,
+                      help='media de tags comuns por elemento')
+  parser.add_argument('--opening-hours-rate', type=float, default=osm_synthetic.OPENING_HOURS_RATE,
+                      help='fracao dos elementos com opening_hours ou maxspeed:conditional')
+  parser.add_argument('--address-rate', type=float, default=osm_synthetic.ADDRESS_RATE,
+                      help='fracao dos elementos com endereco')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--compact', action='store_true', help='mantem os documentos compactados (osm_document)')
+  parser.add_argument('--output', default=None,
+                      help='arquivo json com os resultados, por padrao <workdir>/benchmark-<commit>.json')
+  parser.add_argument('--compare', default=None, help='resultados de outra execucao para comparar')
+  args = parser.parse_args()
+
+  options = {'tags_per_element': args.tags, 'opening_hours_rate': args.opening_hours_rate,
+             'address_rate': args.address_rate, 'seed': args.seed}
+  benchmark = run_benchmark(args.scales, args.stages, args.workdir, args.parser, args.repeat, options, args.compact)
+
+  output = args.output or os.path.join(args.workdir, 'benchmark-{0}.json'.format(benchmark['commit'] or 'local'))
+  with open(output, 'w') as fo:
+    json.dump(benchmark, fo, indent=2)
+  pprint.pprint('Resultados gravados em {0}'.format(output))
+
+  if args.compare is not None:
+    with open(args.compare) as fi:
+      previous = json.load(fi)
+    pprint.pprint('Comparacao com {0} (itens/s e blocos alocados por item)'.format(previous.get('commit')))
+    for row in compare_results(previous, benchmark):
+      pprint.pprint(row)
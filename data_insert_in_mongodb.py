@@ -1,43 +1,364 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import argparse
 import codecs
+import io
 import json
 import pprint
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import osm_columnar
+import osm_io
+import osm_typed
+
+try:
+  from pymongo.errors import BulkWriteError
+except ImportError:
+  # sem o pymongo apenas as collections que nao sao do mongodb podem ser usadas (MemoryCollection)
+  class BulkWriteError(Exception):
+    """Same details of the pymongo BulkWriteError: nInserted and the writeErrors with index and errmsg"""
+
+    def __init__(self, details):
+      Exception.__init__(self, 'batch op errors occurred')
+      self.details = details
+
 JSON_TO_INSERT = 'data/map.osm.json'
 DB_CONNECTION = 'localhost:32768'
 DB_NAME = 'udacity_datascience_for_business'
+DB_COLLECTION = 'node'
+
+BATCH_SIZE = 1000  # documentos por insert_many
+CONNECTIONS = 4  # inserts simultaneos
+READ_SIZE = 1024 * 1024  # caracteres lidos do json por vez
+
+whitespace = re.compile(r'\s*')
+
+
+class MemoryCollection(object):
+  """In process stand-in of the pymongo collection, for the tests and the benchmark without a mongodb
+
+  insert_many adds the _id like the pymongo. With keep_documents the documents inserted are
+  kept in documents and an _id already inserted fails with a BulkWriteError, like a
+  duplicate key, otherwise the documents are only counted.
+  """
 
+  class InsertManyResult(object):
+    def __init__(self, inserted_ids):
+      self.inserted_ids = inserted_ids
 
-def get_db():
+  def __init__(self, keep_documents=False):
+    self.count = 0
+    self.keep_documents = keep_documents
+    self.documents = []
+    self.ids = set()
+
+  def insert_many(self, documents, ordered=True):
+    ids = []
+    errors = []
+    for index, document in enumerate(documents):
+      # o pymongo adiciona o _id em cada documento antes de envia-lo
+      document.setdefault('_id', self.count + len(ids) + len(errors))
+      if document['_id'] in self.ids:
+        errors.append({'index': index, 'code': 11000, 'errmsg': 'E11000 duplicate key error _id: {0}'.format(
+          document['_id'])})
+        if ordered:
+          break
+        continue
+      ids.append(document['_id'])
+      if self.keep_documents:
+        self.ids.add(document['_id'])
+        self.documents.append(document)
+    self.count += len(ids)
+    if errors:
+      raise BulkWriteError({'nInserted': len(ids), 'writeErrors': errors})
+    return MemoryCollection.InsertManyResult(ids)
+
+
+def get_db(connections=CONNECTIONS):
   from pymongo import MongoClient
-  client = MongoClient(DB_CONNECTION)
+  client = MongoClient(DB_CONNECTION, maxPoolSize=connections)
   db = client[DB_NAME]
   return db
 
 
-def main():
-  db = get_db()
-  insertError = []
-#  print (db.collection_names(include_system_collections=False))
-  datastore = None
-  with open(JSON_TO_INSERT, 'r') as f:
-    datastore = json.load(f)
-
-  if datastore is not None:
-    for d in datastore:
-      try:
-        if d is not None:
-          db['node'].insert(d)
-      except Exception as e:
-        insertError.append(d)
-
-  file_out = "{0}-error-to-insert-json.log".format(JSON_TO_INSERT)
+def iter_json_array(f, read_size=READ_SIZE):
+  """Yield the items of a json array decoding read_size characters each time
+
+  Like the json.load, the items are separated by exactly one ',' and only whitespace is
+  accepted before the '[' and after the ']', anything else raises a ValueError.
+  """
+  name = getattr(f, 'name', 'json')
+  decoder = json.JSONDecoder()
+  buffer = ''
+  pos = 0
+
+  def next_char():
+    # primeiro caractere depois dos espacos, os espacos podem ser maiores que o read_size
+    nonlocal buffer, pos
+    while True:
+      pos = whitespace.match(buffer, pos).end()
+      if pos < len(buffer):
+        return buffer[pos]
+      buffer = f.read(read_size)
+      pos = 0
+      if not buffer:
+        return ''
+
+  if next_char() != '[':
+    raise ValueError('{0} is not a json array'.format(name))
+  pos += 1
+  char = next_char()
+
+  while char != ']':
+    if char in (',', ''):
+      raise ValueError('{0} has no item at {1!r}'.format(name, buffer[pos:pos + 20]))
+    try:
+      d, end = decoder.raw_decode(buffer, pos)
+    except ValueError:
+      end = None
+
+    # documento incompleto no buffer, le o proximo pedaco do arquivo
+    if end is None or end == len(buffer):
+      chunk = f.read(read_size)
+      if chunk:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        continue
+      if end is None:
+        raise ValueError('{0} ends before the end of the json array'.format(name))
+
+    yield d
+    pos = end
+    char = next_char()
+    if char == ',':
+      pos += 1
+      char = next_char()
+      if char == ']':
+        raise ValueError('{0} has a comma before the end of the json array'.format(name))
+    elif char == '':
+      raise ValueError('{0} ends before the end of the json array'.format(name))
+    elif char != ']':
+      raise ValueError('{0} has {1!r} instead of a comma between the items'.format(name, buffer[pos:pos + 20]))
+
+  pos += 1
+  if next_char():
+    raise ValueError('{0} has data after the end of the json array'.format(name))
+
+
+def open_text(file_in):
+  """Open the json as text, decompressing it if it is compressed (see osm_io.open_input)
+
+  The binary file of the text has peek, see first_char.
+  """
+  fb = osm_io.open_input(file_in)
+  if not hasattr(fb, 'peek'):
+    fb = io.BufferedReader(fb, READ_SIZE)
+  return io.TextIOWrapper(fb, encoding='utf-8')
+
+
+def first_char(f):
+  """First character of the text opened by open_text that is not whitespace, '' if there is none
+
+  The whitespace before it is consumed and the character is only peeked, so the file is
+  read once, even when it is decompressed by another process.
+  """
+  fb = f.buffer
+  while True:
+    head = fb.peek(1)
+    if not head:
+      return ''
+    data = head.lstrip()
+    if data:
+      fb.read(len(head) - len(data))
+      return data[:1].decode('utf-8', 'replace')
+    fb.read(len(head))
+
+
+def read_documents(file_in):
+  """Yield every document of the json created by data_wrangling, skipping the `null` ones
+
+  The file is decoded while it is read, as a json array or as ndjson (one document
+  per line), so the inserts start with the first batch and the memory is bounded by
+  the documents waiting to be inserted instead of the size of the file. The columnar
+  export (.parquet or .osmcol) is read one row group at a time.
+  """
+  if file_in.endswith('.parquet') or file_in.endswith('.osmcol'):
+    for d in osm_columnar.iter_documents(file_in):
+      yield d
+    return
+
+  with open_text(file_in) as f:
+    if first_char(f) == '[':
+      documents = iter_json_array(f)
+    else:
+      documents = (json.loads(line) for line in f if line.strip())
+
+    for d in documents:
+      if d is not None:
+        yield d
+
+
+def get_batches(documents, batch_size=BATCH_SIZE):
+  """Group the documents in lists with at most batch_size documents"""
+  batch = []
+  for d in documents:
+    batch.append(d)
+    if len(batch) >= batch_size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+
+def insert_batch(collection, batch):
+  """Insert the batch with an unordered insert_many
+
+  The documents that fail do not stop the others of the batch.
+  Returns the number of documents inserted and a list of (document, error), the documents
+  of the errors are the ones read, without the _id added by the insert_many.
+  """
+  # o insert_many adiciona o _id nos documentos do lote
+  had_id = [('_id' in d) for d in batch]
+  try:
+    result = collection.insert_many(batch, ordered=False)
+    return len(result.inserted_ids), []
+  except BulkWriteError as e:
+    failed = [(as_read(batch, had_id, error['index']), error.get('errmsg'))
+              for error in e.details.get('writeErrors', [])]
+    return e.details.get('nInserted', len(batch) - len(failed)), failed
+  except Exception as e:
+    return 0, [(as_read(batch, had_id, i), str(e)) for i in range(len(batch))]
+
+
+def as_read(batch, had_id, index):
+  """The document of the batch as it was read, a copy without the _id if it was added by the insert"""
+  document = batch[index]
+  if had_id[index] or '_id' not in document:
+    return document
+  document = dict(document)
+  del document['_id']
+  return document
+
+
+def write_batch_errors(fo, batch_number, failed):
+  for d, error in failed:
+    fo.write(str({'batch': batch_number, 'error': error, 'document': d}))
+    fo.write('\n')
+  fo.flush()
+
+
+def read_changes(file_in):
+  """Yield the changes written by data_wrangling in the incremental mode, one per line"""
+  with open_text(file_in) as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+
+def apply_changes_batch(collection, batch, typed=False):
+  """Apply the batch of changes with an unordered bulk_write
+
+  The documents are found by type and id, upsert replaces (or inserts) the document
+  and delete removes it. With typed the id and the document are converted to the typed
+  schema (see osm_typed). Returns the number of documents changed and a list of
+  (change, error).
+  """
+  from pymongo import DeleteOne, ReplaceOne
+  requests = []
+  for change in batch:
+    document_filter = {'type': change['type'], 'id': osm_typed.to_int_value(change['id']) if typed else change['id']}
+    if change['action'] == 'delete':
+      requests.append(DeleteOne(document_filter))
+    else:
+      document = osm_typed.typed_document(change['document'], native_datetime=True) if typed else change['document']
+      requests.append(ReplaceOne(document_filter, document, upsert=True))
+  try:
+    result = collection.bulk_write(requests, ordered=False)
+    return result.upserted_count + result.modified_count + result.deleted_count, []
+  except BulkWriteError as e:
+    failed = [(batch[error['index']], error.get('errmsg')) for error in e.details.get('writeErrors', [])]
+    return len(batch) - len(failed), failed
+  except Exception as e:
+    return 0, [(change, str(e)) for change in batch]
+
+
+def apply_changes(changes_file, batch_size=BATCH_SIZE, typed=False):
+  """Apply in the collection the changes file (<osm>-changes.ndjson) of an incremental execution"""
+  collection = get_db()[DB_COLLECTION]
+  changed = 0
+  change_error = 0
+
+  file_out = "{0}-error-to-apply.log".format(changes_file)
   with codecs.open(file_out, "w") as fo:
-    fo.write(str(insertError))
+    # as alteracoes sao aplicadas na ordem, um lote por vez
+    for batch_number, batch in enumerate(get_batches(read_changes(changes_file), batch_size)):
+      n, failed = apply_changes_batch(collection, batch, typed)
+      changed += n
+      change_error += len(failed)
+      write_batch_errors(fo, batch_number, failed)
+
+  pprint.pprint('Documentos alterados: {0}, com erro: {1}'.format(changed, change_error))
+
+
+def main(json_file=JSON_TO_INSERT, batch_size=BATCH_SIZE, connections=CONNECTIONS, collection=None, typed=False):
+  """Insert the json in the collection, by default the DB_COLLECTION of the DB_CONNECTION
+
+  With typed the documents are inserted with the typed schema and the timestamps as dates
+  (see osm_typed), whether the json was written with data_wrangling.py --typed or not.
+  """
+  if collection is None:
+    db = get_db(connections)
+    collection = db[DB_COLLECTION]
+#  print (db.collection_names(include_system_collections=False))
+  inserted = 0
+  insert_error = 0
+  documents = read_documents(json_file)
+  if typed:
+    documents = (osm_typed.typed_document(d, native_datetime=True) for d in documents)
+
+  file_out = "{0}-error-to-insert-json.log".format(json_file)
+  with codecs.open(file_out, "w") as fo, ThreadPoolExecutor(max_workers=connections) as executor:
+    # limita os lotes em memoria aguardando o insert
+    pending = deque()
+    for batch_number, batch in enumerate(get_batches(documents, batch_size)):
+      pending.append((batch_number, executor.submit(insert_batch, collection, batch)))
+
+      while len(pending) >= connections * 2 or (pending and pending[0][1].done()):
+        number, future = pending.popleft()
+        n, failed = future.result()
+        inserted += n
+        insert_error += len(failed)
+        write_batch_errors(fo, number, failed)
+
+    while pending:
+      number, future = pending.popleft()
+      n, failed = future.result()
+      inserted += n
+      insert_error += len(failed)
+      write_batch_errors(fo, number, failed)
+
+  pprint.pprint('Documentos inseridos: {0}, com erro: {1}'.format(inserted, insert_error))
+
 
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Insere no mongodb o json criado pelo data_wrangling')
+  parser.add_argument('json_file', nargs='?', default=JSON_TO_INSERT)
+  parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                      help='documentos enviados em cada insert_many')
+  parser.add_argument('--connections', type=int, default=CONNECTIONS,
+                      help='lotes inseridos ao mesmo tempo')
+  parser.add_argument('--changes', action='store_true',
+                      help='json_file e o arquivo de alteracoes (<osm>-changes.ndjson) do modo incremental')
+  parser.add_argument('--typed', action='store_true',
+                      help='insere ids e refs como int e o timestamp como data, mesmo de um json sem --typed')
+  args = parser.parse_args()
 
-pprint.pprint('Inicio do Processo ' + str(datetime.now()))
-main()
-pprint.pprint('Fim Processo ' + str(datetime.now()))
+  pprint.pprint('Inicio do Processo ' + str(datetime.now()))
+  if args.changes:
+    apply_changes(args.json_file, args.batch_size, args.typed)
+  else:
+    main(args.json_file, args.batch_size, args.connections, typed=args.typed)
+  pprint.pprint('Fim Processo ' + str(datetime.now()))
@@ -1,21 +1,39 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import argparse
 import codecs
+import io
 import json
+import multiprocessing
+import os
 import pprint
 import re
-import xml.etree.cElementTree as ET
+import time
+from collections import Counter, OrderedDict
 from datetime import datetime
 
+import osm_columnar
+import osm_document
+import osm_geometry
+import osm_io
+import osm_metrics
+import osm_parser
+import osm_spatial
+import osm_state
+import osm_typed
+
 OSM_FILE = "data/map.osm"
 SAMPLE_FILE = "data/map_sample_2.osm"
 
 # Regex
 lower = re.compile(r'^([a-z]|_)*$')
 lower_colon = re.compile(r'^([a-z]|_)*:([a-z]|_)*$')
+# o '.' sem escape aceita um caractere qualquer (os pontos sao recusados pelo problemchars), por isso
+# chaves como 'name_1' ou 'Phone' sao validas, mantido para nao mudar o json e contado a parte na auditoria
 lower_dot = re.compile(r'^([a-z]|_)*.([a-z]|_)*$')
 problemchars = re.compile(r'[=\+/&<>;\'"\?%#$@\,\. \t\r\n]')
 street_type_re = re.compile(r'\b\S+\.?$', re.IGNORECASE)
+main_tag_start = re.compile(rb'<(?:node|way|relation)[\s/>]')
 
 # Filters and Mapping to Fix
 FIX_KEY = {'Phone' : 'phone_fixed'}
@@ -34,6 +52,7 @@ PRIMARY_MAP_FEATURE = [
 ]
 
 POSTAL_CODE_NY_RANGE = [10000, 14999]
+POSTAL_CODE_KEYS = ['addr:zip', 'addr:postcode']
 
 EXPRECTED_STREET_TYPE = ["STREET", "AVENUE", "BOULEVARD", "DRIVE", "COURT", "PLACE", "SQUARE", "LANE", "ROAD",
             "TRAIL", "PARKWAY", "COMMONS"]
@@ -113,15 +132,52 @@ FIX_PERIOD_WEEK_DAYS = {
 
 MAIN_TAGS = ['node', 'relation', 'way']
 
+# Prefixos das chaves das tags: (xml_starts_with_key, sep, main_key_json)
+TAG_KEY_PREFIXES = [
+  ('addr', ':', 'address'),
+  ('building', ':', None),
+  ('cityracks', '.', None),
+  ('crossing', ':', None),
+  ('gnis', ':', None),
+  ('tiger', ':', None),
+]
+
+BASIC_NODE_KEYS = ['id', 'type', 'visible', 'created', 'pos', 'node_refs', 'members']
+
+# Categorias das chaves das tags pela regex que as aceitou (get_key_category)
+KEY_CATEGORIES = ['lower', 'lower_colon', 'lower_dot', 'problemchars', 'other']
+VALID_KEY_CATEGORIES = ['lower', 'lower_colon', 'lower_dot']
+
+# Quantidade de valores mantidos no cache de cada funcao de normalizacao (0 desliga o cache)
+NORMALIZE_CACHE_SIZE = 10000
+
+# Parametros do processamento paralelo
+# auditoria com contadores e com conjuntos de valores, usados pelo modo incremental
+COUNT_AUDITING_KEYS = ['tags_auditing', 'tag_k_auditing', 'street_address']
+SET_AUDITING_KEYS = ['tag_k_v_yes_no_auditing', 'postal_code']
+AUDIT_BATCH_SIZE = 4096  # elementos auditados de uma vez pelo audit_elements
+
+# quadrante de Manhattan selecionado manualmente (README), minlat,minlon,maxlat,maxlon
+MANHATTAN_BBOX = '40.6827000,-74.0486000,40.8808000,-73.9043000'
+
+SHARDS_PER_WORKER = 4
+SHARD_MAX_SIZE = 64 * 1024 * 1024
+CHECKPOINT_SIZE = 32 * 1024 * 1024  # bytes do arquivo lidos entre os checkpoints
+
+# funcoes com os tempos acumulados nas metricas (<osm>-metrics.json)
+INSTRUMENTED_FUNCTIONS = ['audit_elements', 'audit_main_element', 'process_json', 'process_tags_to_node',
+                          'normalize_and_clean_name', 'normalize_and_clean_street_name', 'normalize_and_clean_zip_code',
+                          'normalize_and_clean_conditional_values_from_nodes']
+
 
 def process_json(element, restrictions_keys):
   """ Function: process_json.
 
       The function will receive 02 parameters from the tag in the XML file. If the tag
-      element represents a ``node`` or a ``way`` in the map selected region the node will
-      be added with the following characteristics: basic data node, position, and a tag
-      with the ``restrictions_keys`` passed as a parameter. It will represents the end of the
-      node construction.
+      element represents a ``node``, a ``way`` or a ``relation`` in the map selected region the
+      node will be added with the following characteristics: basic data node, position, the
+      node refs of the way, the members of the relation and a tag with the ``restrictions_keys``
+      passed as a parameter. It will represents the end of the node construction.
 
       Args:
           element (tag element): represents the postal_code that will be audited.
@@ -139,10 +195,11 @@ def process_json(element, restrictions_keys):
 
       """
   node = {}
-  if element.tag == "node" or element.tag == "way":
+  if element.tag == "node" or element.tag == "way" or element.tag == "relation":
     node = process_basic_data_node(element, node)
     node = process_position_node(element, node)
     node = process_sub_element_node_refs_node(element, node)
+    node = process_sub_element_members_node(element, node)
     node = process_sub_elements_tag_node(element, node, restrictions_keys)
     return node
   else:
@@ -173,39 +230,62 @@ def process_sub_elements_tag_node(element, node, restrictions_keys):
           https://www.python.org/dev/peps/pep-0484/
 
       """
-  for sub_element in element.findall('tag'):
-    key = sub_element.get('k')
-    value = sub_element.get('v')
+  return process_tags_to_node(element.tags, node, restrictions_keys)
+
+def process_tags_to_node(tags, node, restrictions_keys):
+  """ Function: process_tags_to_node.
+
+      The function will receive 03 parameters.
+      This function will be called by the function `process_sub_elements_tag_node` and by the
+      single pass mode of the `main` when a node must be rebuilt with the final restrictions keys.
+
+      For all pairs ``(k, v)`` that has a valid key, the value will be treated and normalized
+      in the same element context.
+
+      Args:
+          tags (list): pairs ``(k, v)`` of the sub elements ``tag`` in the document order.
+          node (str): The node tag
+          restrictions_keys (set): The keys that represents the restrictions of the node.
+
+      Returns:
+          node: The node value treated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      """
+  for key, value in tags:
 
     # Corrigindo aspas simples
     if value:
       value = value.replace("'", "`")
 
-    if is_valid_key_from_tag(key):
-      
-      if key in PRIMARY_MAP_FEATURE:
-        process_sub_element_to_node(node, key, value, key, '', 'primary_map_feature')
-      
-      if key in restrictions_keys:
-        process_sub_element_to_node(node, key, value, key, '', 'restrictions_rules')
-        
-      process_sub_element_to_node(node, key, value, 'addr', ':', 'address')
-
-      process_sub_element_to_node(node, key, value, 'building')
+    key_class = tag_key_classes.get(key)
+    if key_class is None:
+      key_class = get_tag_key_class(key)
+    route = key_class[1]
 
-      process_sub_element_to_node(node, key, value, 'cityracks', '.')
+    if route is not None:
+      primary, restrictions, handlers, names = route
 
-      process_sub_element_to_node(node, key, value, 'crossing')
-
-      process_sub_element_to_node(node, key, value, 'gnis')
+      if primary is not None:
+        process_matched_sub_element_to_node(node, key, value, *primary)
+      
+      if key in restrictions_keys:
+        process_matched_sub_element_to_node(node, key, value, *restrictions)
 
-      process_sub_element_to_node(node, key, value, 'tiger')
+      for handler in handlers:
+        process_matched_sub_element_to_node(node, key, value, *handler)
 
       if key == 'name':
-        node['name'] = normalize_and_clean_name(value)
-      elif key.startswith('name') or key.startswith('old_name'):
-        process_sub_element_to_node(node, key, value, 'name', '', 'names')
-        process_sub_element_to_node(node, key, value, 'old_name', '', 'names')
+        node['name'] = normalize_cached(normalize_and_clean_name, value)
+      else:
+        for handler in names:
+          process_matched_sub_element_to_node(node, key, value, *handler)
 
   return node
 
@@ -302,7 +382,7 @@ def is_valid_key_from_tag(k_key):
 
          Returns:
              True: according with the following test: `is not None and problemchars.search(k_key) is None and (lower.search(k_key) or lower_colon.search(k_key) or lower_dot.search(k_key))`
-                  otherwise will return False
+                  otherwise will return False. The category of the key is kept by the `get_tag_key_class`.
 
          `PEP 484`_ type annotations are supported. If attribute, parameter, and
          return types are annotated according to `PEP 484`_, they do not need to be
@@ -312,9 +392,40 @@ def is_valid_key_from_tag(k_key):
              https://www.python.org/dev/peps/pep-0484/
 
          """
-    return k_key is not None and \
-           problemchars.search(k_key) is None and \
-           (lower.search(k_key) or lower_colon.search(k_key) or lower_dot.search(k_key))
+    return k_key is not None and get_tag_key_class(k_key)[0] in VALID_KEY_CATEGORIES
+
+def get_key_category(k_key):
+    """ Function: get_key_category.
+
+              The function will receive 01 parameter.
+              This function will be called by the function `get_tag_key_class` once for each distinct
+              key and will classify the key by the regexes of the `is_valid_key_from_tag`.
+
+              Args:
+               k_key (key element): Represents the key of the tag to be classified
+
+              Returns:
+                  one of the `KEY_CATEGORIES`: ``problemchars`` if the key has a problem char, otherwise
+                  the first of ``lower``, ``lower_colon`` and ``lower_dot`` that accepts the key, or
+                  ``other``. Only the keys of the `VALID_KEY_CATEGORIES` are valid.
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    if problemchars.search(k_key) is not None:
+        return 'problemchars'
+    if lower.search(k_key):
+        return 'lower'
+    if lower_colon.search(k_key):
+        return 'lower_colon'
+    if lower_dot.search(k_key):
+        return 'lower_dot'
+    return 'other'
 
 def process_basic_data_node(element, node):
   """ Function: process_basic_data_node.
@@ -423,14 +534,40 @@ def process_sub_element_node_refs_node(element, node):
                 https://www.python.org/dev/peps/pep-0484/
 
        """
-    node_refs = []
-    for sub_element in element.findall('nd'):
-        node_refs.append(sub_element.get('ref'))
+    node_refs = element.node_refs
   
     if len(node_refs) > 0:
         node['node_refs'] = node_refs
     return node
 
+def process_sub_element_members_node(element, node):
+  """ Function: process_sub_element_members_node.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `process_json` and
+      will process the sub elements ``member`` of the relation, in the document order.
+
+      Args:
+       element (tag element): represents the element key to be created.
+       node (str): This argument represents the name of the node to be created.
+
+      Returns:
+          the node with the ``members`` (type, ref and role) of the relation (json format)
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      """
+  members = [{'type': m.get('type'), 'ref': m.get('ref'), 'role': m.get('role')} for m in element.members]
+
+  if len(members) > 0:
+    node['members'] = members
+  return node
+
 def process_sub_element_to_node(node, key, value, xml_starts_with_key, sep=':', main_key_json=None):
     """ Function: process_sub_element_to_node.
 
@@ -460,30 +597,285 @@ def process_sub_element_to_node(node, key, value, xml_starts_with_key, sep=':',
     xml_key_starts_with_sep = xml_starts_with_key + sep
 
     if key.startswith(xml_key_starts_with_sep):
-        main_json_key = get_json_main_key(xml_starts_with_key, main_key_json)
-        if key == xml_key_starts_with_sep:
-            normalized_key = get_key_name_normalized(key)
-        else:
-            normalized_key = get_key_name_normalized(key, xml_key_starts_with_sep)
-        sub_node = get_key_data_from_node(node, main_json_key, {})
-      
-        if main_key_json == 'restrictions_rules':
-            if value.strip() == '24/7':
-                # forcando o valor ser de segunda a domingo
-                value = 'mo-su'
-
-            if value not in ['yes', 'no']:
-                value = normalize_and_clean_conditional_values_from_nodes(value, key)
-        elif main_key_json == 'address':
-            if key == 'addr:street':
-                value = normalize_and_clean_street_name(value)
-            elif key in ['addr:zip', 'addr:postcode']:
-                value = normalize_and_clean_zip_code(value)
-        sub_node[normalized_key] = value
-
-        node[main_key_json] = sub_node
+        process_matched_sub_element_to_node(node, key, value, xml_starts_with_key, xml_key_starts_with_sep, main_key_json)
+    return node
+
+def process_matched_sub_element_to_node(node, key, value, xml_starts_with_key, xml_key_starts_with_sep, main_key_json=None,
+                                        normalized_key=None):
+    """ Function: process_matched_sub_element_to_node.
+
+              The function will receive 06 parameters.
+              This function will be called by the function `process_sub_element_to_node` and by the
+              handlers of the `tag_key_dispatch`, when the key is already known to start with
+              ``xml_key_starts_with_sep``.
+
+              Args:
+               node (str): Represents the name of the node to be processed
+               key (key element): Represents the key node to be processed
+               value (str): a key value in the node
+               xml_starts_with_key (str): xml start with the key provided
+               xml_key_starts_with_sep (str): xml start with the key provided followed by the separator
+               main_key_json (key): the key name in the json format
+               normalized_key (str): the key in the json, if not provided it will be normalized by
+                 the `get_normalized_key_of_handler`
+
+              Returns:
+                  the node (json format)
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    main_json_key = get_json_main_key(xml_starts_with_key, main_key_json)
+    if normalized_key is None:
+        normalized_key = get_normalized_key_of_handler(key, xml_key_starts_with_sep)
+    sub_node = get_key_data_from_node(node, main_json_key, {})
+  
+    if main_key_json == 'restrictions_rules':
+        if value.strip() == '24/7':
+            # forcando o valor ser de segunda a domingo
+            value = 'mo-su'
+
+        if value not in ['yes', 'no']:
+            value = normalize_cached(normalize_and_clean_conditional_values_from_nodes, value, key)
+    elif main_key_json == 'address':
+        if key == 'addr:street':
+            value = normalize_cached(normalize_and_clean_street_name, value)
+        elif key in ['addr:zip', 'addr:postcode']:
+            value = normalize_cached(normalize_and_clean_zip_code, value)
+    sub_node[normalized_key] = value
+
+    node[main_key_json] = sub_node
     return node
 
+def build_tag_key_dispatch(prefixes):
+    """ Function: build_tag_key_dispatch.
+
+              The function will receive 01 parameter.
+              This function will be called once when the module is loaded and will create the
+              dispatch table used by `get_tag_key_class`.
+
+              Args:
+               prefixes (list): tuples ``(xml_starts_with_key, sep, main_key_json)`` like `TAG_KEY_PREFIXES`
+
+              Returns:
+                  a dictionary ``{sep: {xml_starts_with_key: handler}}`` where the handler are the arguments
+                  of the `process_matched_sub_element_to_node` after the value.
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    dispatch = {}
+    for order, (xml_starts_with_key, sep, main_key_json) in enumerate(prefixes):
+        dispatch.setdefault(sep, {})[xml_starts_with_key] = (order, (xml_starts_with_key, xml_starts_with_key + sep, main_key_json))
+    return dispatch
+
+tag_key_dispatch = build_tag_key_dispatch(TAG_KEY_PREFIXES)
+tag_key_classes = {}
+
+def get_normalized_key_of_handler(key, xml_key_starts_with_sep):
+    """Key in the json of the tag key processed by the handler of ``xml_key_starts_with_sep``."""
+    if key == xml_key_starts_with_sep:
+        return get_key_name_normalized(key)
+    return get_key_name_normalized(key, xml_key_starts_with_sep)
+
+def get_tag_key_class(key):
+    """ Function: get_tag_key_class.
+
+              The function will receive 01 parameter.
+              This function will be called by the function `process_tags_to_node` for each tag key and
+              will return the category of the key and its handlers. They are computed once by key and
+              kept in `tag_key_classes`, so the next tags with the same key cost only one dictionary
+              lookup and the regex of the `get_key_category`, the split of the key for each separator
+              of the `tag_key_dispatch` and the `get_key_name_normalized` are not repeated.
+
+              Args:
+               key (key element): Represents the key node to be processed
+
+              Returns:
+                  a tuple with the category of the `get_key_category` and the route of the key, `None`
+                  value if the key is not valid. The route is a tuple with the handler of the
+                  ``primary_map_feature`` (or `None` value), the handler of the ``restrictions_rules``,
+                  the handlers of the `TAG_KEY_PREFIXES` and the handlers of the ``names``, in the order
+                  they must be called. Each handler is the arguments of the
+                  `process_matched_sub_element_to_node` after the value, with the normalized key.
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    key_class = tag_key_classes.get(key)
+    if key_class is not None:
+        return key_class
+
+    category = get_key_category(key)
+    route = None
+    if category in VALID_KEY_CATEGORIES:
+        def handler(xml_starts_with_key, xml_key_starts_with_sep, main_key_json):
+            return (xml_starts_with_key, xml_key_starts_with_sep, main_key_json,
+                    get_normalized_key_of_handler(key, xml_key_starts_with_sep))
+
+        primary = None
+        if key in PRIMARY_MAP_FEATURE:
+            primary = handler(key, key, 'primary_map_feature')
+
+        handlers = []
+        for sep, prefixes in tag_key_dispatch.items():
+            xml_starts_with_key, found, _ = key.partition(sep)
+            if found and xml_starts_with_key in prefixes:
+                order, prefix_handler = prefixes[xml_starts_with_key]
+                handlers.append((order, handler(*prefix_handler)))
+        handlers = tuple(h for order, h in sorted(handlers))
+
+        names = []
+        if key != 'name':
+            for xml_starts_with_key in ['name', 'old_name']:
+                if key.startswith(xml_starts_with_key):
+                    names.append(handler(xml_starts_with_key, xml_starts_with_key, 'names'))
+
+        route = (primary, handler(key, key, 'restrictions_rules'), handlers, tuple(names))
+
+    key_class = (category, route)
+    tag_key_classes[key] = key_class
+    return key_class
+
+def get_tag_key_stats(tag_k_auditing):
+    """ Function: get_tag_key_stats.
+
+              The function will receive 01 parameter.
+              This function will be called by the function `write_auditing_log` and will count the keys
+              of each category of the `get_key_category`, so the keys accepted only by the ``lower_dot``
+              are visible in the auditing log.
+
+              Args:
+               tag_k_auditing (dict): the number of tags of each key, the ``tag_k_auditing`` of the auditing state.
+
+              Returns:
+                  a dictionary with the number of distinct ``keys`` and of ``tags`` of each category.
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    stats = dict((category, {'keys': 0, 'tags': 0}) for category in KEY_CATEGORIES)
+    for key, count in tag_k_auditing.items():
+        category = get_tag_key_class(key)[0]
+        stats[category]['keys'] += 1
+        stats[category]['tags'] += count
+    return stats
+
+normalize_cache_size = NORMALIZE_CACHE_SIZE
+normalize_caches = {}
+normalize_cache_stats = {}
+
+def set_normalize_cache_size(size):
+    """ Function: set_normalize_cache_size.
+
+              The function will receive 01 parameter.
+              This function will be called in the `main` and by the workers of the `process_parallel`
+              and will change the number of values kept by the `normalize_cached` for each function.
+
+              Args:
+               size (int): the number of values kept, 0 disables the cache.
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    global normalize_cache_size
+    normalize_cache_size = size
+    normalize_caches.clear()
+
+def reset_normalize_cache_stats():
+    """ Function: reset_normalize_cache_stats.
+
+              The function will not receive parameters.
+              This function will be called by the workers of the `process_parallel` before each shard,
+              so the counters returned are only the ones of the shard. The values cached are kept.
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    normalize_cache_stats.clear()
+
+def normalize_cached(normalize_function, value, *args):
+    """ Function: normalize_cached.
+
+              The function will receive 02 parameters.
+              This function will be called by the functions `process_tags_to_node` and
+              `process_matched_sub_element_to_node` in front of the `normalize_and_clean_name`,
+              `normalize_and_clean_street_name`, `normalize_and_clean_zip_code` and
+              `normalize_and_clean_conditional_values_from_nodes`.
+
+              The values already normalized are kept in a LRU cache by function with at most
+              `normalize_cache_size` values, and the hits, misses and evictions are counted in
+              `normalize_cache_stats` to be written in the auditing log.
+
+              Args:
+               normalize_function (function): the normalization function.
+               value (str): the value to be normalized.
+               args: the other arguments of the normalization function, they are part of the cache key.
+
+              Returns:
+                  the value normalized by the function.
+
+              `PEP 484`_ type annotations are supported. If attribute, parameter, and
+              return types are annotated according to `PEP 484`_, they do not need to be
+              included in the docstring:
+
+              .. _PEP 484:
+                  https://www.python.org/dev/peps/pep-0484/
+
+       """
+    name = normalize_function.__name__
+    cache = normalize_caches.get(name)
+    if cache is None:
+        cache = normalize_caches[name] = OrderedDict()
+    stats = normalize_cache_stats.get(name)
+    if stats is None:
+        stats = normalize_cache_stats[name] = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    cache_key = (value,) + args if args else value
+    if cache_key in cache:
+        cache.move_to_end(cache_key)
+        stats['hits'] += 1
+        return cache[cache_key]
+
+    stats['misses'] += 1
+    normalized = normalize_function(value, *args)
+    if normalize_cache_size > 0:
+        cache[cache_key] = normalized
+        if len(cache) > normalize_cache_size:
+            cache.popitem(last=False)
+            stats['evictions'] += 1
+    return normalized
+
 '''
 ''  Funcoes para limpeza e normalizacao de tags do tipo conditional
 '''
@@ -581,6 +973,17 @@ def normalize_and_clean_conditional_values_from_nodes(conditional, node_key):
               This function will be called by the function `process_sub_element_to_node` and
               will normalize and clean conditionals values from the nodes.
 
+              The value is read in a single pass: the rules (``;`` for ``opening_hours`` or ``);``
+              for the conditionals) are split in ``key @ conditions`` and each condition is split in
+              week days and hours and added to the condition map directly, with the same result of
+              the `normalize_condition_rule`, `normalize_condition_map_from_rule` and
+              `normalize_condition_map_by_keys_and_values`. Empty rules and conditions are ignored, and a
+              rule without conditions (like the empty rule after a ``;`` at the end) does not replace the
+              conditions of the same key, the conditions replace it.
+
+              It is called through the `normalize_cached`, so the result is shared by all the nodes
+              with the same value and must not be changed.
+
               Args:
                   conditional (str): this conditional will test the value to be clean and normalized in the node
                   node_key (key name): Represents the node key to be processed
@@ -597,45 +1000,80 @@ def normalize_and_clean_conditional_values_from_nodes(conditional, node_key):
 
        """
     # adjusting XML encoding values
-    conditional = conditional.replace('&lt;=', ' <= ').replace('&gt;=', ' >= ').replace('&lt;', ' < ').replace('&gt;',' > ').replace('&quot;', '"')
+    if '&' in conditional:
+      conditional = conditional.replace('&lt;=', ' <= ').replace('&gt;=', ' >= ').replace('&lt;', ' < ').replace('&gt;',' > ').replace('&quot;', '"')
     # removing additional spaces between ',' and '-' and normalizing as lower
     conditional = conditional.replace(', ', ',').replace(' ,', ',').replace('- ', '-').replace(' -', '-').lower()
     # sppliting rules from conditional
     if node_key == 'opening_hours':
-      conditional = conditional.split(';')
+      rules = conditional.split(';')
     else:
-      conditional = conditional.split(');')
+      rules = conditional.split(');')
 
     conditional_rule_dict = {}
-    for v in conditional:
+    for rule in rules:
 
       # Ajuste para opening_hours seguir o mesmo padrao da restricao com condicional yes
       if node_key == 'opening_hours':
-        v = 'yes @ ' + v
-
-      value_splited = strip_and_remove_parentesis(v).split('@')
-      key, value = None, None
-
-      if len(value_splited) == 0:
-        pass
-      elif len(value_splited) == 1:
-        key = strip_and_remove_parentesis(value_splited[0])
-      else:
-        key = strip_and_remove_parentesis(value_splited[0])
-        value = strip_and_remove_parentesis(value_splited[1])
-
-      values_to_dict = {}
-      if (key in conditional_rule_dict):
-        values_to_dict = conditional_rule_dict[key]
+        rule = 'yes @ ' + rule
+
+      rule = strip_and_remove_parentesis(rule)
+      if rule is None:
+        continue
+
+      # a partir daqui a regra nao tem mais parenteses, basta o strip
+      value_splited = rule.split('@')
+      key = value_splited[0].strip() if value_splited[0] else None
+      value = None
+      if len(value_splited) > 1:
+        value = value_splited[1].strip() if value_splited[1] else None
+
+      # regras da condicao: dias da semana (ou chaves da condicao) e horarios
+      condition_map = None
+      if value is not None:
+        condition_map = conditional_rule_dict.get(key)
+        # a regra sem condicoes com a mesma chave (como 'yes' de ';yes') e substituida pelas condicoes
+        if not isinstance(condition_map, dict):
+          condition_map = {}
+
+        for raw_condition in value.split(';'):
+          condition = raw_condition.strip().split(' ', 1)
+          if not condition[0]:
+            continue
+          condition_key = condition[0].strip()
+
+          keys = FIX_PERIOD_WEEK_DAYS.get(condition_key)
+          if not keys:
+            keys = condition_key.split(',')
+
+          values = []
+          if len(condition) == 2:
+            values = condition[1].strip().split(',')
+
+          for k in keys:
+            key_name = WEEK_DAYS.get(k)
+            v = []
+            if key_name is None:
+              key_name = raw_condition
+              values = None
+            elif values:
+              v = values
+            else:
+              v = ['00:00-24:00']
 
-      values_to_dict = normalize_condition_rule(value, values_to_dict)
+            if key_name in condition_map:
+              condition_map[key_name].append(v)
+            else:
+              condition_map[key_name] = v
 
-      if values_to_dict is None and len(conditional) == 1:
+      if condition_map is None and len(rules) == 1:
         conditional_rule_dict = key
-      elif values_to_dict is None:
-        conditional_rule_dict[key] = key
+      elif condition_map is None:
+        # as regras vazias (como a do ';' no fim) ou sem condicoes nao apagam as condicoes da chave
+        if key is not None and key not in conditional_rule_dict:
+          conditional_rule_dict[key] = key
       else:
-        conditional_rule_dict[key] = values_to_dict
+        conditional_rule_dict[key] = condition_map
 
     return conditional_rule_dict
 
@@ -887,10 +1325,35 @@ def audit_count_tag_attribute_k_with_v_yes_no(tag_k_v_yes_no_auditing, element):
   if element.tag == 'tag':
     v = element.attrib['v']
     k = element.attrib['k']
-    if v == 'yes' or v == 'no' or v.startswith('yes ') or v.startswith('no ') or 'conditional' in k or k == 'opening_hours':
+    if is_restrictions_key(k, v):
       tag_k_v_yes_no_auditing.add(k)
   return tag_k_v_yes_no_auditing
 
+def is_restrictions_key(k, v):
+  """ Function: is_restrictions_key.
+
+          The function will receive 02 parameters.
+          This function will be called by the functions `audit_count_tag_attribute_k_with_v_yes_no` and
+          `audit_elements` and will test if the key of a tag is a restriction key.
+
+          Args:
+            k (str): the attribute `k` of the tag.
+            v (str): the attribute `v` of the tag.
+
+          Returns:
+              True if the value is `yes` or `no` (alone or followed by a space) or the key is a
+              conditional or `opening_hours`, otherwise False.
+
+          `PEP 484`_ type annotations are supported. If attribute, parameter, and
+          return types are annotated according to `PEP 484`_, they do not need to be
+          included in the docstring:
+
+          .. _PEP 484:
+              https://www.python.org/dev/peps/pep-0484/
+
+       """
+  return v == 'yes' or v == 'no' or v.startswith('yes ') or v.startswith('no ') or 'conditional' in k or k == 'opening_hours'
+
 def audit_tags_subtags(tags_auditing, element):
   """ Function: audit_tags_subtags.
 
@@ -914,7 +1377,7 @@ def audit_tags_subtags(tags_auditing, element):
        """
   tags_auditing = audit_count_tags_attributes(tags_auditing, element)
 
-  subElements = element.findall('*')
+  subElements = element.sub_elements
   subTags = {}
   if(subElements is not None and len(subElements) > 0):
     if 'subtags' in tags_auditing[element.tag]:
@@ -949,7 +1412,7 @@ def audit_postal_code(postal_code, element):
           https://www.python.org/dev/peps/pep-0484/
 
       """
-  if element.tag == 'tag' and element.attrib['k'] in ['addr:zip', 'addr:postcode']:
+  if element.tag == 'tag' and element.attrib['k'] in POSTAL_CODE_KEYS:
     if len(element.attrib['v']) != 5:
       postal_code.add(element.attrib['v'])
     else:
@@ -992,81 +1455,1731 @@ def audit_street_name(street_address, element):
       street_address[valor] = count
   return street_address
 
-'''This function will be working to audit elements and process data to JSON for ingest in mongodb'''
-def main(filename):
+def new_auditing_state():
+  ''' Function: new_auditing_state.
 
-  json_list = []
- 
-  tags_auditing = {}
-  tag_k_auditing = {}
-  tag_k_v_yes_no_auditing = set()
-  postal_code = set()
-  street_address = {}
+      The function will not receive parameters.
+      This function will be called in the `main` and will create the empty structures used by
+      the `audit_*` functions.
 
-  pprint.pprint('Inicio Auditoria ' + str(datetime.now()))
-  for event, element in ET.iterparse(filename):
-    street_address = audit_street_name(street_address, element)
-    postal_code = audit_postal_code(postal_code, element)
-    audit_count_tag_attribute_k_with_v_yes_no(tag_k_v_yes_no_auditing, element)
-    tag_k_auditing = audit_count_tag_attribute_k(tag_k_auditing, element)
-    
-    if element.tag in MAIN_TAGS:
-      tags_auditing = audit_tags_subtags(tags_auditing, element)
+      Returns:
+          a dictionary with the keys ``tags_auditing``, ``tag_k_auditing``, ``tag_k_v_yes_no_auditing``,
+          ``postal_code`` and ``street_address``.
 
-  pprint.pprint('Fim auditoria e inicio Limpeza e estrutucação dos dados ' + str(datetime.now()))
-  for event, element in ET.iterparse(filename):
-    if element.tag in MAIN_TAGS:
-      json_list.append(process_json(element, tag_k_v_yes_no_auditing))
-        
-  pprint.pprint('Fim de limpeza e estruturacao e inicio Criacao Json ' + str(datetime.now()))
-  # You do not need to change this file
-  file_out = "{0}.json".format(filename)
-  with codecs.open(file_out, "w") as fo:
-    fo.write(json.dumps(json_list))
-  
-  pprint.pprint('Fim Criacao Json ' + str(datetime.now()))
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
 
-  auditing_items = str('==========================================================\n')
-  auditing_items += str('==========   TAGS AUDITING                   =============\n')
-  auditing_items += str('==========================================================\n\n\n')
-  auditing_items += str(tags_auditing)
-  auditing_items += str('\n\n\n==========================================================\n')
-  auditing_items += str('==========   TAGS Com Chaves AUDITING            =========\n')
-  auditing_items += str('==========================================================\n\n\n')
-  auditing_items += str(tag_k_auditing)
-  auditing_items += str('\n\n\n==========================================================\n')
-  auditing_items += str('==========   TAGS Chave Restrictions AUDITING    =========\n')
-  auditing_items += str('==========================================================\n\n\n')
-  auditing_items += str(tag_k_v_yes_no_auditing)
-  auditing_items += str('\n\n\n==========================================================\n')
-  auditing_items += str('==========   TAGS Postal Code AUDITING           =========\n')
-  auditing_items += str('==========================================================\n\n\n')
-  auditing_items += str(postal_code)
-  auditing_items += str('\n\n\n==========================================================\n')
-  auditing_items += str('==========   TAGS Street Address AUDITING        =========\n')
-  auditing_items += str('==========================================================\n\n\n')
-  auditing_items += str(street_address)
-  auditing_items += str('\n\n\n==========================================================\n')
-  auditing_items += str('==========   Quantidade de linhas no Json        =========\n')
-  auditing_items += str('==========================================================\n\n\n')
-  auditing_items += str(len(json_list))
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
 
-  file_out = "{0}-auditing.log".format(filename)
-  with codecs.open(file_out, "w") as fo:
-    fo.write(auditing_items)
+      '''
+  return {
+    'tags_auditing': {},
+    'tag_k_auditing': {},
+    'tag_k_v_yes_no_auditing': set(),
+    'postal_code': set(),
+    'street_address': {}
+  }
 
-  # pprint.pprint('====================================================') 
-  # pprint.pprint(tags_auditing)
-  # pprint.pprint('====================================================') 
-  # print_items_sorted(tag_k_auditing)
-  # pprint.pprint('====================================================') 
-  # pprint.pprint(tag_k_v_yes_no_auditing)
-  # pprint.pprint('====================================================') 
-  # pprint.pprint(postal_code)
-  # pprint.pprint('====================================================')
-  # print_items_sorted(street_address, key_value=0, reverse=True)
-  # pprint.pprint('====================================================')
- 
+def audit_element(auditing, element):
+  ''' Function: audit_element.
+
+      The function will receive 02 parameters.
+      This function will be called in the `main` and will run all the `audit_*` functions
+      over the element provided.
+
+      Args:
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        element (element key): represents the element to be audited.
+
+      Returns:
+          the auditing state updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  auditing['street_address'] = audit_street_name(auditing['street_address'], element)
+  auditing['postal_code'] = audit_postal_code(auditing['postal_code'], element)
+  audit_count_tag_attribute_k_with_v_yes_no(auditing['tag_k_v_yes_no_auditing'], element)
+  auditing['tag_k_auditing'] = audit_count_tag_attribute_k(auditing['tag_k_auditing'], element)
+
+  if element.tag in MAIN_TAGS:
+    auditing['tags_auditing'] = audit_tags_subtags(auditing['tags_auditing'], element)
+  return auditing
+
+def audit_main_element(auditing, element, new_restrictions_keys=None):
+  ''' Function: audit_main_element.
+
+      The function will receive 03 parameters.
+      This function will be called in the `main` for each ``node``, ``way`` or ``relation`` and
+      will audit the sub elements and after the element, in the same order of the end of their
+      parsing.
+
+      Args:
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        element (element key): represents the element to be audited.
+        new_restrictions_keys (list): if provided, the keys found as restrictions keys for the
+          first time in this element will be appended.
+
+      Returns:
+          the auditing state updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  keys_found = auditing['tag_k_v_yes_no_auditing']
+  for sub_element in element.sub_elements:
+    if new_restrictions_keys is not None and sub_element.tag == 'tag':
+      k = sub_element.attrib['k']
+      known = k in keys_found
+      audit_element(auditing, sub_element)
+      if not known and k in keys_found:
+        new_restrictions_keys.append(k)
+    else:
+      audit_element(auditing, sub_element)
+
+  return audit_element(auditing, element)
+
+def audit_elements(auditing, elements, new_restrictions_keys=None):
+  ''' Function: audit_elements.
+
+      The function will receive 03 parameters.
+      This function will be called in the `main` and will audit a batch of ``node``, ``way`` or
+      ``relation`` with the same result of the `audit_main_element` for each one of them.
+
+      The keys counted are gathered in lists for the whole batch and counted at once with
+      `collections.Counter`, so the dictionaries of the auditing state are updated once for
+      each key of the batch instead of once for each element. The batch is merged with the
+      `merge_count_dict`, that keeps the order of the first occurrence of the keys.
+
+      Args:
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        elements (list): the elements to be audited, in the order of the file.
+        new_restrictions_keys (list): if provided, the keys found as restrictions keys for the
+          first time in these elements will be appended.
+
+      Returns:
+          the auditing state updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  keys_found = auditing['tag_k_v_yes_no_auditing']
+  postal_code = auditing['postal_code']
+  tag_k = []
+  street_names = []
+  # chaves contadas por tag, 'subtags' marca a posicao em que o dicionario de subtags foi criado
+  tags_keys = {}
+  subtags_keys = {}
+
+  for element in elements:
+    keys = tags_keys.get(element.tag)
+    if keys is None:
+      keys = tags_keys[element.tag] = []
+    keys.append('quantidade')
+    keys.extend(element.attrib)
+
+    sub_elements = element.sub_elements
+    if not sub_elements:
+      continue
+    keys.append('subtags')
+    sub_tags = subtags_keys.get(element.tag)
+    if sub_tags is None:
+      sub_tags = subtags_keys[element.tag] = {}
+
+    for sub_element in sub_elements:
+      attrib = sub_element.attrib
+      keys = sub_tags.get(sub_element.tag)
+      if keys is None:
+        keys = sub_tags[sub_element.tag] = []
+      keys.append('quantidade')
+      keys.extend(attrib)
+
+      if sub_element.tag == 'tag':
+        k = attrib['k']
+        tag_k.append(k)
+        if k == 'addr:street':
+          street_names.extend(attrib['v'].upper().split(' '))
+        elif k in POSTAL_CODE_KEYS:
+          audit_postal_code(postal_code, sub_element)
+        if k not in keys_found and is_restrictions_key(k, attrib['v']):
+          keys_found.add(k)
+          if new_restrictions_keys is not None:
+            new_restrictions_keys.append(k)
+
+  tags_auditing = {}
+  for tag, keys in tags_keys.items():
+    counts = dict(Counter(keys))
+    if 'subtags' in counts:
+      counts['subtags'] = dict((sub_tag, dict(Counter(sub_keys))) for sub_tag, sub_keys in subtags_keys[tag].items())
+    tags_auditing[tag] = counts
+
+  merge_count_dict(auditing['tags_auditing'], tags_auditing)
+  merge_count_dict(auditing['tag_k_auditing'], Counter(tag_k))
+  merge_count_dict(auditing['street_address'], Counter(street_names))
+  return auditing
+
+def iter_batches(elements, size=AUDIT_BATCH_SIZE):
+  ''' Function: iter_batches.
+
+      The function will receive 02 parameters.
+      This function will be called in the `main` and will group the elements for the `audit_elements`.
+      The elements are kept until their batch is audited, so they must not be released by the parser
+      (the `OSMRecord` of the `iter_elements`).
+
+      Args:
+        elements (iterable): the elements, in the order of the file.
+        size (int): the maximum number of elements of each batch.
+
+      Returns:
+          a generator of lists with up to ``size`` elements.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  batch = []
+  for element in elements:
+    batch.append(element)
+    if len(batch) >= size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+def rebuild_node_with_tags(node, tags, restrictions_keys):
+  ''' Function: rebuild_node_with_tags.
+
+      The function will receive 03 parameters.
+      This function will be called by the single pass mode of the `main` when a key of the node
+      was discovered as a restriction key after the node was processed.
+
+      Args:
+        node (dict): the node already processed by `process_json`.
+        tags (list): pairs ``(k, v)`` of the sub elements ``tag`` of the node.
+        restrictions_keys (set): The final keys that represents the restrictions of the node.
+
+      Returns:
+          a new node equal to the one created by `process_json` with the final restrictions keys.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  rebuilt = {}
+  for key in BASIC_NODE_KEYS:
+    if key in node:
+      rebuilt[key] = node[key]
+  return process_tags_to_node(tags, rebuilt, restrictions_keys)
+
+def load_restrictions_keys(file_in):
+  ''' Function: load_restrictions_keys.
+
+      The function will receive 01 parameter.
+      This function will load the restrictions keys persisted by a previous execution of the `main`.
+
+      Args:
+        file_in (str): the file created by `save_restrictions_keys`.
+
+      Returns:
+          the set of restrictions keys.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  with codecs.open(file_in, "r") as fi:
+    return set(json.load(fi))
+
+def save_restrictions_keys(filename, restrictions_keys):
+  ''' Function: save_restrictions_keys.
+
+      The function will receive 02 parameters.
+      This function will be called in the `main` and will persist the restrictions keys found in
+      the audit, so the next single pass execution can process the nodes without waiting the audit.
+
+      Args:
+        filename (str): the OSM file processed.
+        restrictions_keys (set): the restrictions keys found in the audit.
+
+      Returns:
+          the name of the file created.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  file_out = "{0}-restrictions-keys.json".format(filename)
+  with codecs.open(file_out, "w") as fo:
+    fo.write(json.dumps(sorted(restrictions_keys)))
+  return file_out
+
+def iter_elements(source, backend=None):
+  ''' Function: iter_elements.
+
+      The function will receive 02 parameters.
+      This function will be called by the `process_two_pass`, `process_single_pass` and the
+      workers of the `process_parallel` and will yield every ``node``, ``way`` or ``relation``
+      of the XML file at the end of its parsing.
+
+      Each element is an `osm_parser.OSMRecord` with the attributes, the ``(k, v)`` pairs of
+      the ``tag``, the ``ref`` of the ``nd`` and the ``member`` gathered while it is parsed, so
+      no element tree is kept and the memory used will not grow with the size of the file.
+
+      Args:
+        source (str): the OSM file (or binary file object) to be parsed.
+        backend (str): the parser of the `osm_parser` (``lxml``, ``expat`` or ``etree``),
+          if not provided lxml will be used when installed.
+
+      If an area was set by `set_area_filter` only the elements in the area are returned
+      (see `osm_spatial.filter_elements`). If the metrics were set by `set_metrics` the elements,
+      the tags and the bytes read are counted and the progress is printed.
+
+      Returns:
+          a generator of the records parsed.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  if metrics is not None:
+    if isinstance(source, str):
+      size = None if osm_io.is_compressed(source) else os.path.getsize(source)
+      return osm_parser.iter_opened(source, lambda fi: iter_elements(metrics.metered_file(fi, size), backend))
+    metered = source if isinstance(source, osm_metrics.MeteredFile) else None
+    elements = metrics.iter_elements(osm_parser.iterrecords(source, MAIN_TAGS, backend), metered)
+  else:
+    elements = osm_parser.iterrecords(source, MAIN_TAGS, backend)
+  if area_filter is not None:
+    return osm_spatial.filter_elements(elements, area_filter)
+  return elements
+
+area_filter = None
+
+def set_area_filter(area):
+  ''' Function: set_area_filter.
+
+      The function will receive 01 parameter.
+      This function will be called in the `main` and will set the area used by the `iter_elements`,
+      the nodes out of the area are dropped before they are audited and processed.
+
+      Args:
+        area (BBox or Polygon): the area of the `osm_spatial`, `None` processes the whole file.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  global area_filter
+  area_filter = area
+
+metrics = None
+
+def set_metrics(new_metrics):
+  ''' Function: set_metrics.
+
+      The function will receive 01 parameter.
+      This function will be called in the `main` and will set the metrics used by the `iter_elements`,
+      the `INSTRUMENTED_FUNCTIONS` are replaced by functions that accumulate their time in the metrics.
+      The functions of the previous metrics are restored.
+
+      Args:
+        new_metrics (osm_metrics.Metrics): the metrics of the execution, `None` value removes them.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  global metrics
+  if metrics is not None:
+    metrics.restore()
+  metrics = new_metrics
+  if metrics is not None:
+    metrics.instrument(globals(), INSTRUMENTED_FUNCTIONS)
+
+compact_documents = False
+
+def set_compact_documents(enabled):
+  ''' Function: set_compact_documents.
+
+      The function will receive 01 parameter.
+      This function will be called in the `main`. If ``enabled`` is True the nodes kept in memory
+      until the json is written are packed by `osm_document.pack` and converted back to dicts only
+      when they are written, less memory for more time to pack and unpack them.
+
+      Args:
+        enabled (bool): True to keep the nodes as `osm_document.CompactDocument`.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  global compact_documents
+  compact_documents = enabled
+
+def keep_document(node):
+  ''' Function: keep_document.
+
+      The function will receive 01 parameter.
+      This function will be called for the nodes kept in memory, it returns the node packed
+      if it was enabled by `set_compact_documents`.
+
+      Args:
+        node (dict): the node processed by `process_json`.
+
+      Returns:
+          the node or its `osm_document.CompactDocument`.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  if compact_documents:
+    return osm_document.pack(node)
+  return node
+
+def process_two_pass(filename, auditing, backend=None):
+  ''' Function: process_two_pass.
+
+      The function will receive 03 parameters.
+      This function will be called in the `main`. The file will be parsed twice, the first time
+      to audit the elements and find the restrictions keys and the second time to process the json.
+
+      Args:
+        filename (str): the OSM file to be processed.
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        backend (str): the parser used (see `iter_elements`).
+
+      Returns:
+          a generator of the nodes processed.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  pprint.pprint('Inicio Auditoria ' + str(datetime.now()))
+  for elements in iter_batches(iter_elements(filename, backend)):
+    audit_elements(auditing, elements)
+
+  pprint.pprint('Fim auditoria e inicio Limpeza e estrutucação dos dados ' + str(datetime.now()))
+  for element in iter_elements(filename, backend):
+    yield process_json(element, auditing['tag_k_v_yes_no_auditing'])
+
+def process_single_pass(filename, auditing, restrictions_keys=None, backend=None):
+  ''' Function: process_single_pass.
+
+      The function will receive 04 parameters.
+      This function will be called in the `main`. The file will be parsed only once, every element
+      will be audited and processed to json in the same iteration.
+
+      The restrictions keys are only known at the end of the audit, so if ``restrictions_keys``
+      is provided (persisted by a previous execution) it will be used to process the nodes and
+      each node is returned as soon as it is processed.
+      Otherwise the nodes will be processed with the keys found until that moment and the nodes
+      with a key found as restriction later will be rebuilt at the end, so the result is the same
+      of the `process_two_pass`, but the nodes are only returned at the end of the file, packed
+      if it was enabled by `set_compact_documents`.
+
+      Args:
+        filename (str): the OSM file to be processed.
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        restrictions_keys (set): the restrictions keys persisted by `save_restrictions_keys`.
+        backend (str): the parser used (see `iter_elements`).
+
+      Returns:
+          a generator of the nodes processed.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  json_list = []
+  keys_found = auditing['tag_k_v_yes_no_auditing']
+  # indice do primeiro elemento processado depois da chave ser encontrada
+  keys_found_index = {}
+  pending_tags = {}
+
+  pprint.pprint('Inicio Auditoria, Limpeza e estrutucação dos dados ' + str(datetime.now()))
+  for element in iter_elements(filename, backend):
+    new_restrictions_keys = []
+    audit_main_element(auditing, element, new_restrictions_keys)
+    for k in new_restrictions_keys:
+      keys_found_index[k] = len(json_list)
+
+    if restrictions_keys is not None:
+      yield process_json(element, restrictions_keys)
+      continue
+
+    node = process_json(element, keys_found)
+    if node is not None:
+      tags = element.tags
+      if any(k not in keys_found for k, v in tags):
+        pending_tags[len(json_list)] = tags
+    json_list.append(keep_document(node))
+
+  if restrictions_keys is not None:
+    if restrictions_keys != keys_found:
+      pprint.pprint('Chaves de restricao persistidas diferentes da auditoria, execute novamente com as chaves atualizadas')
+    return
+
+  for i, tags in pending_tags.items():
+    if any(keys_found_index.get(k, -1) > i for k, v in tags):
+      json_list[i] = keep_document(rebuild_node_with_tags(osm_document.unpack(json_list[i]), tags, keys_found))
+
+  # cada node e liberado ao ser retornado, o main mantem a sua propria lista
+  for i, node in enumerate(json_list):
+    json_list[i] = None
+    yield node
+
+def subtract_count_dict(counts, other):
+  ''' Function: subtract_count_dict.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `apply_auditing_delta` and is the inverse of the
+      `merge_count_dict`, the counters that reach zero are removed, like if the element was never
+      audited.
+
+      Args:
+        counts (dict): the counters that will be updated.
+        other (dict): the counters of the element removed.
+
+      Returns:
+          the counters updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  for key, value in other.items():
+    if key not in counts:
+      continue
+    if isinstance(value, dict):
+      subtract_count_dict(counts[key], value)
+      if len(counts[key]) == 0:
+        del counts[key]
+    else:
+      counts[key] -= value
+      if counts[key] <= 0:
+        del counts[key]
+  return counts
+
+def apply_auditing_delta(auditing, set_counts, element, sign=1):
+  ''' Function: apply_auditing_delta.
+
+      The function will receive 04 parameters.
+      This function will be called by the function `process_incremental` and will add (``sign`` 1)
+      or remove (``sign`` -1) the audit of one element from the auditing state.
+
+      The ``tag_k_v_yes_no_auditing`` and ``postal_code`` are sets, so ``set_counts`` keeps the
+      number of elements with each value and the value is removed when no element has it.
+
+      Args:
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        set_counts (dict): the number of elements of each value of the sets of the auditing.
+        element (OSMRecord): the element added or removed.
+        sign (int): 1 to add the element or -1 to remove it.
+
+      Returns:
+          the auditing state updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  delta = audit_main_element(new_auditing_state(), element)
+  for name in COUNT_AUDITING_KEYS:
+    if sign > 0:
+      merge_count_dict(auditing[name], delta[name])
+    else:
+      subtract_count_dict(auditing[name], delta[name])
+
+  for name in SET_AUDITING_KEYS:
+    counts = set_counts.setdefault(name, {})
+    for value in delta[name]:
+      counts[value] = counts.get(value, 0) + sign
+      if counts[value] <= 0:
+        del counts[value]
+    auditing[name] = set(counts)
+  return auditing
+
+def record_state(state, elements, documents, set_counts):
+  ''' Function: record_state.
+
+      The function will receive 04 parameters.
+      This function will be called in the `main` when a state file is provided and will save
+      each element with its node in the state, so the next executions can be incremental.
+      The elements and the nodes must be in the same order, the order of the file.
+
+      Args:
+        state (OSMState): the state file opened by `osm_state.OSMState`.
+        elements (iterable): the elements of the file (see `iter_elements`).
+        documents (iterable): the nodes processed from the elements.
+        set_counts (dict): updated with the number of elements of each value of the auditing sets.
+
+      Returns:
+          a generator of the nodes, after they are saved.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  for name in SET_AUDITING_KEYS:
+    set_counts.setdefault(name, {})
+
+  for element, node in zip(elements, documents):
+    delta = audit_main_element(new_auditing_state(), element)
+    for name in SET_AUDITING_KEYS:
+      for value in delta[name]:
+        set_counts[name][value] = set_counts[name].get(value, 0) + 1
+    state.put(osm_state.element_key(element), element, node)
+    yield node
+
+def auditing_to_json(auditing):
+  ''' Function: auditing_to_json.
+
+      The function will receive 01 parameter.
+      This function will be called by the `save_state` and the `save_checkpoint` and will convert
+      the sets of the auditing state to lists, so it can be saved as json.
+
+      Args:
+        auditing (dict): the auditing state created by `new_auditing_state`.
+
+      Returns:
+          a dictionary that can be saved with `json.dump`.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  return dict((k, list(v) if isinstance(v, set) else v) for k, v in auditing.items())
+
+def auditing_from_json(auditing, saved):
+  ''' Function: auditing_from_json.
+
+      The function will receive 02 parameters.
+      This function is the inverse of the `auditing_to_json`.
+
+      Args:
+        auditing (dict): the auditing state created by `new_auditing_state`, it will be updated.
+        saved (dict): the auditing state returned by `auditing_to_json`.
+
+      Returns:
+          the auditing state updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  for key, value in saved.items():
+    auditing[key] = set(value) if key in SET_AUDITING_KEYS else value
+  return auditing
+
+def save_state(state, auditing, set_counts):
+  ''' Function: save_state.
+
+      The function will receive 03 parameters.
+      This function will be called in the `main` after the json is written and will save the
+      auditing state in the state file. The changes are committed when the `main` closes the
+      state at the end of the execution, so an execution that fails keeps the previous state.
+
+      Args:
+        state (OSMState): the state file opened by `osm_state.OSMState`.
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        set_counts (dict): the number of elements of each value of the auditing sets.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  state.save_meta('auditing', auditing_to_json(auditing))
+  state.save_meta('set_counts', set_counts)
+
+def load_state(state, auditing):
+  ''' Function: load_state.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `process_incremental` and will load the
+      auditing state saved by `save_state`.
+
+      Args:
+        state (OSMState): the state file opened by `osm_state.OSMState`.
+        auditing (dict): the auditing state created by `new_auditing_state`, it will be updated.
+
+      Returns:
+          the number of elements of each value of the auditing sets.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  saved = state.load_meta('auditing')
+  if saved is None:
+    raise ValueError('{0} has no state, run the full process with the state file first'.format(state.path))
+  auditing_from_json(auditing, saved)
+  return state.load_meta('set_counts', {})
+
+def iter_version_changes(filename, state, backend=None):
+  ''' Function: iter_version_changes.
+
+      The function will receive 03 parameters.
+      This function will be called in the `main` when the incremental mode has no osmChange file
+      and will compare the ``version`` of each element of the new file with the version in the state.
+
+      Args:
+        filename (str): the new OSM file.
+        state (OSMState): the state file opened by `osm_state.OSMState`.
+        backend (str): the parser used (see `iter_elements`).
+
+      Returns:
+          a generator of ``(action, element)`` with the actions ``create``, ``modify`` and ``delete``
+          of the osmChange files.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  seen = set()
+  for element in iter_elements(filename, backend):
+    key = osm_state.element_key(element)
+    seen.add(key)
+    version = state.get_version(key)
+    if version is None:
+      yield 'create', element
+    elif version != element.get('version'):
+      yield 'modify', element
+
+  deleted = [key for key in state.keys() if key not in seen]
+  for key in deleted:
+    tag, id = key.split('/', 1)
+    yield 'delete', osm_parser.OSMRecord(tag, {'id': id})
+
+def process_incremental(state, changes, auditing):
+  ''' Function: process_incremental.
+
+      The function will receive 03 parameters.
+      This function will be called in the `main` and will update the state with the elements
+      created, modified or deleted since the last execution, only these elements are audited
+      and processed.
+
+      The audit of the previous version of the element is removed and the audit of the new one
+      is added. The nodes are processed after all the changes are audited, with the final
+      restrictions keys, and if the restrictions keys changed the nodes of the state with the
+      keys changed are processed again, so the state has the same documents and the same audit
+      counters of a full execution, but not in the same order: the elements created are appended
+      after the others (the osmChange has no position in the file) and the keys of the auditing
+      dicts keep the order they were found in the executions. The json and the auditing log have
+      the content of a full execution in another order.
+
+      Args:
+        state (OSMState): the state file opened by `osm_state.OSMState`.
+        changes (iterable): the ``(action, element)`` of `osm_parser.iterchanges` or `iter_version_changes`.
+        auditing (dict): the auditing state created by `new_auditing_state`, it will be loaded from the state.
+
+      Returns:
+          an ordered dictionary with the key of each element changed and its action, ``upsert`` or ``delete``.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  set_counts = load_state(state, auditing)
+  keys_before = set(auditing['tag_k_v_yes_no_auditing'])
+  changed = OrderedDict()
+
+  for action, element in changes:
+    key = osm_state.element_key(element)
+    old = state.get(key)
+    if old is not None:
+      apply_auditing_delta(auditing, set_counts, old[1], -1)
+
+    if action == 'delete':
+      if old is not None:
+        state.delete(key)
+        changed[key] = 'delete'
+      continue
+
+    apply_auditing_delta(auditing, set_counts, element, 1)
+    state.put(key, element, None)
+    changed[key] = 'upsert'
+
+  restrictions_keys = auditing['tag_k_v_yes_no_auditing']
+  keys_changed = keys_before ^ restrictions_keys
+  if keys_changed:
+    pprint.pprint('Chaves de restricao alteradas: {0}'.format(sorted(keys_changed)))
+    rebuild = [key for key, element in state.iter_records()
+               if key not in changed and any(k in keys_changed for k, v in element.tags)]
+    for key in rebuild:
+      changed[key] = 'upsert'
+
+  for key, action in changed.items():
+    if action == 'upsert':
+      version, element, node = state.get(key)
+      state.put_document(key, process_json(element, restrictions_keys))
+
+  save_state(state, auditing, set_counts)
+  return changed
+
+def write_changes(file_out, state, changed, typed=False):
+  ''' Function: write_changes.
+
+      The function will receive 04 parameters.
+      This function will be called in the `main` after the `process_incremental` and will write one
+      change per line, to be applied in the mongodb by ``data_insert_in_mongodb.py --changes``.
+
+      Args:
+        file_out (str): the ndjson file to be created.
+        state (OSMState): the state file opened by `osm_state.OSMState`.
+        changed (dict): the keys and actions returned by `process_incremental`.
+        typed (bool): True to write the ids and the nodes with the typed schema, like the json loaded.
+
+      Returns:
+          the number of changes written.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  with codecs.open(file_out, "w") as fo:
+    for key, action in changed.items():
+      tag, id = key.split('/', 1)
+      change = {'action': action, 'type': tag, 'id': osm_typed.to_int_value(id) if typed else id}
+      if action == 'upsert':
+        change['document'] = state.get(key)[2]
+        if typed:
+          change['document'] = osm_typed.typed_document(change['document'])
+      fo.write(json.dumps(change))
+      fo.write('\n')
+  return len(changed)
+
+def find_main_tag_start(fi, offset, block_size=65536):
+  ''' Function: find_main_tag_start.
+
+      The function will receive 03 parameters.
+      This function will be called by the function `find_shard_ranges` and will look for the
+      first ``<node``, ``<way`` or ``<relation`` of the file from the offset provided.
+
+      Args:
+        fi (file): the OSM file opened as binary.
+        offset (int): the byte offset where the search will start.
+        block_size (int): the number of bytes read each time.
+
+      Returns:
+          the byte offset of the element found, otherwise `None` value.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  fi.seek(offset)
+  overlap = b''
+  while True:
+    block = fi.read(block_size)
+    if not block:
+      return None
+    data = overlap + block
+    match = main_tag_start.search(data)
+    if match:
+      return offset - len(overlap) + match.start()
+    offset += len(block)
+    overlap = data[-16:]
+
+def find_shard_ranges(filename, shards):
+  ''' Function: find_shard_ranges.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `process_parallel` and will split the file in
+      byte ranges with about the same size. Every range starts in a top level element (``node``,
+      ``way`` or ``relation``) and the last one ends before ``</osm>``.
+
+      Args:
+        filename (str): the OSM file to be split.
+        shards (int): the number of ranges desired.
+
+      Returns:
+          a list of tuples ``(start, end)`` in the order of the file.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  size = os.path.getsize(filename)
+  with open(filename, 'rb') as fi:
+    start = find_main_tag_start(fi, 0)
+    fi.seek(max(0, size - 4096))
+    tail = fi.read()
+    end = size - len(tail) + tail.rfind(b'</osm>')
+    if start is None or start >= end:
+      return []
+
+    step = max((end - start) // shards, 1)
+    offsets = [start]
+    for i in range(1, shards):
+      offset = find_main_tag_start(fi, start + i * step)
+      if offset is None or offset >= end:
+        break
+      if offset > offsets[-1]:
+        offsets.append(offset)
+    offsets.append(end)
+  return list(zip(offsets[:-1], offsets[1:]))
+
+def read_shard(filename, shard):
+  ''' Function: read_shard.
+
+      The function will receive 02 parameters.
+      This function will be called by the workers of the `process_parallel` and will read the
+      byte range of the shard inside a new ``osm`` root, so it can be parsed alone.
+
+      Args:
+        filename (str): the OSM file.
+        shard (tuple): the byte range ``(start, end)`` created by `find_shard_ranges`.
+
+      Returns:
+          a binary file object with the XML of the shard.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  start, end = shard
+  with open(filename, 'rb') as fi:
+    fi.seek(start)
+    data = fi.read(end - start)
+  return io.BytesIO(b'<osm>' + data + b'</osm>')
+
+def audit_shard(task):
+  ''' Function: audit_shard.
+
+      The function will receive 01 parameter.
+      This function will be called by the workers of the `process_parallel` and will audit all
+      the elements of the shard.
+
+      Args:
+        task (tuple): ``(filename, shard, backend)``.
+
+      Returns:
+          the auditing state of the shard.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  filename, shard, backend = task
+  auditing = new_auditing_state()
+  for elements in iter_batches(iter_elements(read_shard(filename, shard), backend)):
+    audit_elements(auditing, elements)
+  return auditing
+
+def process_shard(task):
+  ''' Function: process_shard.
+
+      The function will receive 01 parameter.
+      This function will be called by the workers of the `process_parallel` and will process to
+      json all the elements of the shard. If ``audit`` is True the elements will be audited too.
+
+      Args:
+        task (tuple): ``(filename, shard, restrictions_keys, audit, backend)``.
+
+      Returns:
+          a tuple with the auditing state (or `None` value), the json list of the shard and
+          the counters of the `normalize_cached` in the shard.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  filename, shard, restrictions_keys, audit, backend = task
+  reset_normalize_cache_stats()
+  auditing = new_auditing_state() if audit else None
+  json_list = []
+  for elements in iter_batches(iter_elements(read_shard(filename, shard), backend)):
+    if audit:
+      audit_elements(auditing, elements)
+    json_list.extend(process_json(element, restrictions_keys) for element in elements)
+  return auditing, json_list, dict(normalize_cache_stats)
+
+def merge_count_dict(counts, other):
+  ''' Function: merge_count_dict.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `merge_auditing_state` and will sum the
+      counters of ``other`` in ``counts``, including the nested dictionaries like ``subtags``.
+      The keys keep the order of the first occurrence, as if the file was audited by one process.
+
+      Args:
+        counts (dict): the counters that will be updated.
+        other (dict): the counters of the next shard.
+
+      Returns:
+          the counters updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  for key, value in other.items():
+    if key not in counts:
+      counts[key] = value
+    elif isinstance(value, dict):
+      merge_count_dict(counts[key], value)
+    else:
+      counts[key] += value
+  return counts
+
+def merge_auditing_state(auditing, other):
+  ''' Function: merge_auditing_state.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `process_parallel` and will merge the auditing
+      state of a shard in the auditing state of the file. The shards must be merged in the order
+      of the file.
+
+      Args:
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        other (dict): the auditing state of the next shard.
+
+      Returns:
+          the auditing state updated.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  merge_count_dict(auditing['tags_auditing'], other['tags_auditing'])
+  merge_count_dict(auditing['tag_k_auditing'], other['tag_k_auditing'])
+  merge_count_dict(auditing['street_address'], other['street_address'])
+  auditing['tag_k_v_yes_no_auditing'].update(other['tag_k_v_yes_no_auditing'])
+  auditing['postal_code'].update(other['postal_code'])
+  return auditing
+
+def process_parallel(filename, auditing, workers, restrictions_keys=None, backend=None):
+  ''' Function: process_parallel.
+
+      The function will receive 05 parameters.
+      This function will be called in the `main`. The file will be split in shards by
+      `find_shard_ranges` and the shards will be processed by a pool of ``workers`` processes.
+      The results are merged in the order of the shards, so the json and the auditing are the
+      same of the `process_two_pass`.
+
+      If ``restrictions_keys`` is not provided the shards will be audited first to find the
+      restrictions keys and processed after, otherwise each shard will be audited and processed
+      at the same time.
+
+      Args:
+        filename (str): the OSM file to be processed.
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        workers (int): the number of processes.
+        restrictions_keys (set): the restrictions keys persisted by `save_restrictions_keys`.
+        backend (str): the parser used by the workers (see `iter_elements`).
+
+      Returns:
+          a generator of the nodes processed.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  shards = max(workers * SHARDS_PER_WORKER, os.path.getsize(filename) // SHARD_MAX_SIZE)
+  shards = find_shard_ranges(filename, shards)
+
+  with multiprocessing.Pool(workers, set_normalize_cache_size, (normalize_cache_size,)) as pool:
+    audit = restrictions_keys is None
+    if audit:
+      pprint.pprint('Inicio Auditoria ' + str(datetime.now()))
+      for shard_auditing in pool.imap(audit_shard, [(filename, shard, backend) for shard in shards]):
+        merge_auditing_state(auditing, shard_auditing)
+      restrictions_keys = auditing['tag_k_v_yes_no_auditing']
+      pprint.pprint('Fim auditoria e inicio Limpeza e estrutucação dos dados ' + str(datetime.now()))
+
+    tasks = [(filename, shard, restrictions_keys, not audit, backend) for shard in shards]
+    for shard_auditing, json_list, cache_stats in pool.imap(process_shard, tasks):
+      merge_count_dict(normalize_cache_stats, cache_stats)
+      if shard_auditing is not None:
+        merge_auditing_state(auditing, shard_auditing)
+      for node in json_list:
+        yield node
+
+  if not audit and restrictions_keys != auditing['tag_k_v_yes_no_auditing']:
+    pprint.pprint('Chaves de restricao persistidas diferentes da auditoria, execute novamente com as chaves atualizadas')
+
+def load_checkpoint(checkpoint_file, filename):
+  ''' Function: load_checkpoint.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `process_checkpointed` and will load the last
+      checkpoint saved by `save_checkpoint`, if it was created for the same file.
+
+      Args:
+        checkpoint_file (str): the checkpoint file.
+        filename (str): the OSM file processed.
+
+      Returns:
+          the checkpoint (dict), otherwise `None` value.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  if not os.path.exists(checkpoint_file):
+    return None
+  with codecs.open(checkpoint_file, "r") as fi:
+    checkpoint = json.load(fi)
+  if checkpoint.get('size') != os.path.getsize(filename):
+    pprint.pprint('Checkpoint de outro arquivo, o processo sera iniciado do inicio')
+    return None
+  return checkpoint
+
+def save_checkpoint(checkpoint_file, checkpoint):
+  ''' Function: save_checkpoint.
+
+      The function will receive 02 parameters.
+      This function will be called by the function `process_checkpointed` after each range of the
+      file and will replace the checkpoint file, the new one is written in a temporary file first
+      so the checkpoint is never left incomplete.
+
+      Args:
+        checkpoint_file (str): the checkpoint file.
+        checkpoint (dict): the phase, offset, last element, auditing state and json written.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  file_tmp = checkpoint_file + '.tmp'
+  with codecs.open(file_tmp, "w") as fo:
+    json.dump(checkpoint, fo)
+    fo.flush()
+    os.fsync(fo.fileno())
+  os.replace(file_tmp, checkpoint_file)
+
+def split_shards_at(shards, offset):
+  ''' Function: split_shards_at.
+
+      The function will receive 02 parameters.
+      This function will be called by the `process_checkpointed` for the checkpoints saved without
+      their byte ranges, the range with the offset inside it is split in two, so the process
+      continues exactly at the offset saved.
+
+      Args:
+        shards (list): the ranges ``(start, end)`` of the `find_shard_ranges`.
+        offset (int): the offset of the checkpoint, the start of an element.
+
+      Returns:
+          the list of the ranges.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  result = []
+  for start, end in shards:
+    if start < offset < end:
+      result.extend([(start, offset), (offset, end)])
+    else:
+      result.append((start, end))
+  return result
+
+def process_checkpointed(filename, auditing, file_out, output_format='json', restrictions_keys=None, backend=None,
+                         checkpoint_size=CHECKPOINT_SIZE, typed=False):
+  ''' Function: process_checkpointed.
+
+      The function will receive 08 parameters.
+      This function will be called in the `main` when the checkpoints are enabled. The file is
+      read in byte ranges of about ``checkpoint_size`` (see `find_shard_ranges`) and after each
+      range the checkpoint ``<osm>-checkpoint.json`` is saved with the phase, the offset of the
+      next range, the last element processed, the auditing state and the size of the json written.
+
+      If the checkpoint exists the process continues from its offset: the audit is restored and
+      the json is truncated to the size saved, so the result is the same of an uninterrupted
+      execution. The byte ranges are saved in the checkpoint and reused, so the ``checkpoint_size``
+      of the execution that continues is ignored. Like the `process_two_pass`, the file is audited before the json is written,
+      unless the ``restrictions_keys`` are provided. The checkpoint is removed at the end.
+
+      Args:
+        filename (str): the OSM file to be processed.
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        file_out (str): the json file to be created.
+        output_format (str): ``json`` or ``ndjson``.
+        restrictions_keys (set): the restrictions keys persisted by `save_restrictions_keys`.
+        backend (str): the parser used (see `iter_elements`).
+        checkpoint_size (int): the number of bytes of the file read between the checkpoints.
+        typed (bool): True to write the nodes with the typed schema (see `osm_typed.typed_document`).
+
+      Returns:
+          the number of nodes written.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  checkpoint_file = "{0}-checkpoint.json".format(filename)
+  audit = restrictions_keys is None
+
+  checkpoint = load_checkpoint(checkpoint_file, filename)
+  if checkpoint is None:
+    shards = find_shard_ranges(filename, max(1, os.path.getsize(filename) // checkpoint_size))
+    checkpoint = {'size': os.path.getsize(filename), 'phase': 'audit' if audit else 'process', 'offset': 0,
+                  'last_element': None, 'json_count': 0, 'json_position': 0, 'checkpoint_size': checkpoint_size,
+                  'shards': shards}
+  else:
+    # as partes do checkpoint sao mantidas, com outro checkpoint_size o offset salvo cairia no meio de uma parte
+    if 'shards' in checkpoint:
+      shards = [tuple(shard) for shard in checkpoint['shards']]
+    else:
+      shards = split_shards_at(find_shard_ranges(filename, max(1, os.path.getsize(filename) // checkpoint_size)),
+                               checkpoint['offset'])
+    if checkpoint.get('checkpoint_size', checkpoint_size) != checkpoint_size:
+      pprint.pprint('Checkpoint gravado com outro --checkpoint-size ({0} MB), as partes do checkpoint serao usadas'.format(
+        checkpoint['checkpoint_size'] // (1024 * 1024)))
+    auditing_from_json(auditing, checkpoint['auditing'])
+    merge_count_dict(normalize_cache_stats, checkpoint['cache_stats'])
+    pprint.pprint('Continuando do checkpoint: {0} {1}, depois de {2}'.format(
+      checkpoint['phase'], checkpoint['offset'], checkpoint['last_element']))
+
+  def save(phase, offset, last_element, json_count=0, json_position=0):
+    checkpoint.update({'phase': phase, 'offset': offset, 'last_element': last_element, 'json_count': json_count,
+                       'json_position': json_position, 'auditing': auditing_to_json(auditing),
+                       'cache_stats': normalize_cache_stats})
+    save_checkpoint(checkpoint_file, checkpoint)
+
+  if checkpoint['phase'] == 'audit':
+    pprint.pprint('Inicio Auditoria ' + str(datetime.now()))
+    for shard in shards:
+      if shard[0] < checkpoint['offset']:
+        continue
+      element = None
+      for elements in iter_batches(iter_elements(read_shard(filename, shard), backend)):
+        audit_elements(auditing, elements)
+        element = elements[-1]
+      save('audit', shard[1], osm_state.element_key(element) if element is not None else None)
+    save('process', 0, None)
+    pprint.pprint('Fim auditoria e inicio Limpeza e estrutucação dos dados ' + str(datetime.now()))
+
+  if audit:
+    restrictions_keys = auditing['tag_k_v_yes_no_auditing']
+
+  json_count = checkpoint['json_count']
+  with open(file_out, 'r+b' if json_count > 0 else 'wb') as fo:
+    fo.seek(checkpoint['json_position'] if json_count > 0 else 0)
+    fo.truncate()
+    if json_count == 0 and output_format != 'ndjson':
+      fo.write(b'[')
+
+    for shard in shards:
+      if shard[0] < checkpoint['offset']:
+        continue
+      element = None
+      for element in iter_elements(read_shard(filename, shard), backend):
+        if not audit:
+          audit_main_element(auditing, element)
+        document = process_json(element, restrictions_keys)
+        if typed:
+          document = osm_typed.typed_document(document)
+        document = json.dumps(document).encode('utf-8')
+        if output_format == 'ndjson':
+          fo.write(document + b'\n')
+        else:
+          fo.write(document if json_count == 0 else b', ' + document)
+        json_count += 1
+      fo.flush()
+      os.fsync(fo.fileno())
+      save('process', shard[1], osm_state.element_key(element) if element is not None else None,
+           json_count, fo.tell())
+
+    if output_format != 'ndjson':
+      fo.write(b']')
+
+  if not audit and restrictions_keys != auditing['tag_k_v_yes_no_auditing']:
+    pprint.pprint('Chaves de restricao persistidas diferentes da auditoria, execute novamente com as chaves atualizadas')
+  os.remove(checkpoint_file)
+  return json_count
+
+def write_json_documents(file_out, documents, output_format='json', typed=False):
+  ''' Function: write_json_documents.
+
+      The function will receive 04 parameters.
+      This function will be called in the `main` and will write each node as soon as it is
+      received, so the json is never built as one string in memory. The nodes packed by
+      `keep_document` are converted back to dicts only when they are written.
+
+      The format ``json`` writes the same array of `json.dumps(json_list)` and the format
+      ``ndjson`` writes one node per line. The file is compressed if its name ends with
+      ``.gz``, ``.bz2`` or ``.zst`` (see `osm_io.open_output`).
+
+      Args:
+        file_out (str): the json file to be created.
+        documents (iterable): the nodes to be written.
+        output_format (str): ``json`` or ``ndjson``.
+        typed (bool): True to write the nodes with the typed schema (see `osm_typed.typed_document`).
+
+      Returns:
+          the number of nodes written.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  def dumps(document):
+    document = osm_document.unpack(document)
+    return json.dumps(osm_typed.typed_document(document) if typed else document)
+
+  count = 0
+  with osm_io.open_output(file_out, text=True) as fo:
+    if output_format == 'ndjson':
+      for document in documents:
+        fo.write(dumps(document))
+        fo.write('\n')
+        count += 1
+    else:
+      fo.write('[')
+      for document in documents:
+        if count > 0:
+          fo.write(', ')
+        fo.write(dumps(document))
+        count += 1
+      fo.write(']')
+  return count
+
+def write_auditing_log(filename, auditing, json_count):
+  ''' Function: write_auditing_log.
+
+      The function will receive 03 parameters.
+      This function will be called in the `main` and will write the auditing log of the file processed.
+
+      Args:
+        filename (str): the OSM file processed.
+        auditing (dict): the auditing state created by `new_auditing_state`.
+        json_count (int): the number of lines in the json.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      '''
+  auditing_items = str('==========================================================\n')
+  auditing_items += str('==========   TAGS AUDITING                   =============\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str(auditing['tags_auditing'])
+  auditing_items += str('\n\n\n==========================================================\n')
+  auditing_items += str('==========   TAGS Com Chaves AUDITING            =========\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str(auditing['tag_k_auditing'])
+  auditing_items += str('\n\n\n==========================================================\n')
+  auditing_items += str('==========   TAGS Chave Restrictions AUDITING    =========\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str(auditing['tag_k_v_yes_no_auditing'])
+  auditing_items += str('\n\n\n==========================================================\n')
+  auditing_items += str('==========   TAGS Postal Code AUDITING           =========\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str(auditing['postal_code'])
+  auditing_items += str('\n\n\n==========================================================\n')
+  auditing_items += str('==========   TAGS Street Address AUDITING        =========\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str(auditing['street_address'])
+  auditing_items += str('\n\n\n==========================================================\n')
+  auditing_items += str('==========   Quantidade de linhas no Json        =========\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str(json_count)
+  auditing_items += str('\n\n\n==========================================================\n')
+  auditing_items += str('==========   Cache de Normalizacao               =========\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str({'size': normalize_cache_size, 'stats': normalize_cache_stats})
+  auditing_items += str('\n\n\n==========================================================\n')
+  auditing_items += str('==========   Validade das Chaves das TAGS        =========\n')
+  auditing_items += str('==========================================================\n\n\n')
+  auditing_items += str(get_tag_key_stats(auditing['tag_k_auditing']))
+
+  file_out = "{0}-auditing.log".format(filename)
+  with codecs.open(file_out, "w") as fo:
+    fo.write(auditing_items)
+
+'''This function will be working to audit elements and process data to JSON for ingest in mongodb'''
+def main(filename, single_pass=False, restrictions_keys_file=None, stream=False, output_format='json', workers=1,
+         cache_size=NORMALIZE_CACHE_SIZE, backend=None, resolve_geometry=False, node_store=None,
+         state_file=None, changes_file=None, incremental=False, checkpoint=False, checkpoint_size=CHECKPOINT_SIZE,
+         columnar=False, compress=None, area=None, progress_interval=None, profile=False, trace_memory=False,
+         compact=False, typed=False, write_metrics=False):
+
+  auditing = new_auditing_state()
+  set_normalize_cache_size(cache_size)
+  set_area_filter(area)
+  set_compact_documents(compact)
+
+  restrictions_keys = None
+  if restrictions_keys_file is not None:
+    restrictions_keys = load_restrictions_keys(restrictions_keys_file)
+
+  state = None
+  set_counts = {}
+  changed = None
+  if state_file is None and (incremental or changes_file is not None):
+    raise ValueError('the incremental mode needs the state file of the previous execution')
+  if checkpoint and (workers > 1 or resolve_geometry or state_file is not None or columnar):
+    raise ValueError('the checkpoints can not be used with workers, geometry, state or columnar')
+  if (workers > 1 or checkpoint) and area is not None:
+    raise ValueError('the area filter needs the whole file in order, it can not be used with workers or checkpoints')
+  if (workers > 1 or checkpoint) and osm_io.is_compressed(filename):
+    raise ValueError('{0} is compressed, the workers and the checkpoints need the uncompressed file'.format(filename))
+  if checkpoint and compress is not None:
+    raise ValueError('the checkpoints can not be used with the compressed json')
+
+  # tempos e contadores gravados em <osm>-metrics.json apenas quando pedidos, sem eles as funcoes nao sao trocadas
+  run_metrics = None
+  if write_metrics or progress_interval or profile or trace_memory:
+    run_metrics = osm_metrics.Metrics(progress_interval)
+    set_metrics(run_metrics)
+  profiler = osm_metrics.start_profile() if profile else None
+  if trace_memory:
+    osm_metrics.start_trace_memory()
+
+  completed = False
+  try:
+    # o estado e aberto depois das verificacoes das opcoes e fechado no finally
+    if state_file is not None:
+      state = osm_state.OSMState(state_file)
+
+    if changes_file is not None or incremental:
+      pprint.pprint('Inicio Processamento Incremental ' + str(datetime.now()))
+      if changes_file is not None:
+        changes = osm_parser.iterchanges(changes_file)
+      else:
+        changes = iter_version_changes(filename, state, backend)
+      changed = process_incremental(state, changes, auditing)
+      pprint.pprint('Fim Processamento Incremental, elementos alterados: {0} {1}'.format(len(changed), datetime.now()))
+      json_list = state.iter_documents()
+    elif checkpoint:
+      # o json e gravado pelo process_checkpointed junto com os checkpoints
+      json_list = None
+    elif workers > 1:
+      json_list = process_parallel(filename, auditing, workers, restrictions_keys, backend)
+    elif single_pass:
+      json_list = process_single_pass(filename, auditing, restrictions_keys, backend=backend)
+    else:
+      json_list = process_two_pass(filename, auditing, backend=backend)
+
+    if compact and (resolve_geometry or state is not None or columnar):
+      # a geometria, o estado e o colunar usam os dicts, os nodes sao compactados de novo no fim
+      json_list = (osm_document.unpack(node) for node in json_list)
+
+    geometry_index = None
+    if resolve_geometry:
+      # indice com as coordenadas dos nodes, lido antes do json ser gravado
+      pprint.pprint('Inicio Indice de coordenadas ' + str(datetime.now()))
+      geometry_index = osm_geometry.build_geometry_index(filename, backend, node_store)
+      pprint.pprint('Fim Indice de coordenadas, nodes: {0}, ways: {1}, relations: {2} {3}'.format(
+        len(geometry_index.nodes), len(geometry_index.ways), len(geometry_index.relations), datetime.now()))
+      json_list = osm_geometry.resolve_documents(json_list, geometry_index)
+
+    if state is not None and changed is None:
+      state.clear()
+      json_list = record_state(state, iter_elements(filename, backend), json_list, set_counts)
+
+    columnar_writer = None
+    if columnar:
+      # o arquivo colunar e gravado junto com o json
+      columnar_writer = osm_columnar.ColumnarWriter(osm_columnar.columnar_filename(filename))
+      json_list = osm_columnar.write_through(columnar_writer, json_list)
+
+    if not stream and json_list is not None:
+      json_list = [keep_document(node) for node in json_list]
+      pprint.pprint('Fim de limpeza e estruturacao e inicio Criacao Json ' + str(datetime.now()))
+
+    # You do not need to change this file
+    if output_format == 'ndjson':
+      file_out = "{0}.ndjson".format(filename)
+    else:
+      file_out = "{0}.json".format(filename)
+    if compress is not None:
+      file_out = "{0}.{1}".format(file_out, compress)
+    if json_list is None:
+      json_count = process_checkpointed(filename, auditing, file_out, output_format, restrictions_keys, backend,
+                                        checkpoint_size, typed)
+    else:
+      json_count = write_json_documents(file_out, json_list, output_format, typed)
+    if columnar_writer is not None:
+      columnar_writer.close()
+    if geometry_index is not None:
+      geometry_index.close()
+  
+    pprint.pprint('Fim Criacao Json ' + str(datetime.now()))
+
+    save_restrictions_keys(filename, auditing['tag_k_v_yes_no_auditing'])
+    write_auditing_log(filename, auditing, json_count)
+
+    if run_metrics is not None:
+      run_metrics.add('documents', json_count)
+      values = {'file': filename, 'normalize_cache': {'size': normalize_cache_size, 'stats': normalize_cache_stats}}
+      if profiler is not None:
+        values['profile'] = osm_metrics.stop_profile(profiler, "{0}-profile.pstats".format(filename))
+      if trace_memory:
+        values['memory'] = osm_metrics.stop_trace_memory()
+      run_metrics.save("{0}-metrics.json".format(filename), **values)
+
+    if state is not None:
+      if changed is not None:
+        write_changes("{0}-changes.ndjson".format(filename), state, changed, typed)
+      else:
+        save_state(state, auditing, set_counts)
+    completed = True
+  finally:
+    # as funcoes originais sao restauradas mesmo com erro, o main pode ser chamado de novo
+    osm_metrics.stop_hooks(profiler)
+    if run_metrics is not None:
+      set_metrics(None)
+    if state is not None:
+      # com erro o estado anterior e mantido, sem as mudancas desta execucao
+      state.close(commit=completed)
+
+  # pprint.pprint('====================================================') 
+  # pprint.pprint(auditing['tags_auditing'])
+  # pprint.pprint('====================================================') 
+  # print_items_sorted(auditing['tag_k_auditing'])
+  # pprint.pprint('====================================================') 
+  # pprint.pprint(auditing['tag_k_v_yes_no_auditing'])
+  # pprint.pprint('====================================================') 
+  # pprint.pprint(auditing['postal_code'])
+  # pprint.pprint('====================================================')
+  # print_items_sorted(auditing['street_address'], key_value=0, reverse=True)
+  # pprint.pprint('====================================================')
+ 
+
+def benchmark_process_tags(filename, repeat=5):
+  """ Function: benchmark_process_tags.
+
+      The function will receive 02 parameters.
+      This function will measure how many tags per second the `process_tags_to_node` can process.
+      The file is parsed before the measure, so only the processing of the tags is measured.
+
+      Args:
+        filename (str): the OSM file used in the benchmark, like the `SAMPLE_FILE`.
+        repeat (int): the number of measures, the best one is returned.
+
+      Returns:
+          the number of tags processed per second.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      """
+  restrictions_keys = set()
+  elements_tags = []
+  for element in iter_elements(filename):
+    for sub_element in element.sub_elements:
+      audit_count_tag_attribute_k_with_v_yes_no(restrictions_keys, sub_element)
+    if element.tag == 'node' or element.tag == 'way':
+      elements_tags.append(element.tags)
+  count = sum(len(tags) for tags in elements_tags)
+
+  best = None
+  for i in range(repeat):
+    start = time.perf_counter()
+    for tags in elements_tags:
+      process_tags_to_node(tags, {}, restrictions_keys)
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+
+  tags_per_second = count / best if best else 0
+  pprint.pprint('{0} tags, {1:.0f} tags/s'.format(count, tags_per_second))
+  return tags_per_second
+
+def benchmark_conditional_values(conditionals, repeat=10000):
+  """ Function: benchmark_conditional_values.
+
+      The function will receive 02 parameters.
+      This function will measure how many values per second the
+      `normalize_and_clean_conditional_values_from_nodes` can parse, without the cache and
+      through the `normalize_cached`, like the values of the same shop repeated in the file.
+
+      Args:
+        conditionals (list): tuples ``(conditional, node_key)``, like the examples at the end of this file.
+        repeat (int): the number of times each value is parsed.
+
+      Returns:
+          a tuple with the values per second parsed without cache and with cache.
+
+      `PEP 484`_ type annotations are supported. If attribute, parameter, and
+      return types are annotated according to `PEP 484`_, they do not need to be
+      included in the docstring:
+
+      .. _PEP 484:
+          https://www.python.org/dev/peps/pep-0484/
+
+      """
+  count = len(conditionals) * repeat
+
+  start = time.perf_counter()
+  for i in range(repeat):
+    for conditional, node_key in conditionals:
+      normalize_and_clean_conditional_values_from_nodes(conditional, node_key)
+  parsed_per_second = count / (time.perf_counter() - start)
+
+  start = time.perf_counter()
+  for i in range(repeat):
+    for conditional, node_key in conditionals:
+      normalize_cached(normalize_and_clean_conditional_values_from_nodes, conditional, node_key)
+  cached_per_second = count / (time.perf_counter() - start)
+
+  pprint.pprint('{0} valores, sem cache {1:.0f}/s, com cache {2:.0f}/s'.format(count, parsed_per_second, cached_per_second))
+  return parsed_per_second, cached_per_second
 
 # Caso seja value onde se encontra a key = 0 inserir 1
 def print_items_sorted(items, key_value=0, reverse=False):
@@ -1078,11 +3191,79 @@ def print_items_sorted(items, key_value=0, reverse=False):
   print ("}")
 
 
-pprint.pprint('Inicio do Processo ' + str(datetime.now()))
-# main(SAMPLE_FILE)
-# Start the process
-main(OSM_FILE)
-pprint.pprint('Fim Processo ' + str(datetime.now()))
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Auditoria e limpeza do OSM para ingestao no mongodb')
+  parser.add_argument('filename', nargs='?', default=OSM_FILE)
+  parser.add_argument('--single-pass', action='store_true',
+                      help='audita e processa o json lendo o arquivo uma unica vez')
+  parser.add_argument('--restrictions-keys', default=None,
+                      help='arquivo com as chaves de restricao de uma execucao anterior (<osm>-restrictions-keys.json)')
+  parser.add_argument('--stream', action='store_true',
+                      help='grava o json durante a leitura, sem manter os documentos em memoria')
+  parser.add_argument('--output-format', choices=['json', 'ndjson'], default='json',
+                      help='json (array) ou ndjson (um documento por linha)')
+  parser.add_argument('--workers', type=int, default=1,
+                      help='numero de processos, o arquivo sera dividido em partes processadas em paralelo')
+  parser.add_argument('--cache-size', type=int, default=NORMALIZE_CACHE_SIZE,
+                      help='valores mantidos no cache de cada funcao de normalizacao (0 desliga o cache)')
+  parser.add_argument('--parser', choices=['auto'] + osm_parser.BACKENDS, default='auto',
+                      help='leitor do XML, auto usa o lxml quando instalado')
+  parser.add_argument('--resolve-geometry', action='store_true',
+                      help='adiciona as coordenadas e o bbox das ways e relations e os membros das sub relations')
+  parser.add_argument('--node-store', default=None,
+                      help='arquivo para as coordenadas dos nodes do --resolve-geometry, em vez da memoria')
+  parser.add_argument('--state', default=None,
+                      help='arquivo com o estado (elementos, json e auditoria) para as execucoes incrementais')
+  parser.add_argument('--changes', default=None,
+                      help='arquivo osmChange (.osc) aplicado no --state, apenas os elementos alterados sao processados')
+  parser.add_argument('--incremental', action='store_true',
+                      help='compara a versao dos elementos do arquivo com o --state e processa apenas os alterados, '
+                           'os documentos sao os de uma execucao completa, com os criados no fim')
+  parser.add_argument('--checkpoint', action='store_true',
+                      help='grava checkpoints (<osm>-checkpoint.json) e continua do ultimo se o processo for interrompido')
+  parser.add_argument('--checkpoint-size', type=int, default=CHECKPOINT_SIZE // (1024 * 1024),
+                      help='MB do arquivo lidos entre os checkpoints')
+  parser.add_argument('--columnar', action='store_true',
+                      help='grava tambem o arquivo colunar (<osm>.parquet com pyarrow, senao <osm>.osmcol)')
+  parser.add_argument('--compress', choices=osm_io.COMPRESSIONS, default=None,
+                      help='compacta o json gravado (<osm>.json.gz, .bz2 ou .zst)')
+  parser.add_argument('--bbox', nargs='?', const=MANHATTAN_BBOX, default=None,
+                      help='processa apenas a area minlat,minlon,maxlat,maxlon, sem valor usa o quadrante de Manhattan')
+  parser.add_argument('--polygon', default=None,
+                      help='processa apenas a area do poligono (.poly do osmosis ou GeoJSON)')
+  parser.add_argument('--metrics', action='store_true',
+                      help='grava <osm>-metrics.json com os tempos das etapas, elementos, tags e bytes por segundo')
+  parser.add_argument('--progress', type=int, nargs='?', const=osm_metrics.PROGRESS_INTERVAL, default=None,
+                      help='linhas de progresso da leitura com o ETA a cada N segundos (sem valor: {0})'.format(
+                        osm_metrics.PROGRESS_INTERVAL))
+  parser.add_argument('--profile', action='store_true',
+                      help='executa com o cProfile e grava <osm>-profile.pstats, as funcoes mais lentas vao para as metricas')
+  parser.add_argument('--trace-memory', action='store_true',
+                      help='executa com o tracemalloc, o pico e as linhas que mais alocaram vao para as metricas')
+  parser.add_argument('--compact', action='store_true',
+                      help='mantem os documentos compactados ate a gravacao do json, menos memoria e mais tempo')
+  parser.add_argument('--typed', action='store_true',
+                      help='grava ids, versoes e refs como int e o timestamp em segundos (veja osm_typed)')
+  args = parser.parse_args()
+
+  area = None
+  if args.polygon is not None:
+    area = osm_spatial.load_polygon(args.polygon)
+  elif args.bbox is not None:
+    area = osm_spatial.parse_bbox(args.bbox)
+
+  pprint.pprint('Inicio do Processo ' + str(datetime.now()))
+  # main(SAMPLE_FILE)
+  # Start the process
+  main(args.filename, single_pass=args.single_pass, restrictions_keys_file=args.restrictions_keys,
+       stream=args.stream, output_format=args.output_format, workers=args.workers,
+       cache_size=args.cache_size, backend=args.parser, resolve_geometry=args.resolve_geometry,
+       node_store=args.node_store, state_file=args.state, changes_file=args.changes,
+       incremental=args.incremental, checkpoint=args.checkpoint,
+       checkpoint_size=args.checkpoint_size * 1024 * 1024, columnar=args.columnar,
+       compress=args.compress, area=area, progress_interval=args.progress, profile=args.profile,
+       trace_memory=args.trace_memory, compact=args.compact, typed=args.typed, write_metrics=args.metrics)
+  pprint.pprint('Fim Processo ' + str(datetime.now()))
 
 '''
 Teste de regras  de condicionais
@@ -1108,3 +3289,26 @@ conditional = "yes @ (axles=2 AND weight&lt;40 st); yes @ (axles=3 AND weight&lt
 normalize_and_clean_conditional_values_from_nodes(conditional)
 pprint.pprint('============================================')
 '''
+
+'''
+Benchmark de tags por segundo do process_tags_to_node
+
+pprint.pprint('============================================')
+benchmark_process_tags(SAMPLE_FILE)
+pprint.pprint('============================================')
+'''
+
+'''
+Benchmark do parser de condicionais e opening_hours
+
+conditionals = [
+  (conditional, 'maxspeed:conditional'),
+  (condition, 'opening_hours'),
+  (condition_2, 'opening_hours'),
+  (condition_3, 'opening_hours'),
+  ('Mo-Fr 08:00-18:00', 'opening_hours')
+]
+pprint.pprint('============================================')
+benchmark_conditional_values(conditionals)
+pprint.pprint('============================================')
+'''
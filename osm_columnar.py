@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Columnar export of the documents created by data_wrangling
+
+Each document is split in fixed columns and one column with the rest:
+
+- id, type:           string;
+- lat, lon:           double, from pos;
+- created.<key>:      string, one column for each key of CREATED;
+- address.<key>:      string, one column for each key of ADDRESS_KEYS;
+- other:              the other keys of the document (and the other keys of the address),
+                      a map from the key to its value in json;
+- keys:               string, the json [keys, created keys, address keys] with the order of
+                      the keys of the document, of its created and of its address.
+
+iter_documents returns the documents with the keys in the order of the json export, the
+files written before the keys column have the address as the last key.
+
+With pyarrow installed the file is a Parquet file (.parquet), otherwise it is the packed
+binary format below (.osmcol). The reader detects the format by the magic of the file,
+so the analytics can read only the columns needed with iter_columns or iter_rows, and
+iter_documents rebuilds the documents for the loader.
+
+Packed binary format, all the integers little endian:
+
+  magic            b'OSMCOL1\\n'
+  column chunks    the columns of each row group, one after the other
+  footer           json: {"columns": [[name, kind], ...], "compression": "zlib",
+                          "row_groups": [{"rows": n, "chunks": {name: [offset, size]}}]}
+  footer size      uint64
+  magic            b'OSMCOL1\\n'
+
+Each chunk is compressed with zlib, the kinds of the columns are:
+
+  double           rows float64, NaN is null
+  string           rows int32 with the size in bytes of each value (-1 is null),
+                   followed by the utf-8 values without separator
+"""
+import json
+import math
+import struct
+import sys
+import zlib
+from array import array
+
+try:
+  import pyarrow
+  import pyarrow.parquet as parquet
+except ImportError:
+  pyarrow = None
+
+MAGIC = b'OSMCOL1\n'
+PARQUET_MAGIC = b'PAR1'
+FOOTER_SIZE = struct.Struct('<Q')
+ROW_GROUP_SIZE = 65536
+
+CREATED = ['version', 'changeset', 'timestamp', 'user', 'uid']
+ADDRESS_KEYS = ['housenumber', 'street', 'postcode', 'city', 'state', 'country']
+
+COLUMNS = ([('id', 'string'), ('type', 'string'), ('lat', 'double'), ('lon', 'double')] +
+           [('created.' + key, 'string') for key in CREATED] +
+           [('address.' + key, 'string') for key in ADDRESS_KEYS] +
+           [('other', 'map'), ('keys', 'string')])
+
+
+def columnar_filename(filename):
+  """Name of the columnar export of the OSM file, by the format available"""
+  return '{0}.{1}'.format(filename, 'parquet' if pyarrow is not None else 'osmcol')
+
+
+def split_document(document):
+  """Return the dict column -> value of the document"""
+  row = {'id': document.get('id'), 'type': document.get('type'), 'lat': None, 'lon': None}
+  other = {}
+  created_keys = []
+  address_keys = []
+  for key, value in document.items():
+    if key in ('id', 'type'):
+      continue
+    elif key == 'pos' and isinstance(value, list) and len(value) == 2:
+      row['lat'], row['lon'] = value
+    elif key == 'created' and isinstance(value, dict) and set(value) == set(CREATED):
+      created_keys = list(value)
+      for k in CREATED:
+        row['created.' + k] = value[k]
+    elif key == 'address' and isinstance(value, dict):
+      address_keys = list(value)
+      rest = {}
+      for k, v in value.items():
+        if k in ADDRESS_KEYS and isinstance(v, str):
+          row['address.' + k] = v
+        else:
+          rest[k] = v
+      if rest:
+        other['address'] = rest
+    else:
+      other[key] = value
+  row['other'] = dict((k, json.dumps(v)) for k, v in other.items())
+  row['keys'] = json.dumps([list(document), created_keys, address_keys])
+  return row
+
+
+def join_row(row):
+  """Rebuild the document of the row of all the columns, with the keys in the order of the document"""
+  if row.get('keys') is None:
+    return join_row_without_keys(row)
+  keys, created_keys, address_keys = json.loads(row['keys'])
+  other = dict((k, json.loads(v)) for k, v in row['other'].items())
+  address = dict((k, row['address.' + k]) for k in ADDRESS_KEYS if row['address.' + k] is not None)
+  address.update(other.pop('address', {}) if address_keys else {})
+
+  document = {}
+  for key in keys:
+    if key in ('id', 'type'):
+      document[key] = row[key]
+    elif key == 'pos' and 'pos' not in other:
+      document[key] = [row['lat'], row['lon']]
+    elif key == 'created' and created_keys:
+      document[key] = dict((k, row['created.' + k]) for k in created_keys)
+    elif key == 'address' and address_keys:
+      document[key] = dict((k, address[k]) for k in address_keys)
+    else:
+      document[key] = other[key]
+  return document
+
+
+def join_row_without_keys(row):
+  """Rebuild the document of a row written before the keys column, the address is the last key"""
+  document = {'id': row['id'], 'type': row['type']}
+  other = dict((k, json.loads(v)) for k, v in row['other'].items())
+  if 'visible' in other:
+    document['visible'] = other.pop('visible')
+  if any(row['created.' + k] is not None for k in CREATED) or 'created' not in other:
+    document['created'] = dict((k, row['created.' + k]) for k in CREATED)
+  if row['lat'] is not None:
+    document['pos'] = [row['lat'], row['lon']]
+
+  address = dict((k, row['address.' + k]) for k in ADDRESS_KEYS if row['address.' + k] is not None)
+  address.update(other.pop('address', {}))
+  for key, value in other.items():
+    document[key] = value
+  if address:
+    document['address'] = address
+  return document
+
+
+class ColumnarWriter(object):
+  """Write the documents in row groups of row_group_size, close must be called at the end"""
+
+  def __init__(self, path, row_group_size=ROW_GROUP_SIZE, use_arrow=None):
+    self.path = path
+    self.row_group_size = row_group_size
+    self.use_arrow = pyarrow is not None if use_arrow is None else use_arrow
+    self.rows = dict((name, []) for name, kind in COLUMNS)
+    self.count = 0
+    if self.use_arrow:
+      self.writer = parquet.ParquetWriter(path, arrow_schema())
+    else:
+      self.file = open(path, 'wb')
+      self.file.write(MAGIC)
+      self.row_groups = []
+
+  def add(self, document):
+    if document is None:
+      return
+    row = split_document(document)
+    for name, kind in COLUMNS:
+      self.rows[name].append(row.get(name))
+    self.count += 1
+    if len(self.rows['id']) >= self.row_group_size:
+      self.write_row_group()
+
+  def write_row_group(self):
+    if not self.rows['id']:
+      return
+    if self.use_arrow:
+      other = [list(values.items()) for values in self.rows['other']]
+      arrays = [pyarrow.array(other if name == 'other' else self.rows[name], type=field.type)
+                for (name, kind), field in zip(COLUMNS, arrow_schema())]
+      self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=arrow_schema()))
+    else:
+      chunks = {}
+      for name, kind in COLUMNS:
+        values = self.rows[name]
+        if kind == 'map':
+          values = [json.dumps(v) for v in values]
+        data = zlib.compress(encode_column(kind, values))
+        chunks[name] = [self.file.tell(), len(data)]
+        self.file.write(data)
+      self.row_groups.append({'rows': len(self.rows['id']), 'chunks': chunks})
+    self.rows = dict((name, []) for name, kind in COLUMNS)
+
+  def close(self):
+    self.write_row_group()
+    if self.use_arrow:
+      self.writer.close()
+      return
+    footer = json.dumps({'columns': [[name, 'string' if kind == 'map' else kind] for name, kind in COLUMNS],
+                         'compression': 'zlib', 'row_groups': self.row_groups}).encode('utf-8')
+    self.file.write(footer)
+    self.file.write(FOOTER_SIZE.pack(len(footer)))
+    self.file.write(MAGIC)
+    self.file.close()
+
+
+def arrow_schema():
+  types = {'string': pyarrow.string(), 'double': pyarrow.float64(),
+           'map': pyarrow.map_(pyarrow.string(), pyarrow.string())}
+  return pyarrow.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+
+def encode_column(kind, values):
+  if kind == 'double':
+    column = array('d', (float('nan') if v is None else v for v in values))
+    if sys.byteorder == 'big':
+      column.byteswap()
+    return column.tobytes()
+
+  data = [None if v is None else v.encode('utf-8') for v in values]
+  sizes = array('i', (-1 if v is None else len(v) for v in data))
+  if sys.byteorder == 'big':
+    sizes.byteswap()
+  return sizes.tobytes() + b''.join(v for v in data if v is not None)
+
+
+def decode_column(kind, data, rows):
+  if kind == 'double':
+    column = array('d')
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+      column.byteswap()
+    return [None if math.isnan(v) else v for v in column]
+
+  sizes = array('i')
+  sizes.frombytes(data[:rows * sizes.itemsize])
+  if sys.byteorder == 'big':
+    sizes.byteswap()
+  values = []
+  offset = rows * sizes.itemsize
+  for size in sizes:
+    if size < 0:
+      values.append(None)
+    else:
+      values.append(data[offset:offset + size].decode('utf-8'))
+      offset += size
+  return values
+
+
+def read_footer(fi):
+  fi.seek(-(FOOTER_SIZE.size + len(MAGIC)), 2)
+  footer_size = FOOTER_SIZE.unpack(fi.read(FOOTER_SIZE.size))[0]
+  fi.seek(-(footer_size + FOOTER_SIZE.size + len(MAGIC)), 2)
+  return json.loads(fi.read(footer_size).decode('utf-8'))
+
+
+def iter_columns(path, columns=None):
+  """Yield a dict column -> list of values for each row group, reading only the columns
+
+  The map column other is returned as a dict key -> value in json.
+  """
+  with open(path, 'rb') as fi:
+    magic = fi.read(len(MAGIC))
+
+    if magic.startswith(PARQUET_MAGIC):
+      if pyarrow is None:
+        raise ValueError('{0} is a Parquet file, pyarrow is needed to read it'.format(path))
+      for batch in parquet.ParquetFile(path).iter_batches(columns=columns):
+        values = batch.to_pydict()
+        if 'other' in values:
+          values['other'] = [dict(v) for v in values['other']]
+        yield values
+      return
+
+    if magic != MAGIC:
+      raise ValueError('{0} is not a columnar export'.format(path))
+    footer = read_footer(fi)
+    kinds = dict(footer['columns'])
+    names = [name for name, kind in footer['columns'] if columns is None or name in columns]
+    for row_group in footer['row_groups']:
+      values = {}
+      for name in names:
+        offset, size = row_group['chunks'][name]
+        fi.seek(offset)
+        values[name] = decode_column(kinds[name], zlib.decompress(fi.read(size)), row_group['rows'])
+      if 'other' in values:
+        values['other'] = [json.loads(v) for v in values['other']]
+      yield values
+
+
+def iter_rows(path, columns=None):
+  """Yield a dict column -> value for each document"""
+  for values in iter_columns(path, columns):
+    names = list(values)
+    for row in zip(*[values[name] for name in names]):
+      yield dict(zip(names, row))
+
+
+def iter_documents(path):
+  """Yield the documents of the columnar export, like the json created by data_wrangling"""
+  for row in iter_rows(path):
+    yield join_row(row)
+
+
+def write_through(writer, documents):
+  """Yield the documents after they are added to the writer, to write the json and the columns at once"""
+  for document in documents:
+    writer.add(document)
+    yield document
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compact representation of the json documents kept in memory
+
+The documents created by data_wrangling.process_json are dicts of strings, a dict for
+each nested object (created, address, names, ...) and a list for each array. When the
+documents are kept until the json is written (the default mode and the single pass, without
+--stream) most of the memory is the overhead of these objects.
+
+pack converts the document to a CompactDocument, a tuple with the values and the layout,
+the tuple of keys shared by every document with the same keys in the same order. The
+nested dicts are CompactDocument too and the lists are tuples. The numeric texts of the
+ids, versions, changesets, uids and refs are kept as int and the node_refs as an
+array('q'), the values repeated in every document (type, user, role, ...) are interned. unpack returns the same
+dict, with the same keys order and the same texts, so the json written does not change.
+The documents must not have int values, every int packed is unpacked as a text.
+"""
+import sys
+from array import array
+
+intern = sys.intern
+
+# valores numericos guardados como int, apenas os textos que voltam iguais com str
+NUMERIC_KEYS = frozenset(['id', 'version', 'changeset', 'uid', 'ref'])
+NUMERIC_LIST_KEYS = frozenset(['node_refs'])
+# valores repetidos em muitos documentos
+INTERNED_KEYS = frozenset(['type', 'visible', 'user', 'role', 'timestamp'])
+
+layouts = {}
+
+
+class CompactDocument(tuple):
+  """Document packed by pack: the values packed followed by the layout, one object without __dict__"""
+  __slots__ = ()
+
+  @property
+  def layout(self):
+    return self[-1]
+
+  def to_dict(self):
+    # o zip termina no fim do layout, antes do ultimo item
+    return dict(zip(self[-1], map(unpack_value, self)))
+
+
+def get_layout(keys):
+  layout = layouts.get(keys)
+  if layout is None:
+    layout = layouts[keys] = tuple(intern(key) if isinstance(key, str) else key for key in keys)
+  return layout
+
+
+def to_int(value):
+  """int of the text, or the text itself if the int is not written the same way (like '007' or '+1')"""
+  try:
+    number = int(value)
+  except ValueError:
+    return value
+  return number if str(number) == value else value
+
+
+def pack(document):
+  """Return the CompactDocument of the dict (None and the documents already packed are returned as they are)"""
+  if type(document) is not dict:
+    return document
+  values = [pack_item(key, value) for key, value in document.items()]
+  values.append(get_layout(tuple(document)))
+  return CompactDocument(values)
+
+
+def pack_list(key, items):
+  if key in NUMERIC_LIST_KEYS:
+    refs = [to_int(ref) if type(ref) is str else None for ref in items]
+    if all(type(ref) is int for ref in refs):
+      try:
+        return array('q', refs)
+      except OverflowError:
+        pass
+  # os itens das listas sao packed com a chave da lista
+  return tuple(pack_item(key, item) for item in items)
+
+
+def pack_item(key, value):
+  value_type = type(value)
+  if value_type is str:
+    if key in NUMERIC_KEYS:
+      return to_int(value)
+    if key in INTERNED_KEYS:
+      return intern(value)
+  elif value_type is dict:
+    return pack(value)
+  elif value_type is list:
+    return pack_list(key, value)
+  return value
+
+
+def unpack(document):
+  """Return the dict of the CompactDocument (the dicts and None are returned as they are)"""
+  if type(document) is CompactDocument:
+    return document.to_dict()
+  return document
+
+
+def unpack_value(value):
+  value_type = type(value)
+  if value_type is int:
+    # apenas os textos numericos sao convertidos em int, os documentos nao tem int
+    return str(value)
+  if value_type is CompactDocument:
+    return value.to_dict()
+  if value_type is tuple:
+    return list(map(unpack_value, value))
+  if value_type is array:
+    return list(map(str, value))
+  return value
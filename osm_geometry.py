@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Geometry of the ways and relations of the OSM files
+
+The coordinates of the nodes are kept in arrays instead of a dict of strings: the ids
+sorted in an array('q') and the latitudes and longitudes in two array('d') in the same
+order, 24 bytes per node, searched with bisect. The nodes of the ways are kept in the
+same way, one array('q') with the refs of every way and the offsets of each one.
+
+For the extracts with more nodes than the memory, DiskNodeIndex keeps the nodes in a
+file sorted by id, read with mmap: only one id of each block of records and a small
+cache of the last lookups stay in memory.
+
+build_geometry_index reads the file once to fill the index and resolve_documents adds
+to the documents created by data_wrangling:
+
+- way:      geometry, the [lat, lon] of the node_refs, and bbox;
+- relation: pos or bbox to each member, the bbox of the relation and member_refs, the
+            ids of the nodes, ways and relations referenced by the relation and by its
+            sub relations.
+
+The bbox is [minlat, minlon, maxlat, maxlon], the same order of the <bounds> of the OSM
+files. Nodes, ways and relations out of the file (the extract cut the references) are
+skipped.
+"""
+import heapq
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import osm_parser
+
+MEMBER_TYPES = ('node', 'way', 'relation')
+
+NODE_RECORD = struct.Struct('<qdd')  # id, lat, lon do arquivo de nodes
+NODE_ID = struct.Struct('<q')
+RUN_SIZE = 1000000  # nodes ordenados em memoria antes de gravar no arquivo
+BLOCK_SIZE = 64  # nodes do arquivo para cada id mantido em memoria
+NODE_CACHE_SIZE = 10000
+WAY_BBOX_CACHE_SIZE = 100000  # bbox das ways dos membros das relations mantidos em memoria
+READ_RECORDS = 65536
+
+
+def sort_order(ids):
+  """Return the positions of ids in ascending order, or None if they are already sorted"""
+  if all(ids[i] < ids[i + 1] for i in range(len(ids) - 1)):
+    return None
+  return sorted(range(len(ids)), key=ids.__getitem__)
+
+
+def find(ids, id):
+  """Position of id in the sorted array ids, or -1"""
+  i = bisect_left(ids, id)
+  if i < len(ids) and ids[i] == id:
+    return i
+  return -1
+
+
+class NodeIndex(object):
+  """id -> (lat, lon) of the nodes, call finish after the last add"""
+
+  def __init__(self):
+    self.ids = array('q')
+    self.lats = array('d')
+    self.lons = array('d')
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, id, lat, lon):
+    self.ids.append(id)
+    self.lats.append(lat)
+    self.lons.append(lon)
+
+  def finish(self):
+    # os arquivos do OSM ja estao ordenados pelo id, so ordena quando necessario
+    order = sort_order(self.ids)
+    if order is not None:
+      self.ids = array('q', (self.ids[i] for i in order))
+      self.lats = array('d', (self.lats[i] for i in order))
+      self.lons = array('d', (self.lons[i] for i in order))
+
+  def get(self, id):
+    i = find(self.ids, id)
+    if i < 0:
+      return None
+    return self.lats[i], self.lons[i]
+
+
+class DiskNodeIndex(object):
+  """id -> (lat, lon) of the nodes in a file sorted by id, call finish after the last add
+
+  The nodes are sorted in runs of run_size and merged in the file at path (the OSM
+  files are already sorted, so the runs are usually only appended). The lookups bisect
+  the ids of every block_size record kept in memory and then the block in the mmap.
+  """
+
+  def __init__(self, path, run_size=RUN_SIZE, block_size=BLOCK_SIZE, cache_size=NODE_CACHE_SIZE):
+    self.path = path
+    self.run_size = run_size
+    self.block_size = block_size
+    self.cache_size = cache_size
+    self.cache = OrderedDict()
+    self.count = 0
+    self.runs = []
+    self.buffer = NodeIndex()
+    self.block_ids = array('q')
+    self.file = None
+    self.map = None
+
+  def __len__(self):
+    return self.count
+
+  def add(self, id, lat, lon):
+    self.buffer.add(id, lat, lon)
+    self.count += 1
+    if len(self.buffer) >= self.run_size:
+      self.write_run()
+
+  def write_run(self):
+    buffer = self.buffer
+    buffer.finish()
+    run = '{0}.run{1}'.format(self.path, len(self.runs))
+    with open(run, 'wb') as fo:
+      for i in range(0, len(buffer), READ_RECORDS):
+        fo.write(b''.join(NODE_RECORD.pack(buffer.ids[j], buffer.lats[j], buffer.lons[j])
+                          for j in range(i, min(i + READ_RECORDS, len(buffer)))))
+    self.runs.append((run, buffer.ids[0], buffer.ids[-1]))
+    self.buffer = NodeIndex()
+
+  def finish(self):
+    if len(self.buffer) > 0:
+      self.write_run()
+
+    with open(self.path, 'wb') as fo:
+      if all(self.runs[i][2] < self.runs[i + 1][1] for i in range(len(self.runs) - 1)):
+        for run, first, last in self.runs:
+          with open(run, 'rb') as fi:
+            for data in iter(lambda: fi.read(NODE_RECORD.size * READ_RECORDS), b''):
+              fo.write(data)
+      else:
+        records = heapq.merge(*[iter_node_records(run) for run, first, last in self.runs])
+        for record in records:
+          fo.write(NODE_RECORD.pack(*record))
+    for run, first, last in self.runs:
+      os.remove(run)
+    self.runs = []
+
+    self.file = open(self.path, 'rb')
+    if self.count > 0:
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+      for i in range(0, self.count, self.block_size):
+        self.block_ids.append(NODE_ID.unpack_from(self.map, i * NODE_RECORD.size)[0])
+
+  def get(self, id):
+    if id in self.cache:
+      self.cache.move_to_end(id)
+      return self.cache[id]
+
+    position = None
+    block = bisect_right(self.block_ids, id) - 1
+    if block >= 0:
+      lo = block * self.block_size
+      hi = min(lo + self.block_size, self.count)
+      while lo < hi:
+        mid = (lo + hi) // 2
+        if NODE_ID.unpack_from(self.map, mid * NODE_RECORD.size)[0] < id:
+          lo = mid + 1
+        else:
+          hi = mid
+      if lo < self.count:
+        record = NODE_RECORD.unpack_from(self.map, lo * NODE_RECORD.size)
+        if record[0] == id:
+          position = record[1], record[2]
+
+    if self.cache_size > 0:
+      self.cache[id] = position
+      if len(self.cache) > self.cache_size:
+        self.cache.popitem(last=False)
+    return position
+
+  def close(self):
+    if self.map is not None:
+      self.map.close()
+      self.map = None
+    if self.file is not None:
+      self.file.close()
+      self.file = None
+
+
+def iter_node_records(path):
+  """Yield the (id, lat, lon) of a file written by DiskNodeIndex"""
+  with open(path, 'rb') as fi:
+    for data in iter(lambda: fi.read(NODE_RECORD.size * READ_RECORDS), b''):
+      for record in NODE_RECORD.iter_unpack(data):
+        yield record
+
+
+class WayIndex(object):
+  """id -> node refs of the ways, call finish after the last add"""
+
+  def __init__(self):
+    self.ids = array('q')
+    self.starts = array('q')
+    self.ends = array('q')
+    self.refs = array('q')
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, id, refs):
+    self.ids.append(id)
+    self.starts.append(len(self.refs))
+    self.refs.extend(refs)
+    self.ends.append(len(self.refs))
+
+  def finish(self):
+    order = sort_order(self.ids)
+    if order is not None:
+      self.ids = array('q', (self.ids[i] for i in order))
+      self.starts = array('q', (self.starts[i] for i in order))
+      self.ends = array('q', (self.ends[i] for i in order))
+
+  def get(self, id):
+    i = find(self.ids, id)
+    if i < 0:
+      return None
+    return self.refs[self.starts[i]:self.ends[i]]
+
+
+def new_bbox():
+  return [float('inf'), float('inf'), float('-inf'), float('-inf')]
+
+
+def extend_bbox(bbox, lat, lon):
+  if lat < bbox[0]:
+    bbox[0] = lat
+  if lon < bbox[1]:
+    bbox[1] = lon
+  if lat > bbox[2]:
+    bbox[2] = lat
+  if lon > bbox[3]:
+    bbox[3] = lon
+
+
+def merge_bbox(bbox, other):
+  extend_bbox(bbox, other[0], other[1])
+  extend_bbox(bbox, other[2], other[3])
+
+
+def geometry_bbox(geometry):
+  """bbox of the [lat, lon] of a geometry, None if it is empty"""
+  bbox = new_bbox()
+  for lat, lon in geometry or []:
+    extend_bbox(bbox, lat, lon)
+  return bbox if bbox[0] <= bbox[2] else None
+
+
+class GeometryIndex(object):
+  """Nodes, ways and relation members of an OSM file, see build_geometry_index"""
+
+  def __init__(self, nodes=None, way_bbox_cache_size=WAY_BBOX_CACHE_SIZE):
+    self.nodes = NodeIndex() if nodes is None else nodes
+    self.ways = WayIndex()
+    # poucas relations comparadas aos nodes, id -> [(type, ref, role)]
+    self.relations = {}
+    self.relation_bboxes = {}
+    # as ways sao membros de varias relations e das suas sub relations
+    self.way_bboxes = OrderedDict()
+    self.way_bbox_cache_size = way_bbox_cache_size
+
+  def finish(self):
+    self.nodes.finish()
+    self.ways.finish()
+
+  def close(self):
+    if isinstance(self.nodes, DiskNodeIndex):
+      self.nodes.close()
+
+  def way_geometry(self, id):
+    """[lat, lon] of the nodes of the way found in the file"""
+    refs = self.ways.get(id)
+    if refs is None:
+      return None
+    geometry = []
+    for ref in refs:
+      position = self.nodes.get(ref)
+      if position is not None:
+        geometry.append(list(position))
+    return geometry
+
+  def way_bbox(self, id):
+    """bbox of the way, the last ones are cached for the members of the relations"""
+    if id in self.way_bboxes:
+      self.way_bboxes.move_to_end(id)
+      return self.way_bboxes[id]
+    bbox = geometry_bbox(self.way_geometry(id))
+    if self.way_bbox_cache_size > 0:
+      self.way_bboxes[id] = bbox
+      if len(self.way_bboxes) > self.way_bbox_cache_size:
+        self.way_bboxes.popitem(last=False)
+    return bbox
+
+  def relation_bbox(self, id):
+    """bbox of the nodes and ways of the relation and of its sub relations"""
+    if id in self.relation_bboxes:
+      return self.relation_bboxes[id]
+    if id not in self.relations:
+      return None
+
+    refs = self.expand_relation(id)
+    bbox = new_bbox()
+    for ref in refs['node']:
+      position = self.nodes.get(ref)
+      if position is not None:
+        extend_bbox(bbox, position[0], position[1])
+    for ref in refs['way']:
+      way_bbox = self.way_bbox(ref)
+      if way_bbox is not None:
+        merge_bbox(bbox, way_bbox)
+
+    bbox = bbox if bbox[0] <= bbox[2] else None
+    self.relation_bboxes[id] = bbox
+    return bbox
+
+  def member_bbox(self, member_type, ref):
+    if member_type == 'node':
+      position = self.nodes.get(ref)
+      return None if position is None else [position[0], position[1], position[0], position[1]]
+    elif member_type == 'way':
+      return self.way_bbox(ref)
+    elif member_type == 'relation':
+      return self.relation_bbox(ref)
+    return None
+
+  def expand_relation(self, id):
+    """ids of the nodes, ways and relations referenced by the relation and its sub relations
+
+    The relations that reference each other (directly or not) are expanded only once.
+    """
+    refs = dict((member_type, []) for member_type in MEMBER_TYPES)
+    seen = set([('relation', id)])
+    pending = [id]
+    while pending:
+      for member_type, ref, role in self.relations.get(pending.pop(), []):
+        if member_type not in refs or (member_type, ref) in seen:
+          continue
+        seen.add((member_type, ref))
+        refs[member_type].append(ref)
+        if member_type == 'relation':
+          pending.append(ref)
+    return refs
+
+
+def build_geometry_index(source, backend=None, node_store=None):
+  """Read the OSM file (path or binary file object) once and return its GeometryIndex
+
+  If node_store is the path of a file the nodes are kept in a DiskNodeIndex, the
+  index must be closed after the documents are resolved.
+  """
+  index = GeometryIndex(DiskNodeIndex(node_store) if node_store is not None else None)
+  for record in osm_parser.iterrecords(source, osm_parser.MAIN_TAGS, backend):
+    if record.tag == 'node':
+      lat = record.get('lat')
+      lon = record.get('lon')
+      if lat is not None and lon is not None:
+        index.nodes.add(int(record.get('id')), float(lat), float(lon))
+    elif record.tag == 'way':
+      index.ways.add(int(record.get('id')), [int(ref) for ref in record.node_refs])
+    else:
+      index.relations[int(record.get('id'))] = [(m.get('type'), int(m.get('ref')), m.get('role'))
+                                                for m in record.members]
+  index.finish()
+  return index
+
+
+def resolve_document(document, index):
+  """Add the geometry of the way or relation document, the nodes are not changed"""
+  if document is None:
+    return document
+
+  if document.get('type') == 'way':
+    geometry = index.way_geometry(int(document['id']))
+    if geometry:
+      document['geometry'] = geometry
+      document['bbox'] = geometry_bbox(geometry)
+
+  elif document.get('type') == 'relation':
+    id = int(document['id'])
+    for member in document.get('members', []):
+      if member['type'] == 'node':
+        position = index.nodes.get(int(member['ref']))
+        if position is not None:
+          member['pos'] = list(position)
+      else:
+        bbox = index.member_bbox(member['type'], int(member['ref']))
+        if bbox is not None:
+          member['bbox'] = bbox
+
+    bbox = index.relation_bbox(id)
+    if bbox is not None:
+      document['bbox'] = bbox
+    member_refs = index.expand_relation(id)
+    document['member_refs'] = dict((k, [str(ref) for ref in v]) for k, v in member_refs.items())
+
+  return document
+
+
+def resolve_documents(documents, index):
+  """Yield the documents with the geometry added by resolve_document"""
+  for document in documents:
+    yield resolve_document(document, index)
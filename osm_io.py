@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compressed input and output of the OSM files and of the json exports
+
+open_input detects the compression by the magic of the file and returns a binary file
+object that decompresses while it is read, nothing is decompressed to the disk:
+
+- gzip (.gz):      pigz when installed (decompression in other threads), otherwise gzip;
+- bzip2 (.bz2):    lbzip2 or pbzip2 when installed (multi-threaded), otherwise bz2;
+- zstd (.zst):     the zstandard module or the zstd command (multi-threaded);
+- zip (.zip):      the first .osm of the zip (or the first file), like data/mapa.osm.zip.
+
+open_output compresses by the extension of the file (.gz, .bz2 or .zst), with the same
+tools when installed.
+
+The compressed files can not be read from a byte offset, so the parallel processing and
+the checkpoints need the uncompressed file.
+"""
+import bz2
+import gzip
+import io
+import shutil
+import subprocess
+import zipfile
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+MAGIC = [
+  (b'\x1f\x8b', 'gz'),
+  (b'BZh', 'bz2'),
+  (b'\x28\xb5\x2f\xfd', 'zst'),
+  (b'PK\x03\x04', 'zip'),
+]
+COMPRESSIONS = ['gz', 'bz2', 'zst']
+
+# ferramentas externas mais rapidas que os modulos da biblioteca padrao
+DECOMPRESS_COMMANDS = {
+  'gz': [['pigz', '-dc']],
+  'bz2': [['lbzip2', '-dc'], ['pbzip2', '-dc']],
+  'zst': [['zstd', '-dc', '-T0', '-q']],
+}
+COMPRESS_COMMANDS = {
+  'gz': [['pigz', '-c']],
+  'bz2': [['lbzip2', '-c'], ['pbzip2', '-c']],
+  'zst': [['zstd', '-c', '-T0', '-q']],
+}
+
+
+class CommandFile(io.RawIOBase):
+  """Binary file object of the stdout (or stdin) of a compression command"""
+
+  def __init__(self, command, path, write=False):
+    self.name = path
+    if write:
+      self.output = open(path, 'wb')
+      self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=self.output)
+      self.pipe = self.process.stdin
+    else:
+      self.output = None
+      self.process = subprocess.Popen(command + [path], stdout=subprocess.PIPE)
+      self.pipe = self.process.stdout
+
+  def readable(self):
+    return self.output is None
+
+  def writable(self):
+    return self.output is not None
+
+  def readinto(self, b):
+    data = self.pipe.read(len(b))
+    b[:len(data)] = data
+    return len(data)
+
+  def write(self, b):
+    self.pipe.write(b)
+    return len(b)
+
+  def close(self):
+    if self.closed:
+      return
+    self.pipe.close()
+    returncode = self.process.wait()
+    if self.output is not None:
+      self.output.close()
+    super(CommandFile, self).close()
+    if returncode not in (0, -13):
+      raise IOError('{0} exited with {1}'.format(self.process.args[0], returncode))
+
+
+class ZipMemberFile(io.RawIOBase):
+  """Binary file object of a member of the zip, close closes the member and the zip"""
+
+  def __init__(self, path):
+    self.name = path
+    self.archive = zipfile.ZipFile(path)
+    try:
+      names = [n for n in self.archive.namelist() if not n.endswith('/')]
+      osm_names = [n for n in names if n.endswith('.osm')]
+      if not names:
+        raise ValueError('{0} has no file'.format(path))
+      self.member = self.archive.open((osm_names or names)[0])
+    except Exception:
+      self.archive.close()
+      raise
+
+  def readable(self):
+    return True
+
+  def readinto(self, b):
+    return self.member.readinto(b)
+
+  def close(self):
+    if self.closed:
+      return
+    try:
+      self.member.close()
+    finally:
+      self.archive.close()
+      super(ZipMemberFile, self).close()
+
+
+def find_command(commands):
+  for command in commands:
+    if shutil.which(command[0]) is not None:
+      return command
+  return None
+
+
+def detect_compression(path):
+  """Return gz, bz2, zst, zip or None by the magic of the file"""
+  with open(path, 'rb') as fi:
+    head = fi.read(4)
+  for magic, compression in MAGIC:
+    if head.startswith(magic):
+      return compression
+  return None
+
+
+def is_compressed(path):
+  return isinstance(path, str) and detect_compression(path) is not None
+
+
+def open_input(path):
+  """Open the file as binary, decompressing it while it is read"""
+  compression = detect_compression(path)
+  if compression is None:
+    return open(path, 'rb')
+
+  if compression == 'zip':
+    return io.BufferedReader(ZipMemberFile(path))
+
+  command = find_command(DECOMPRESS_COMMANDS[compression])
+  if command is not None:
+    return io.BufferedReader(CommandFile(command, path))
+  if compression == 'gz':
+    return gzip.open(path, 'rb')
+  if compression == 'bz2':
+    return bz2.open(path, 'rb')
+  if zstandard is None:
+    raise ValueError('{0} is compressed with zstd, install zstandard or the zstd command'.format(path))
+  return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+
+def output_compression(path):
+  for compression in COMPRESSIONS:
+    if path.endswith('.' + compression):
+      return compression
+  return None
+
+
+def open_output(path, text=False):
+  """Open the file to be written, compressed by its extension (.gz, .bz2 or .zst)"""
+  compression = output_compression(path)
+  if compression is None:
+    fo = open(path, 'wb')
+  else:
+    command = find_command(COMPRESS_COMMANDS[compression])
+    if command is not None:
+      fo = io.BufferedWriter(CommandFile(command, path, write=True))
+    elif compression == 'gz':
+      fo = gzip.open(path, 'wb')
+    elif compression == 'bz2':
+      fo = bz2.open(path, 'wb')
+    elif zstandard is not None:
+      fo = zstandard.ZstdCompressor(threads=-1).stream_writer(open(path, 'wb'), closefd=True)
+    else:
+      raise ValueError('{0} needs zstd, install zstandard or the zstd command'.format(path))
+  return io.TextIOWrapper(fo, encoding='utf-8') if text else fo
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Instrumentation of the data_wrangling executions
+
+Metrics keeps cumulative timers (seconds and calls by name) and counters. The timers of
+the functions are added by instrument, that replaces the functions of a module by timed
+wrappers while the execution runs and restores them at the end, so nothing is measured
+(and nothing costs) when the metrics are not used. The timers are inclusive, a function
+called by another one is counted in both.
+
+iter_elements counts the elements, the tags and the time spent parsing them, and the file
+wrapped by metered_file counts the bytes read. With the size of the file they print a
+progress line with the ETA every progress_interval seconds (the compressed files have no
+ETA, the bytes read are the decompressed ones).
+
+start_profile / stop_profile (cProfile) and start_trace_memory / stop_trace_memory
+(tracemalloc) are opt-in hooks, they slow down the execution. stop_hooks stops the ones
+left running when the execution fails.
+"""
+import cProfile
+import functools
+import json
+import pprint
+import pstats
+import time
+import tracemalloc
+
+PROGRESS_INTERVAL = 30  # segundos entre as linhas de progresso, 0 desliga
+PROGRESS_CHECK = 1000  # elementos lidos entre as verificacoes do relogio
+TOP_ENTRIES = 20  # funcoes do cProfile e linhas do tracemalloc gravadas nas metricas
+
+
+class Metrics(object):
+  """Timers and counters of one execution"""
+
+  def __init__(self, progress_interval=PROGRESS_INTERVAL):
+    self.start = time.time()
+    self.progress_interval = progress_interval
+    self.timers = {}
+    self.counters = {}
+    self.originals = []
+
+  def add(self, name, value=1):
+    self.counters[name] = self.counters.get(name, 0) + value
+
+  def add_time(self, name, seconds, calls=1):
+    timer = self.timers.get(name)
+    if timer is None:
+      timer = self.timers[name] = [0.0, 0]
+    timer[0] += seconds
+    timer[1] += calls
+
+  def timed(self, name, function):
+    """Return the function counting its calls and time in the timer name"""
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      start = perf_counter()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        self.add_time(name, perf_counter() - start)
+    return wrapper
+
+  def instrument(self, namespace, names):
+    """Replace the functions of the namespace (the globals of a module) by timed ones, until restore"""
+    for name in names:
+      self.originals.append((namespace, name, namespace[name]))
+      namespace[name] = self.timed(name, namespace[name])
+
+  def restore(self):
+    for namespace, name, function in reversed(self.originals):
+      namespace[name] = function
+    self.originals = []
+
+  def metered_file(self, fi, size=None):
+    return MeteredFile(fi, self, size)
+
+  def iter_elements(self, elements, fi=None):
+    """Yield the elements counting them, their tags and the time spent parsing them"""
+    perf_counter = time.perf_counter
+    self.add('reads')
+    read = self.counters['reads']
+    read_start = last_progress = time.time()
+    count = tags = 0
+    parse_seconds = 0.0
+    iterator = iter(elements)
+    try:
+      while True:
+        start = perf_counter()
+        try:
+          element = next(iterator)
+        except StopIteration:
+          parse_seconds += perf_counter() - start
+          break
+        parse_seconds += perf_counter() - start
+
+        count += 1
+        tags += len(element.tags)
+        if self.progress_interval and count % PROGRESS_CHECK == 0:
+          now = time.time()
+          if now - last_progress >= self.progress_interval:
+            last_progress = now
+            self.print_progress(read, count, now - read_start, fi)
+        yield element
+    finally:
+      self.add_time('parse', parse_seconds, count)
+      self.add('elements', count)
+      self.add('tags', tags)
+
+  def print_progress(self, read, count, elapsed, fi):
+    line = 'Leitura {0}: {1} elementos, {2:.0f}/s'.format(read, count, count / elapsed)
+    if fi is not None and fi.size:
+      fraction = min(fi.position / float(fi.size), 1.0)
+      line += ', {0:.1%} de {1:.1f} MB'.format(fraction, fi.size / 1048576.0)
+      if fraction > 0:
+        line += ', ETA {0}'.format(format_seconds(elapsed * (1 - fraction) / fraction))
+    elif fi is not None:
+      line += ', {0:.1f} MB'.format(fi.position / 1048576.0)
+    pprint.pprint(line)
+
+  def to_json(self, **values):
+    """Dict with the timers, the counters and the rates by second of the execution, plus the values"""
+    seconds = time.time() - self.start
+    result = {'seconds': round(seconds, 3),
+              'timers': dict((name, {'seconds': round(t[0], 4), 'calls': t[1]}) for name, t in sorted(self.timers.items())),
+              'counters': dict(self.counters),
+              'rates': {}}
+    for name in ['elements', 'tags', 'bytes_read', 'documents']:
+      if name in self.counters and seconds > 0:
+        result['rates'][name + '_per_second'] = round(self.counters[name] / seconds, 1)
+    result.update(values)
+    return result
+
+  def save(self, path, **values):
+    with open(path, 'w') as fo:
+      json.dump(self.to_json(**values), fo, indent=2, sort_keys=True)
+
+
+class MeteredFile(object):
+  """Binary file read by the parsers, counting the bytes read in the metrics"""
+
+  def __init__(self, fi, metrics, size=None):
+    self.fi = fi
+    self.metrics = metrics
+    self.size = size
+    self.position = 0
+
+  def read(self, size=-1):
+    data = self.fi.read(size)
+    self.position += len(data)
+    self.metrics.add('bytes_read', len(data))
+    return data
+
+  def close(self):
+    self.fi.close()
+
+  def __getattr__(self, name):
+    return getattr(self.fi, name)
+
+
+def format_seconds(seconds):
+  minutes, seconds = divmod(int(seconds), 60)
+  hours, minutes = divmod(minutes, 60)
+  return '{0:02d}:{1:02d}:{2:02d}'.format(hours, minutes, seconds)
+
+
+def start_profile():
+  profiler = cProfile.Profile()
+  profiler.enable()
+  return profiler
+
+
+def stop_profile(profiler, path):
+  """Write the pstats file and return the functions with the largest cumulative time"""
+  profiler.disable()
+  profiler.dump_stats(path)
+  stats = pstats.Stats(profiler)
+  top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_ENTRIES]
+  return {'file': path,
+          'top': [{'function': '{0}:{1}({2})'.format(*key), 'calls': value[1],
+                   'seconds': round(value[2], 4), 'cumulative_seconds': round(value[3], 4)}
+                  for key, value in top]}
+
+
+def start_trace_memory():
+  tracemalloc.start()
+
+
+def stop_trace_memory():
+  """Return the current and the peak memory traced and the lines that allocated more memory"""
+  current, peak = tracemalloc.get_traced_memory()
+  snapshot = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+  top = snapshot.statistics('lineno')[:TOP_ENTRIES]
+  return {'current_bytes': current, 'peak_bytes': peak,
+          'top': [{'line': '{0}:{1}'.format(s.traceback[0].filename, s.traceback[0].lineno),
+                   'bytes': s.size, 'blocks': s.count} for s in top]}
+
+
+def stop_hooks(profiler=None):
+  """Stop the cProfile and the tracemalloc still running, after an error in the execution"""
+  if profiler is not None:
+    profiler.disable()
+  if tracemalloc.is_tracing():
+    tracemalloc.stop()
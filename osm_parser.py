@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""XML parsers used to read the OSM files
+
+Every backend yields the top level elements (node, way and relation) at the end of
+their parsing, with the attributes and the sub elements (tag, nd and member) in the
+document order:
+
+- lxml:  lxml.etree.iterparse filtered by tag, the fastest one when lxml is installed;
+- expat: xml.parsers.expat with SAX-style handlers, it does not build Element objects,
+         the elements are OSMElement records with only the methods used by the scripts;
+- etree: xml.etree.ElementTree.iterparse from the standard library.
+
+iterrecords yields OSMRecord instead of elements: the attributes, the k/v pairs of the
+tags, the refs of the nd and the members gathered while the element is parsed. With the
+expat backend the records are filled directly from the start/end events, the other
+backends convert each element and release it.
+
+iterchanges yields the (action, OSMRecord) of the create, modify and delete blocks of
+the osmChange (.osc) files.
+
+The paths are opened with osm_io.open_input, so the compressed files (gz, bz2, zst and
+zip) are decompressed while they are parsed.
+"""
+import re
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+import osm_io
+
+try:
+  from lxml import etree as lxml_etree
+except ImportError:
+  lxml_etree = None
+
+BACKENDS = ['lxml', 'expat', 'etree']
+MAIN_TAGS = ('node', 'way', 'relation')
+CHANGE_ACTIONS = ('create', 'modify', 'delete')
+
+READ_SIZE = 1024 * 1024  # bytes read by the expat backend each time
+HEADER_READ_SIZE = 64 * 1024  # bytes read each time by read_header
+
+ATTRIBUTE_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#09;'}
+attribute_special_chars = re.compile(r'[&<>"\n\r\t]')
+
+
+class OSMElement(object):
+  """Element created by the expat backend, with the subset of the Element API used"""
+  __slots__ = ('tag', 'attrib', 'children')
+
+  def __init__(self, tag, attrib):
+    self.tag = tag
+    self.attrib = attrib
+    self.children = []
+
+  def get(self, key, default=None):
+    return self.attrib.get(key, default)
+
+  def findall(self, path):
+    if path == '*':
+      return list(self.children)
+    return [e for e in self.children if e.tag == path]
+
+  def __iter__(self):
+    return iter(self.children)
+
+  def __len__(self):
+    return len(self.children)
+
+
+class OSMSubElement(object):
+  """Sub element (tag, nd or member) of an OSMRecord"""
+  __slots__ = ('tag', 'attrib')
+
+  def __init__(self, tag, attrib):
+    self.tag = tag
+    self.attrib = attrib
+
+
+class OSMRecord(object):
+  """Top level element with its sub elements already split by type
+
+  tags are the (k, v) pairs, node_refs the ref of the nd and members the attributes of
+  the member, all in the document order. sub_elements keeps every sub element for the
+  auditing.
+  """
+  __slots__ = ('tag', 'attrib', 'sub_elements', 'tags', 'node_refs', 'members')
+
+  def __init__(self, tag, attrib):
+    self.tag = tag
+    self.attrib = attrib
+    self.sub_elements = []
+    self.tags = []
+    self.node_refs = []
+    self.members = []
+
+  def get(self, key, default=None):
+    return self.attrib.get(key, default)
+
+  def add_sub_element(self, tag, attrib):
+    self.sub_elements.append(OSMSubElement(tag, attrib))
+    if tag == 'tag':
+      self.tags.append((attrib.get('k'), attrib.get('v')))
+    elif tag == 'nd':
+      self.node_refs.append(attrib.get('ref'))
+    elif tag == 'member':
+      self.members.append(attrib)
+
+
+def get_backend(name=None):
+  """Return the backend to be used, lxml falls back to etree if it is not installed
+
+  `None` or 'auto' selects lxml when it is installed, otherwise etree.
+  """
+  if name is None or name == 'auto':
+    return 'lxml' if lxml_etree is not None else 'etree'
+  if name not in BACKENDS:
+    raise ValueError('unknown parser backend {0}, use one of {1}'.format(name, BACKENDS))
+  if name == 'lxml' and lxml_etree is None:
+    return 'etree'
+  return name
+
+
+def iterparse(source, tags=MAIN_TAGS, clear_elements=True, backend=None):
+  """Yield the elements in tags of the OSM file (path or binary file object)
+
+  If clear_elements is True the elements already yielded are released, so the memory
+  does not grow with the size of the file. The element must not be used after the
+  next one is requested.
+  """
+  backend = get_backend(backend)
+  if isinstance(source, str):
+    return iter_opened(source, lambda fi: iterparse(fi, tags, clear_elements, backend))
+  if backend == 'lxml':
+    return iterparse_lxml(source, tags, clear_elements)
+  elif backend == 'expat':
+    return iterparse_expat(source, tags)
+  return iterparse_etree(source, tags, clear_elements)
+
+
+def iter_opened(path, iterate):
+  """Yield the items of iterate over the file opened by osm_io.open_input and close it at the end"""
+  fi = osm_io.open_input(path)
+  try:
+    for item in iterate(fi):
+      yield item
+  finally:
+    fi.close()
+
+
+def iterparse_etree(source, tags, clear_elements):
+  if not clear_elements:
+    for event, element in ET.iterparse(source):
+      if element.tag in tags:
+        yield element
+    return
+
+  # Reference:
+  # http://stackoverflow.com/questions/3095434/inserting-newlines-in-xml-file-generated-via-xml-etree-elementtree-in-python
+  context = iter(ET.iterparse(source, events=('start', 'end')))
+  _, root = next(context)
+  for event, element in context:
+    if event == 'end' and element.tag in tags:
+      yield element
+      root.clear()
+
+
+def iterparse_lxml(source, tags, clear_elements):
+  for event, element in lxml_etree.iterparse(source, events=('end',), tag=tags, huge_tree=True):
+    yield element
+    if clear_elements:
+      element.clear()
+      while element.getprevious() is not None:
+        del element.getparent()[0]
+
+
+def iterparse_expat(source, tags):
+  stack = []
+  completed = []
+
+  def start_element(name, attrib):
+    if stack:
+      element = OSMElement(name, attrib)
+      stack[-1].children.append(element)
+      stack.append(element)
+    elif name in tags:
+      stack.append(OSMElement(name, attrib))
+
+  def end_element(name):
+    if stack:
+      element = stack.pop()
+      if not stack:
+        completed.append(element)
+
+  parser = expat.ParserCreate()
+  parser.StartElementHandler = start_element
+  parser.EndElementHandler = end_element
+
+  while True:
+    data = source.read(READ_SIZE)
+    parser.Parse(data, not data)
+    for element in completed:
+      yield element
+    del completed[:]
+    if not data:
+      break
+
+
+def iterrecords(source, tags=MAIN_TAGS, backend=None):
+  """Yield an OSMRecord for each element in tags of the OSM file (path or binary file object)"""
+  backend = get_backend(backend)
+  if isinstance(source, str):
+    return iter_opened(source, lambda fi: iterrecords(fi, tags, backend))
+  if backend == 'expat':
+    return iterrecords_expat(source, tags)
+  return (record_from_element(element) for element in iterparse(source, tags, True, backend))
+
+
+def record_from_element(element):
+  record = OSMRecord(element.tag, dict(element.attrib))
+  for sub_element in element:
+    record.add_sub_element(sub_element.tag, dict(sub_element.attrib))
+  return record
+
+
+def iterchanges(source, tags=MAIN_TAGS):
+  """Yield (action, OSMRecord) for each element in tags of the osmChange file (path or binary file object)"""
+  if isinstance(source, str):
+    return iter_opened(source, lambda fi: iterchanges(fi, tags))
+  return iterrecords_expat(source, tags, with_action=True)
+
+
+def iterrecords_expat(source, tags, with_action=False):
+  # current: [record being parsed, depth of the sub element inside it, osmChange action]
+  current = [None, 0, None]
+  completed = []
+
+  def start_element(name, attrib):
+    record = current[0]
+    if record is None:
+      if name in tags:
+        current[0] = OSMRecord(name, attrib)
+      elif name in CHANGE_ACTIONS:
+        current[2] = name
+      return
+    current[1] += 1
+    if current[1] > 1:
+      return
+    record.sub_elements.append(OSMSubElement(name, attrib))
+    if name == 'tag':
+      record.tags.append((attrib.get('k'), attrib.get('v')))
+    elif name == 'nd':
+      record.node_refs.append(attrib.get('ref'))
+    elif name == 'member':
+      record.members.append(attrib)
+
+  def end_element(name):
+    if current[0] is None:
+      return
+    if current[1] > 0:
+      current[1] -= 1
+    else:
+      completed.append((current[2], current[0]) if with_action else current[0])
+      current[0] = None
+
+  parser = expat.ParserCreate()
+  parser.StartElementHandler = start_element
+  parser.EndElementHandler = end_element
+
+  while True:
+    data = source.read(READ_SIZE)
+    parser.Parse(data, not data)
+    for record in completed:
+      yield record
+    del completed[:]
+    if not data:
+      break
+
+
+def read_header(source):
+  """Return the attributes of the root element and of the <bounds> (None without it)
+
+  Only the start of the file is read, the parsing stops at the first node, way or relation.
+  """
+  if isinstance(source, str):
+    fi = osm_io.open_input(source)
+    try:
+      return read_header(fi)
+    finally:
+      fi.close()
+
+  header = {}
+
+  def start_element(name, attrib):
+    if 'root' not in header:
+      header['root'] = attrib
+    elif name == 'bounds':
+      header.setdefault('bounds', attrib)
+    elif name in MAIN_TAGS:
+      header['end'] = True
+
+  parser = expat.ParserCreate()
+  parser.StartElementHandler = start_element
+  while 'end' not in header:
+    data = source.read(HEADER_READ_SIZE)
+    parser.Parse(data, not data)
+    if not data:
+      break
+  return header.get('root', {}), header.get('bounds')
+
+
+def escape_attribute(value):
+  if attribute_special_chars.search(value) is None:
+    return value
+  return escape(value, ATTRIBUTE_ENTITIES)
+
+
+def start_tag(tag, attrib, empty=False):
+  """Serialize the start tag (or the empty element) as utf-8 bytes"""
+  attributes = ''.join(' {0}="{1}"'.format(k, escape_attribute(v)) for k, v in attrib.items())
+  return '<{0}{1}{2}>'.format(tag, attributes, ' /' if empty else '').encode('utf-8')
+
+
+def tostring(element):
+  """Serialize the element (of any backend) as utf-8 bytes"""
+  if isinstance(element, OSMElement):
+    return tostring_osm_element(element)
+  if lxml_etree is not None and isinstance(element, lxml_etree._Element):
+    return lxml_etree.tostring(element, encoding='utf-8')
+  return ET.tostring(element, encoding='utf-8')
+
+
+def tostring_osm_element(element):
+  """Serialize the OSMElement with the same layout of the OSM files, one sub element per line"""
+  if not element.children:
+    return start_tag(element.tag, element.attrib, empty=True) + b'\n '
+
+  xml = [start_tag(element.tag, element.attrib)]
+  for e in element.children:
+    xml.append(b'\n  ' + tostring_osm_element(e).rstrip())
+  xml.append('\n </{0}>\n '.format(element.tag).encode('utf-8'))
+  return b''.join(xml)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Area filter and spatial index of the OSM data
+
+BBox and Polygon select the area processed by data_wrangling: filter_elements drops the
+nodes out of the area before they are audited or processed, the ways with no node in
+the area and the relations with no member kept. The elements are in the order of the
+OSM files (nodes, ways and relations), so the ids kept are known when the ways and the
+relations are read.
+
+SpatialGrid is an in-memory index of the pos of the documents in cells of about
+cell_size metres, within returns the items at most N metres from a point without a
+database round trip:
+
+  python osm_spatial.py data/map.osm.json 40.7484 -73.9857 200
+"""
+import argparse
+import json
+import math
+import pprint
+from array import array
+
+R_EARTH = 6371008.8  # raio medio da terra em metros
+METRES_PER_DEGREE = math.pi * R_EARTH / 180
+CELL_SIZE = 250  # metros
+
+
+class BBox(object):
+  """Area between minlat, minlon, maxlat and maxlon, the order of the <bounds> of the OSM files"""
+
+  def __init__(self, minlat, minlon, maxlat, maxlon):
+    self.bounds = (minlat, minlon, maxlat, maxlon)
+
+  def contains(self, lat, lon):
+    minlat, minlon, maxlat, maxlon = self.bounds
+    return minlat <= lat <= maxlat and minlon <= lon <= maxlon
+
+
+class Polygon(object):
+  """Area of the outer rings of [(lat, lon), ...] out of the holes"""
+
+  def __init__(self, outer, holes=()):
+    self.outer = [list(ring) for ring in outer]
+    self.holes = [list(ring) for ring in holes]
+    points = [p for ring in self.outer for p in ring]
+    self.bbox = BBox(min(p[0] for p in points), min(p[1] for p in points),
+                     max(p[0] for p in points), max(p[1] for p in points))
+
+  def contains(self, lat, lon):
+    if not self.bbox.contains(lat, lon):
+      return False
+    return (any(ring_contains(ring, lat, lon) for ring in self.outer) and
+            not any(ring_contains(ring, lat, lon) for ring in self.holes))
+
+
+def ring_contains(ring, lat, lon):
+  """Ray casting: the point is inside if a ray from it crosses the ring an odd number of times"""
+  inside = False
+  j = len(ring) - 1
+  for i in range(len(ring)):
+    lat_i, lon_i = ring[i]
+    lat_j, lon_j = ring[j]
+    if (lat_i > lat) != (lat_j > lat) and lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+      inside = not inside
+    j = i
+  return inside
+
+
+def parse_bbox(value):
+  """BBox of the text minlat,minlon,maxlat,maxlon"""
+  values = [float(v) for v in value.split(',')]
+  if len(values) != 4:
+    raise ValueError('the bbox must be minlat,minlon,maxlat,maxlon: {0}'.format(value))
+  return BBox(*values)
+
+
+def load_polygon(filename):
+  """Polygon of an Osmosis .poly file or of a GeoJSON Polygon / MultiPolygon (or a Feature of them)"""
+  with open(filename, 'r') as fi:
+    text = fi.read()
+
+  if filename.endswith('.poly'):
+    outer, holes = [], []
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    ring = None
+    # a primeira linha e o nome do poligono, cada secao termina com END
+    for line in lines[1:]:
+      if ring is None:
+        if line == 'END':
+          break
+        ring = []
+        (holes if line.startswith('!') else outer).append(ring)
+      elif line == 'END':
+        ring = None
+      else:
+        lon, lat = line.split()[:2]
+        ring.append((float(lat), float(lon)))
+    return Polygon(outer, holes)
+
+  geometry = json.loads(text)
+  if geometry.get('type') == 'FeatureCollection':
+    geometry = geometry['features'][0]
+  if geometry.get('type') == 'Feature':
+    geometry = geometry['geometry']
+  polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+  # GeoJSON usa [lon, lat], o primeiro anel e o externo e os outros sao buracos
+  outer = [[(p[1], p[0]) for p in polygon[0]] for polygon in polygons]
+  holes = [[(p[1], p[0]) for p in ring] for polygon in polygons for ring in polygon[1:]]
+  return Polygon(outer, holes)
+
+
+def filter_elements(elements, area):
+  """Yield the elements in the area, see the module documentation"""
+  nodes = set()
+  ways = set()
+  relations = set()
+  for element in elements:
+    id = element.get('id')
+    if element.tag == 'node':
+      lat = element.get('lat')
+      lon = element.get('lon')
+      if lat is None or lon is None or not area.contains(float(lat), float(lon)):
+        continue
+      nodes.add(id)
+    elif element.tag == 'way':
+      if not any(ref in nodes for ref in element.node_refs):
+        continue
+      ways.add(id)
+    elif element.tag == 'relation':
+      kept = {'node': nodes, 'way': ways, 'relation': relations}
+      if not any(m.get('ref') in kept.get(m.get('type'), ()) for m in element.members):
+        continue
+      relations.add(id)
+    yield element
+
+
+def distance(lat1, lon1, lat2, lon2):
+  """Haversine distance in metres"""
+  lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+  a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+  return 2 * R_EARTH * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialGrid(object):
+  """Grid of cells of cell_size metres (in latitude) with the positions added"""
+
+  def __init__(self, cell_size=CELL_SIZE):
+    self.cell_degrees = cell_size / METRES_PER_DEGREE
+    self.cells = {}
+    self.lats = array('d')
+    self.lons = array('d')
+    self.items = []
+
+  def __len__(self):
+    return len(self.items)
+
+  def cell(self, lat, lon):
+    return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+  def add(self, lat, lon, item):
+    self.cells.setdefault(self.cell(lat, lon), []).append(len(self.items))
+    self.lats.append(lat)
+    self.lons.append(lon)
+    self.items.append(item)
+
+  def lon_cells(self, west, east):
+    """Cells of the longitudes from west to east, the ranges crossing 180 are split in two"""
+    if west < -180.0:
+      ranges = [(west + 360.0, 180.0), (-180.0, east)]
+    elif east > 180.0:
+      ranges = [(west, 180.0), (-180.0, east - 360.0)]
+    else:
+      ranges = [(west, east)]
+    return [j for w, e in ranges for j in range(self.cell(0.0, w)[1], self.cell(0.0, e)[1] + 1)]
+
+  def query_cells(self, lat, lon, metres):
+    """Cells that can have the items at most metres from the point"""
+    dlat = metres / METRES_PER_DEGREE
+    min_i = self.cell(max(lat - dlat, -90.0), 0.0)[0]
+    max_i = self.cell(min(lat + dlat, 90.0), 0.0)[0]
+    if abs(lat) + dlat < 90.0:
+      # os graus de longitude diminuem com a latitude
+      dlon = dlat / math.cos(math.radians(abs(lat) + dlat))
+      if dlon < 180.0:
+        columns = self.lon_cells(lon - dlon, lon + dlon)
+        if (max_i - min_i + 1) * len(columns) <= len(self.cells):
+          return [(i, j) for i in range(min_i, max_i + 1) for j in columns]
+        # mais celulas na area do que celulas com itens
+        columns = set(columns)
+        return [key for key in self.cells if min_i <= key[0] <= max_i and key[1] in columns]
+    # o circulo passa pelo polo ou da a volta na terra, todas as longitudes das linhas
+    return [key for key in self.cells if min_i <= key[0] <= max_i]
+
+  def within(self, lat, lon, metres):
+    """Return [(distance, item)] of the items at most metres from the point, the nearest first"""
+    found = []
+    for cell in self.query_cells(lat, lon, metres):
+      for k in self.cells.get(cell, ()):
+        d = distance(lat, lon, self.lats[k], self.lons[k])
+        if d <= metres:
+          found.append((d, self.items[k]))
+    found.sort(key=lambda x: x[0])
+    return found
+
+
+def index_documents(documents, cell_size=CELL_SIZE, keep_documents=False):
+  """SpatialGrid of the pos of the documents, the items are (type, id) or the documents"""
+  grid = SpatialGrid(cell_size)
+  for document in documents:
+    if document is not None and document.get('pos'):
+      lat, lon = document['pos']
+      grid.add(lat, lon, document if keep_documents else (document.get('type'), document.get('id')))
+  return grid
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Elementos a ate N metros de um ponto, sem consultar o mongodb')
+  parser.add_argument('filename', help='json, ndjson ou arquivo colunar criado pelo data_wrangling')
+  parser.add_argument('lat', type=float)
+  parser.add_argument('lon', type=float)
+  parser.add_argument('metres', type=float)
+  parser.add_argument('--cell-size', type=float, default=CELL_SIZE)
+  args = parser.parse_args()
+
+  if args.filename.endswith('.parquet') or args.filename.endswith('.osmcol'):
+    import osm_columnar
+    # le apenas as colunas usadas pelo indice
+    rows = osm_columnar.iter_rows(args.filename, ['id', 'type', 'lat', 'lon'])
+    documents = ({'id': r['id'], 'type': r['type'], 'pos': None if r['lat'] is None else [r['lat'], r['lon']]}
+                 for r in rows)
+  else:
+    from data_insert_in_mongodb import read_documents
+    documents = read_documents(args.filename)
+
+  grid = index_documents(documents, args.cell_size)
+  for d, item in grid.within(args.lat, args.lon, args.metres):
+    pprint.pprint((round(d, 1), item))
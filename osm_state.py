@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Persistent state of the OSM file processed by data_wrangling
+
+The state is a sqlite file with one row for each node, way and relation: the version,
+the element (attributes and sub elements, enough to audit and process it again) and
+the json document created. The rows keep the order of the file, the elements created
+by the incremental executions are appended at the end.
+
+The table meta keeps json values like the auditing state, so an incremental execution
+only audits and processes the elements changed.
+"""
+import json
+import sqlite3
+
+import osm_parser
+
+
+def element_key(element):
+  """Key of the element in the state, the same id can be used by a node and a way"""
+  return '{0}/{1}'.format(element.tag, element.get('id'))
+
+
+def record_to_json(record):
+  return json.dumps([record.tag, record.attrib, [[e.tag, e.attrib] for e in record.sub_elements]])
+
+
+def record_from_json(value):
+  tag, attrib, sub_elements = json.loads(value)
+  record = osm_parser.OSMRecord(tag, attrib)
+  for sub_tag, sub_attrib in sub_elements:
+    record.add_sub_element(sub_tag, sub_attrib)
+  return record
+
+
+class OSMState(object):
+  """Elements, documents and meta values of the state file"""
+
+  def __init__(self, path):
+    self.path = path
+    self.connection = sqlite3.connect(path)
+    self.connection.execute('CREATE TABLE IF NOT EXISTS elements '
+                            '(key TEXT PRIMARY KEY, version TEXT, record TEXT, document TEXT)')
+    self.connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+
+  def clear(self):
+    self.connection.execute('DELETE FROM elements')
+    self.connection.execute('DELETE FROM meta')
+
+  def __len__(self):
+    return self.connection.execute('SELECT COUNT(*) FROM elements').fetchone()[0]
+
+  def get(self, key):
+    """Return (version, record, document) of the element or None"""
+    row = self.connection.execute('SELECT version, record, document FROM elements WHERE key = ?',
+                                  (key,)).fetchone()
+    if row is None:
+      return None
+    return row[0], record_from_json(row[1]), json.loads(row[2])
+
+  def get_version(self, key):
+    row = self.connection.execute('SELECT version FROM elements WHERE key = ?', (key,)).fetchone()
+    return None if row is None else row[0]
+
+  def put(self, key, record, document):
+    """Insert or update the element, an update keeps the position of the element"""
+    values = (record.get('version'), record_to_json(record), json.dumps(document), key)
+    cursor = self.connection.execute('UPDATE elements SET version = ?, record = ?, document = ? WHERE key = ?',
+                                     values)
+    if cursor.rowcount == 0:
+      self.connection.execute('INSERT INTO elements (version, record, document, key) VALUES (?, ?, ?, ?)',
+                              values)
+
+  def put_document(self, key, document):
+    self.connection.execute('UPDATE elements SET document = ? WHERE key = ?', (json.dumps(document), key))
+
+  def delete(self, key):
+    self.connection.execute('DELETE FROM elements WHERE key = ?', (key,))
+
+  def keys(self):
+    return [row[0] for row in self.connection.execute('SELECT key FROM elements ORDER BY rowid')]
+
+  def iter_records(self):
+    """Yield (key, record) in the order of the file"""
+    for key, record in self.connection.execute('SELECT key, record FROM elements ORDER BY rowid'):
+      yield key, record_from_json(record)
+
+  def iter_documents(self):
+    """Yield the documents in the order of the file"""
+    for row in self.connection.execute('SELECT document FROM elements ORDER BY rowid'):
+      yield json.loads(row[0])
+
+  def load_meta(self, name, default=None):
+    row = self.connection.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+    return default if row is None else json.loads(row[0])
+
+  def save_meta(self, name, value):
+    self.connection.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, json.dumps(value)))
+
+  def commit(self):
+    self.connection.commit()
+
+  def close(self, commit=True):
+    """Close the state file, without commit the changes not committed are discarded"""
+    if commit:
+      self.connection.commit()
+    else:
+      self.connection.rollback()
+    self.connection.close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Synthetic OSM files for the benchmarks
+
+generate_osm writes an OSM XML file with the layout of the extracts of the overpass api
+(<bounds>, the nodes, the ways and the relations), with the tags audited and cleaned by
+data_wrangling: names, addresses with abbreviated street types and zip codes out of
+the NY range, opening_hours and conditional restrictions, yes/no values and keys with
+problem chars. The same arguments and seed always create the same file.
+
+  python osm_synthetic.py data/benchmark/synthetic-100k.osm 100000 --tags 2 --address-rate 0.2
+
+The ways reference nodes already written and the relations reference ways, nodes and
+relations already written, so the sample and the geometry of the file are complete.
+"""
+import argparse
+import random
+import time
+
+import osm_io
+import osm_parser
+
+BOUNDS = {'minlat': '40.6827000', 'minlon': '-74.0486000', 'maxlat': '40.8808000', 'maxlon': '-73.9043000'}
+BASE_TIMESTAMP = 1262304000  # 2010-01-01, os timestamps sao gerados a partir dessa data
+WRITE_ELEMENTS = 10000  # elementos juntados antes de cada escrita
+
+WAY_RATIO = 0.12
+RELATION_RATIO = 0.01
+TAGS_PER_ELEMENT = 1.5
+OPENING_HOURS_RATE = 0.05
+ADDRESS_RATE = 0.1
+
+STREET_NAMES = ['Broadway', 'Amsterdam', 'Lexington', 'Madison', 'West 42nd', 'East 14th', 'Park', 'Canal',
+                'Bleecker', 'Houston', 'W 57th', 'E 86th', 'Saint Nicholas', 'Fifth', 'Riverside']
+STREET_TYPES = ['Street', 'St', 'St.', 'street', 'Avenue', 'Ave', 'Av.', 'Boulevard', 'Blvd', 'Place', 'Pl',
+                'Drive', 'Dr', 'Road', 'Rd']
+POSTCODES = ['10001', '10013', '10019', '10036', '10128', '11201', '10001-2345', 'NY 10012', '07302', '1002']
+CITIES = ['New York', 'New York City', 'NYC', 'Brooklyn']
+NAMES = ['Central Park', 'Joe\'s Pizza', 'Katz\'s Delicatessen', 'Strand Bookstore', 'Chelsea Market',
+         'Grand Central Terminal', 'Public School 41', 'Saint Mark\'s Church', 'Deli & Grocery', 'Hudson Yards']
+OPENING_HOURS = ['24/7', 'Mo-Fr 08:00-18:00', 'Mo-Sa 09:00-21:00; Su 10:00-18:00', 'Mo-Fr 10:00-08:00; Sa,Su',
+                 'Mo-Th 12:00-02:00; Fr 12:00-04:00; Sa, Su 11:30-04:00',
+                 'Mo-Fr 8:00-16:00, 17:00-23:00; Sa 9:00-16:00, 17:00-23:00; Su 9:00-17:00']
+CONDITIONALS = ['no @ (Mo-Fr 07:00-10:00)', 'no_left_turn @ (Mo-Fr 06:00-10:00,15:00-19:00)',
+                'yes @ (axles=2 AND weight<40 st); yes @ (Mo-Sa 07:00- 20:00)',
+                'permissive @ (Mo-Fr 07:00-22:00; SH off)']
+
+# chaves comuns com seus valores, a ultima parte tem chaves invalidas para o is_valid_key_from_tag
+COMMON_TAGS = [
+  ('amenity', ['restaurant', 'cafe', 'school', 'bank', 'pharmacy', 'bicycle_parking']),
+  ('shop', ['supermarket', 'convenience', 'clothes', 'books', 'deli']),
+  ('building', ['yes', 'residential', 'commercial', 'apartments']),
+  ('building:levels', ['2', '4', '6', '12', '30']),
+  ('wheelchair', ['yes', 'no', 'limited']),
+  ('name:en', NAMES),
+  ('old_name', NAMES),
+  ('tiger:county', ['New York, NY', 'Kings, NY']),
+  ('gnis:feature_id', ['942345', '2083617']),
+  ('crossing', ['zebra', 'traffic_signals']),
+  ('crossing:ref', ['zebra']),
+  ('cityracks.large', ['1', '2']),
+  ('bad key', ['x']),
+  ('addr:', ['empty suffix']),
+  ('Phone', ['+1 212 555 0100']),
+]
+WAY_TAGS = [
+  ('highway', ['residential', 'primary', 'secondary', 'footway', 'service']),
+  ('oneway', ['yes', 'no']),
+  ('lanes', ['1', '2', '3']),
+]
+RELATION_TYPES = ['multipolygon', 'route', 'restriction', 'boundary']
+MEMBER_ROLES = ['outer', 'inner', '', 'stop', 'platform']
+
+
+def parse_count(value):
+  """Number of elements of texts like 10k, 2.5m or 10000"""
+  value = value.strip().lower()
+  multipliers = {'k': 1000, 'm': 1000000}
+  if value[-1:] in multipliers:
+    return int(float(value[:-1]) * multipliers[value[-1]])
+  return int(value)
+
+
+def generate_osm(path, elements, way_ratio=WAY_RATIO, relation_ratio=RELATION_RATIO,
+                 tags_per_element=TAGS_PER_ELEMENT, opening_hours_rate=OPENING_HOURS_RATE,
+                 address_rate=ADDRESS_RATE, seed=0):
+  """Write the OSM file with the number of elements, compressed by the extension (see osm_io.open_output)
+
+  Return a dict with the number of nodes, ways, relations and tags written.
+  """
+  rng = random.Random(seed)
+  relations = max(1, int(elements * relation_ratio)) if elements >= 100 else 0
+  ways = max(1, int(elements * way_ratio)) if elements >= 10 else 0
+  nodes = elements - ways - relations
+  counts = {'nodes': nodes, 'ways': ways, 'relations': relations, 'tags': 0}
+
+  minlat, minlon = float(BOUNDS['minlat']), float(BOUNDS['minlon'])
+  dlat, dlon = float(BOUNDS['maxlat']) - minlat, float(BOUNDS['maxlon']) - minlon
+
+  with osm_io.open_output(path) as output:
+    output.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+    output.write(osm_parser.start_tag('osm', {'version': '0.6', 'generator': 'osm_synthetic'}) + b'\n ')
+    output.write(osm_parser.start_tag('bounds', BOUNDS, empty=True) + b'\n')
+    buffer = []
+    # os valores das tags sao repetidos, cada tag e serializada uma vez
+    tags_xml = {}
+
+    def write_element(tag, attrib, sub_elements, tags):
+      xml = [b' ', osm_parser.start_tag(tag, attrib, empty=not (sub_elements or tags)), b'\n']
+      for sub_tag, sub_attrib in sub_elements:
+        xml.extend((b'  ', osm_parser.start_tag(sub_tag, sub_attrib, empty=True), b'\n'))
+      for k, v in tags:
+        tag_xml = tags_xml.get((k, v))
+        if tag_xml is None:
+          tag_xml = tags_xml[(k, v)] = b'  ' + osm_parser.start_tag('tag', {'k': k, 'v': v}, empty=True) + b'\n'
+        xml.append(tag_xml)
+      if sub_elements or tags:
+        xml.append(' </{0}>\n'.format(tag).encode('utf-8'))
+      buffer.append(b''.join(xml))
+      if len(buffer) >= WRITE_ELEMENTS:
+        output.write(b''.join(buffer))
+        del buffer[:]
+
+    for i in range(1, nodes + 1):
+      attrib = created(rng, i)
+      attrib['lat'] = '{0:.7f}'.format(minlat + rng.random() * dlat)
+      attrib['lon'] = '{0:.7f}'.format(minlon + rng.random() * dlon)
+      tags = element_tags(rng, 'node', tags_per_element, opening_hours_rate, address_rate)
+      counts['tags'] += len(tags)
+      write_element('node', attrib, [], tags)
+
+    for i in range(1, ways + 1):
+      # nodes consecutivos, como as ways dos extratos reais
+      first = rng.randint(1, max(1, nodes - 10))
+      refs = [('nd', {'ref': str(min(nodes, first + j))}) for j in range(rng.randint(2, 10))]
+      tags = element_tags(rng, 'way', tags_per_element, opening_hours_rate, address_rate)
+      counts['tags'] += len(tags)
+      write_element('way', created(rng, i), refs, tags)
+
+    for i in range(1, relations + 1):
+      members = []
+      for j in range(rng.randint(2, 6)):
+        member_type = rng.choice(['way', 'way', 'node', 'relation'] if i > 1 else ['way', 'node'])
+        ref = rng.randint(1, {'node': nodes, 'way': ways, 'relation': i - 1}[member_type])
+        members.append(('member', {'type': member_type, 'ref': str(ref), 'role': rng.choice(MEMBER_ROLES)}))
+      tags = [('type', rng.choice(RELATION_TYPES))]
+      tags += element_tags(rng, 'relation', tags_per_element, opening_hours_rate, address_rate)
+      counts['tags'] += len(tags)
+      write_element('relation', created(rng, i), members, tags)
+
+    buffer.append(b'</osm>\n')
+    output.write(b''.join(buffer))
+  return counts
+
+
+def created(rng, id):
+  uid = rng.randint(1, 500)
+  return {'id': str(id), 'visible': 'true', 'version': str(rng.randint(1, 12)),
+          'changeset': str(rng.randint(1000, 60000000)),
+          'timestamp': timestamp(BASE_TIMESTAMP + rng.randint(0, 300000000)),
+          'user': 'user{0}'.format(uid), 'uid': str(uid)}
+
+
+def timestamp(seconds):
+  return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+
+def element_tags(rng, tag, tags_per_element, opening_hours_rate, address_rate):
+  """(k, v) of the tags of an element, about tags_per_element common tags plus the address and the hours"""
+  count = int(rng.random() * 2 * tags_per_element + 0.5)
+  pool = COMMON_TAGS + WAY_TAGS if tag == 'way' else COMMON_TAGS
+  tags = []
+  if count > 0 and rng.random() < 0.5:
+    tags.append(('name', rng.choice(NAMES)))
+    count -= 1
+  for k, values in rng.sample(pool, min(count, len(pool))):
+    tags.append((k, rng.choice(values)))
+
+  if rng.random() < address_rate:
+    tags.append(('addr:housenumber', str(rng.randint(1, 2500))))
+    tags.append(('addr:street', '{0} {1}'.format(rng.choice(STREET_NAMES), rng.choice(STREET_TYPES))))
+    tags.append(('addr:postcode', rng.choice(POSTCODES)))
+    tags.append(('addr:city', rng.choice(CITIES)))
+
+  if rng.random() < opening_hours_rate:
+    if tag == 'way':
+      tags.append(('maxspeed:conditional', rng.choice(CONDITIONALS)))
+    else:
+      tags.append(('opening_hours', rng.choice(OPENING_HOURS)))
+  return tags
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Cria um arquivo OSM sintetico para os benchmarks')
+  parser.add_argument('filename', help='arquivo criado, compactado se terminar com .gz, .bz2 ou .zst')
+  parser.add_argument('elements', help='quantidade de elementos, como 10k, 1m ou 10000')
+  parser.add_argument('--way-ratio', type=float, default=WAY_RATIO, help='fracao dos elementos que sao ways')
+  parser.add_argument('--relation-ratio', type=float, default=RELATION_RATIO,
+                      help='fracao dos elementos que sao relations')
+  parser.add_argument('--tags', type=float, default=TAGS_PER_ELEMENT, help='media de tags comuns por elemento')
+  parser.add_argument('--opening-hours-rate', type=float, default=OPENING_HOURS_RATE,
+                      help='fracao dos elementos com opening_hours ou maxspeed:conditional')
+  parser.add_argument('--address-rate', type=float, default=ADDRESS_RATE, help='fracao dos elementos com endereco')
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  print(generate_osm(args.filename, parse_count(args.elements), args.way_ratio, args.relation_ratio, args.tags,
+                     args.opening_hours_rate, args.address_rate, args.seed))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Typed schema of the json documents created by data_wrangling
+
+By default every value of the documents is the text of the OSM file. With the typed
+schema (data_wrangling.py --typed) the values compared and indexed in the mongodb are
+numbers:
+
+- id, created.version, created.changeset and created.uid:  int;
+- node_refs, the ref of the members and the member_refs:    list of int;
+- created.timestamp:  seconds since 1970-01-01 UTC (int) in the json, the json has no
+                      date type. The loader (data_insert_in_mongodb.py --typed) inserts
+                      it as a date of the mongodb, so the range queries use the date.
+
+Only the texts written the same way by str(int(text)) are converted, the others (like
+'007' or an invalid timestamp) are kept as texts. The conversion of a document already
+typed returns the same values, so the loader can type the exports created before the
+typed schema too.
+
+Existing exports (json, ndjson, compressed or columnar) are converted with:
+
+  python osm_typed.py data/map.osm.json data/map.osm.typed.json
+"""
+import argparse
+import calendar
+import os
+import pprint
+import re
+from datetime import datetime, timedelta
+
+import osm_io
+from osm_document import to_int
+
+EPOCH = datetime(1970, 1, 1)
+timestamp_format = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)Z\Z')
+
+MEMBER_REFS_TYPES = ('node', 'way', 'relation')
+
+
+def to_int_value(value):
+  return to_int(value) if isinstance(value, str) else value
+
+
+def parse_timestamp(value):
+  """Seconds since the epoch of the OSM timestamp (2017-10-27T23:03:48Z), the value itself if it is not one"""
+  if not isinstance(value, str):
+    return value
+  match = timestamp_format.match(value)
+  if match is None:
+    return value
+  try:
+    # o datetime valida o dia do mes
+    return calendar.timegm(datetime(*[int(part) for part in match.groups()]).timetuple())
+  except ValueError:
+    return value
+
+
+def to_datetime(value):
+  """datetime (UTC, without tzinfo like the dates read by pymongo) of the seconds since the epoch"""
+  if isinstance(value, str):
+    value = parse_timestamp(value)
+  if isinstance(value, int) and not isinstance(value, bool):
+    return EPOCH + timedelta(seconds=value)
+  return value
+
+
+def typed_document(document, native_datetime=False):
+  """Return a copy of the document with the typed values, the keys keep their order
+
+  With native_datetime the created.timestamp is a datetime instead of the seconds.
+  """
+  if not isinstance(document, dict):
+    return document
+  typed = dict(document)
+  if 'id' in typed:
+    typed['id'] = to_int_value(typed['id'])
+
+  created = typed.get('created')
+  if isinstance(created, dict):
+    created = typed['created'] = dict(created)
+    for key in ('version', 'changeset', 'uid'):
+      if key in created:
+        created[key] = to_int_value(created[key])
+    if 'timestamp' in created:
+      created['timestamp'] = (to_datetime if native_datetime else parse_timestamp)(created['timestamp'])
+
+  if isinstance(typed.get('node_refs'), list):
+    typed['node_refs'] = [to_int_value(ref) for ref in typed['node_refs']]
+  if isinstance(typed.get('members'), list):
+    typed['members'] = [typed_member(member) for member in typed['members']]
+  member_refs = typed.get('member_refs')
+  if isinstance(member_refs, dict):
+    typed['member_refs'] = dict((key, [to_int_value(ref) for ref in refs] if key in MEMBER_REFS_TYPES else refs)
+                                for key, refs in member_refs.items())
+  return typed
+
+
+def typed_member(member):
+  if not isinstance(member, dict) or 'ref' not in member:
+    return member
+  member = dict(member)
+  member['ref'] = to_int_value(member['ref'])
+  return member
+
+
+def output_format_of(file_out):
+  """ndjson if the name (without the compression extension) ends with .ndjson, otherwise json"""
+  name = file_out
+  for compression in osm_io.COMPRESSIONS:
+    if name.endswith('.' + compression):
+      name = name[:-len(compression) - 1]
+  return 'ndjson' if name.endswith('.ndjson') else 'json'
+
+
+def convert_file(file_in, file_out, output_format=None):
+  """Write the documents of the export file_in with the typed schema, return the documents written
+
+  The input is read by data_insert_in_mongodb.read_documents (json, ndjson, compressed or
+  columnar), the output format is given by the name of file_out if it is not informed.
+  """
+  # importados aqui, o data_wrangling e o loader importam este modulo
+  import data_insert_in_mongodb
+  import data_wrangling
+  documents = (typed_document(d) for d in data_insert_in_mongodb.read_documents(file_in))
+  return data_wrangling.write_json_documents(file_out, documents, output_format or output_format_of(file_out))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Converte um json do data_wrangling para o esquema tipado')
+  parser.add_argument('file_in', help='json, ndjson (compactados ou nao) ou arquivo colunar')
+  parser.add_argument('file_out', help='json criado, ndjson se terminar com .ndjson, compactado pela extensao')
+  parser.add_argument('--output-format', choices=['json', 'ndjson'], default=None)
+  args = parser.parse_args()
+
+  count = convert_file(args.file_in, args.file_out, args.output_format)
+  pprint.pprint('Documentos convertidos: {0}, {1} bytes para {2} bytes'.format(
+    count, os.path.getsize(args.file_in), os.path.getsize(args.file_out)))
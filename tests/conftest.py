@@ -0,0 +1,5 @@
+# os scripts ficam na raiz do repositorio, os testes importam os modulos de la
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import amostra_arquivo
+import osm_parser
+
+NODES = 40
+WAYS = 12
+RELATIONS = 6
+
+
+def write_osm(path):
+  """Nodes, ways and relations sorted by type, some references are out of the file like in an extract"""
+  with io.open(path, 'w', encoding='utf-8') as fo:
+    fo.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="test">\n')
+    fo.write(' <bounds minlat="40.7" minlon="-74.1" maxlat="40.8" maxlon="-74.0"/>\n')
+    for id in range(1, NODES + 1):
+      tag = '  <tag k="amenity" v="cafe"/>\n' if id % 4 == 0 else ''
+      fo.write(' <node id="{0}" lat="40.7{0}" lon="-74.0{0}">\n{1} </node>\n'.format(id, tag))
+    for i in range(WAYS):
+      id = 100 + i
+      refs = [1 + (3 * i + j) % NODES for j in range(3)] + ([999] if i % 3 == 0 else [])
+      tag = '  <tag k="highway" v="residential"/>\n' if i % 2 == 0 else ''
+      fo.write(' <way id="{0}">\n{1}{2} </way>\n'.format(
+        id, ''.join('  <nd ref="{0}"/>\n'.format(ref) for ref in refs), tag))
+    for i in range(RELATIONS):
+      id = 200 + i
+      members = [('way', 100 + 2 * i), ('node', 1 + i)]
+      if i > 0:
+        members.append(('relation', id - 1))
+      if i % 2 == 0:
+        members.append(('way', 9999))
+      fo.write(' <relation id="{0}">\n{1} </relation>\n'.format(id, ''.join(
+        '  <member type="{0}" ref="{1}" role=""/>\n'.format(t, ref) for t, ref in members)))
+    fo.write('</osm>\n')
+
+
+class SampleTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.osm_file = os.path.join(self.directory, 'map.osm')
+    write_osm(self.osm_file)
+    self.records = dict(((r.tag, r.get('id')), r) for r in osm_parser.iterrecords(self.osm_file))
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def sample(self, name='sample.osm', **kwargs):
+    sample_file = os.path.join(self.directory, name)
+    with contextlib.redirect_stdout(io.StringIO()):
+      amostra_arquivo.main(self.osm_file, sample_file, **kwargs)
+    return [amostra_arquivo.element_key(r) for r in osm_parser.iterrecords(sample_file)]
+
+  def test_seed_repeats_the_sample(self):
+    for mode in ('reservoir', 'stratified'):
+      first = self.sample('a.osm', mode=mode, n=5, seed=3)
+      self.assertEqual(self.sample('b.osm', mode=mode, n=5, seed=3), first)
+      self.assertNotEqual(self.sample('c.osm', mode=mode, n=5, seed=4), first)
+
+  def test_reservoir_in_file_order(self):
+    keys = self.sample(mode='reservoir', n=10, seed=1)
+    order = list(self.records)
+    self.assertEqual(len(keys), 10)
+    self.assertEqual(keys, sorted(keys, key=order.index))
+
+  def test_each_stratum_has_n_elements(self):
+    keys = self.sample(mode='stratified', n=4, seed=1)
+    self.assertEqual(sorted(t for t, id in keys), ['node'] * 4 + ['relation'] * 4 + ['way'] * 4)
+
+    keys = self.sample(mode='stratified', n=2, seed=1, strata='feature')
+    strata = [amostra_arquivo.get_stratum(self.records[key], 'feature') for key in keys]
+    self.assertEqual(sorted(strata), sorted(['node', 'node:amenity', 'way', 'way:highway', 'relation'] * 2))
+
+  def test_complete_has_the_references(self):
+    keys = set(self.sample(mode='stratified', n=3, seed=2, complete=True))
+    for key in [k for k in keys if k[0] != 'node']:
+      record = self.records[key]
+      references = [('node', ref) for ref in record.node_refs]
+      references += [(member.get('type'), member.get('ref')) for member in record.members]
+      # as referencias que nao estao no arquivo (node 999 e way 9999) sao ignoradas
+      self.assertTrue(set(r for r in references if r in self.records) <= keys, key)
+    # as sub relations levam as suas ways e os nodes delas
+    self.assertIn(('relation', '200'), keys)
+    self.assertTrue(set(('node', ref) for ref in self.records[('way', '100')].node_refs if ref != '999') <= keys)
+
+  def test_fast(self):
+    self.assertEqual(self.sample(mode='reservoir', n=3, fast=True), [('node', '1'), ('node', '2'), ('node', '3')])
+    self.assertEqual(len(self.sample(mode='stratified', n=2, fast=True)), 6)
+    with self.assertRaises(ValueError):
+      self.sample(mode='stratified', n=2, fast=True, strata='feature')
+    with self.assertRaises(ValueError):
+      self.sample(mode='reservoir', n=2, fast=True, seed=1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import data_wrangling
+
+TAGS = [
+  ('addr:street', 'Broadway St'), ('addr:street', 'W 34th Street'), ('addr:postcode', '10001'),
+  ('addr:postcode', 'NY 10002-1234'), ('postal_code', '10003'), ('amenity', 'cafe'), ('wheelchair', 'yes'),
+  ('oneway', 'no'), ('toilets', 'yes (paid)'), ('maxspeed:conditional', '30 @ (Mo-Fr 07:00-09:00)'),
+  ('opening_hours', 'Mo-Fr 08:00-18:00'), ('name', "Joe's"), ('name:en', 'Joe'), ('Bad Key', 'x'),
+  ('building.part', 'yes'), ('highway', 'residential'),
+]
+
+
+def write_osm(path, rng):
+  """Nodes, ways and relations with random tags, some of them with user and visible"""
+  with io.open(path, 'w', encoding='utf-8') as fo:
+    fo.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+    for id in range(1, 61):
+      extra = ' user="ana" uid="7"' if id % 3 else ' visible="true"'
+      tags = ''.join('  <tag k="{0}" v="{1}"/>\n'.format(k, v.replace("'", '&apos;'))
+                     for k, v in rng.sample(TAGS, rng.randint(0, 4)))
+      fo.write(' <node id="{0}" version="1" lat="40.7" lon="-74.0"{1}>\n{2} </node>\n'.format(id, extra, tags))
+    for id in range(100, 115):
+      refs = ''.join('  <nd ref="{0}"/>\n'.format(ref) for ref in rng.sample(range(1, 61), 3))
+      tags = ''.join('  <tag k="{0}" v="{1}"/>\n'.format(k, v.replace("'", '&apos;'))
+                     for k, v in rng.sample(TAGS, rng.randint(0, 3)))
+      fo.write(' <way id="{0}" version="1">\n{1}{2} </way>\n'.format(id, refs, tags))
+    for id in range(200, 205):
+      fo.write(' <relation id="{0}" version="1">\n  <member type="way" ref="100" role="outer"/>\n'
+               '  <tag k="type" v="multipolygon"/>\n </relation>\n'.format(id))
+    fo.write('</osm>\n')
+
+
+class AuditElementsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, 'map.osm')
+    write_osm(self.filename, random.Random(5))
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def audit_each(self, new_keys=None):
+    auditing = data_wrangling.new_auditing_state()
+    for element in data_wrangling.iter_elements(self.filename):
+      data_wrangling.audit_main_element(auditing, element, new_keys)
+    return auditing
+
+  def audit_batches(self, size, new_keys=None):
+    auditing = data_wrangling.new_auditing_state()
+    for elements in data_wrangling.iter_batches(data_wrangling.iter_elements(self.filename), size):
+      data_wrangling.audit_elements(auditing, elements, new_keys)
+    return auditing
+
+  def test_same_auditing_of_each_element(self):
+    expected = self.audit_each()
+    self.assertTrue(expected['street_address'])
+    self.assertTrue(expected['tag_k_v_yes_no_auditing'])
+    for size in [1, 7, 1000]:
+      auditing = self.audit_batches(size)
+      for section in ['tags_auditing', 'tag_k_auditing', 'street_address']:
+        self.assertEqual(auditing[section], expected[section], (section, size))
+        # as chaves ficam na ordem em que foram encontradas
+        self.assertEqual(list(auditing[section]), list(expected[section]), (section, size))
+      for section in ['postal_code', 'tag_k_v_yes_no_auditing']:
+        self.assertEqual(auditing[section], expected[section], (section, size))
+
+  def test_new_restrictions_keys_in_the_same_order(self):
+    expected = []
+    self.audit_each(expected)
+    found = []
+    self.audit_batches(7, found)
+    self.assertEqual(found, expected)
+
+  def test_batch_sizes(self):
+    self.assertEqual([len(b) for b in data_wrangling.iter_batches(range(10), 4)], [4, 4, 2])
+    self.assertEqual(list(data_wrangling.iter_batches([], 4)), [])
+
+  def test_restrictions_key(self):
+    self.assertTrue(data_wrangling.is_restrictions_key('wheelchair', 'yes'))
+    self.assertTrue(data_wrangling.is_restrictions_key('toilets', 'no (broken)'))
+    self.assertTrue(data_wrangling.is_restrictions_key('maxspeed:conditional', '30 @ wet'))
+    self.assertTrue(data_wrangling.is_restrictions_key('opening_hours', '24/7'))
+    self.assertFalse(data_wrangling.is_restrictions_key('amenity', 'yesterday'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import data_wrangling
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n'
+NODE = (' <node id="{0}" version="1" lat="40.7{0}" lon="-74.0{0}">\n'
+        '  <tag k="name" v="Joe\'s Pizza {0}"/>\n  <tag k="addr:street" v="Broadway St"/>\n </node>\n')
+NODES = 60
+
+
+class Interrupted(Exception):
+  pass
+
+
+def write_osm(path):
+  with io.open(path, 'w', encoding='utf-8') as fo:
+    fo.write(HEADER)
+    for id in range(1, NODES + 1):
+      fo.write(NODE.format(id))
+    fo.write('</osm>\n')
+
+
+class CheckpointTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.process_json = data_wrangling.process_json
+
+  def tearDown(self):
+    data_wrangling.process_json = self.process_json
+    shutil.rmtree(self.directory)
+
+  def run_main(self, filename, **kwargs):
+    data_wrangling.reset_normalize_cache_stats()
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(filename, **kwargs)
+    with open(filename + '.json') as fi:
+      return fi.read()
+
+  def interrupt_after(self, count):
+    processed = []
+
+    def process_json(element, restrictions_keys):
+      processed.append(element)
+      if len(processed) == count:
+        raise Interrupted()
+      return self.process_json(element, restrictions_keys)
+    data_wrangling.process_json = process_json
+
+  def interrupted_run(self, filename, checkpoint_size):
+    self.interrupt_after(NODES // 2)
+    with self.assertRaises(Interrupted):
+      self.run_main(filename, checkpoint=True, checkpoint_size=checkpoint_size)
+    data_wrangling.process_json = self.process_json
+    with open(filename + '-checkpoint.json') as fi:
+      return json.load(fi)
+
+  def expected(self):
+    full = os.path.join(self.directory, 'full.osm')
+    write_osm(full)
+    return self.run_main(full).replace('full.osm', 'map.osm')
+
+  def test_resume_with_another_checkpoint_size(self):
+    filename = os.path.join(self.directory, 'map.osm')
+    write_osm(filename)
+    checkpoint = self.interrupted_run(filename, 1000)
+    self.assertEqual(checkpoint['checkpoint_size'], 1000)
+    self.assertGreater(checkpoint['offset'], 0)
+
+    self.assertEqual(self.run_main(filename, checkpoint=True, checkpoint_size=7000), self.expected())
+    self.assertFalse(os.path.exists(filename + '-checkpoint.json'))
+
+  def test_resume_a_checkpoint_without_the_ranges(self):
+    filename = os.path.join(self.directory, 'map.osm')
+    write_osm(filename)
+    checkpoint = self.interrupted_run(filename, 1000)
+    del checkpoint['shards'], checkpoint['checkpoint_size']
+    with open(filename + '-checkpoint.json', 'w') as fo:
+      json.dump(checkpoint, fo)
+
+    self.assertEqual(self.run_main(filename, checkpoint=True, checkpoint_size=7000), self.expected())
+
+
+class SplitShardsAtTest(unittest.TestCase):
+
+  def test_splits_the_range_with_the_offset(self):
+    shards = [(0, 10), (10, 20), (20, 30)]
+    self.assertEqual(data_wrangling.split_shards_at(shards, 15), [(0, 10), (10, 15), (15, 20), (20, 30)])
+    self.assertEqual(data_wrangling.split_shards_at(shards, 20), shards)
+
+
+if __name__ == '__main__':
+  unittest.main()
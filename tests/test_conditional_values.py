@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+import data_wrangling
+
+parse = data_wrangling.normalize_and_clean_conditional_values_from_nodes
+
+MO_FR = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+
+def baseline(conditional, node_key):
+  """The parser before the single pass, built from the helpers it used"""
+  conditional = conditional.replace('&lt;=', ' <= ').replace('&gt;=', ' >= ').replace('&lt;', ' < ').replace('&gt;', ' > ').replace('&quot;', '"')
+  conditional = conditional.replace(', ', ',').replace(' ,', ',').replace('- ', '-').replace(' -', '-').lower()
+  rules = conditional.split(';') if node_key == 'opening_hours' else conditional.split(');')
+  result = {}
+  for rule in rules:
+    if node_key == 'opening_hours':
+      rule = 'yes @ ' + rule
+    value_splited = data_wrangling.strip_and_remove_parentesis(rule).split('@')
+    key = data_wrangling.strip_and_remove_parentesis(value_splited[0])
+    value = data_wrangling.strip_and_remove_parentesis(value_splited[1]) if len(value_splited) > 1 else None
+    condition_map = data_wrangling.normalize_condition_rule(value, result.get(key, {}))
+    if condition_map is None and len(rules) == 1:
+      result = key
+    elif condition_map is None:
+      result[key] = key
+    else:
+      result[key] = condition_map
+  return result
+
+
+class ConditionalValuesTest(unittest.TestCase):
+
+  def test_opening_hours(self):
+    self.assertEqual(parse('Mo-Fr 08:00-18:00', 'opening_hours'),
+                     {'yes': dict((day, ['08:00-18:00']) for day in MO_FR)})
+    self.assertEqual(parse('Sa, Su 10:00-14:00, 15:00 - 19:00; PH off', 'opening_hours'),
+                     {'yes': {'saturday': ['10:00-14:00', '15:00-19:00'], 'sunday': ['10:00-14:00', '15:00-19:00'],
+                              'ph off': []}})
+    self.assertEqual(parse('Mo-Fr 10:00-08:00; Sa,Su', 'opening_hours'),
+                     {'yes': dict([(day, ['10:00-08:00']) for day in MO_FR] +
+                                  [('saturday', ['00:00-24:00']), ('sunday', ['00:00-24:00'])])})
+    self.assertEqual(parse('', 'opening_hours'), 'yes')
+
+  def test_repeated_days(self):
+    # as listas de horarios sao compartilhadas pelos dias da mesma condicao, como no parser original
+    self.assertEqual(parse('Mo 08:00-12:00; Mo,Tu 14:00-18:00', 'opening_hours'),
+                     {'yes': {'monday': ['08:00-12:00', ['14:00-18:00']], 'tuesday': ['14:00-18:00']}})
+
+  def test_conditionals(self):
+    conditional = ('no_left_turn @ (Mo-Fr 06:00-10:00,15:00-19:00); yes @ (axles&gt;=5 AND weight&lt;80 st); '
+                   'permissive @ (Mo-Fr 07:00-22:00; SH off)')
+    self.assertEqual(parse(conditional, 'turn:conditional'), {
+      'no_left_turn': dict((day, ['06:00-10:00', '15:00-19:00']) for day in MO_FR),
+      'yes': {'axles >= 5 and weight < 80 st': []},
+      'permissive': dict([(day, ['07:00-22:00']) for day in MO_FR] + [(' sh off', [])])})
+    self.assertEqual(parse('no_left_turn', 'turn:conditional'), 'no_left_turn')
+    self.assertEqual(parse('delivery @ (Mo-Sa); no', 'access:conditional'),
+                     {'delivery': dict((day, ['00:00-24:00']) for day in MO_FR + ['saturday']), 'no': 'no'})
+
+  def test_rule_without_conditions_keeps_the_conditions(self):
+    self.assertEqual(parse('Mo-Fr 08:00-18:00;', 'opening_hours'),
+                     {'yes': dict((day, ['08:00-18:00']) for day in MO_FR)})
+    self.assertEqual(parse(';yes', 'opening_hours'), {'yes': {'yes': []}})
+    self.assertEqual(parse('Tu 08:00-18:00);08:00-18:00Sa);; WeFr', 'opening_hours'),
+                     {'yes': {'tuesday': ['08:00-18:00'], '08:00-18:00sa': [], 'wefr': []}})
+    self.assertEqual(parse('no @ (Sa); no', 'access:conditional'),
+                     {'no': {'saturday': ['00:00-24:00']}})
+    self.assertEqual(parse('no); no @ (Sa)', 'access:conditional'),
+                     {'no': {'saturday': ['00:00-24:00']}})
+
+  def test_same_result_of_the_baseline(self):
+    rng = random.Random(7)
+    days = ['Mo-Fr', 'Mo-Su', 'Sa', 'Su', 'Sa,Su', 'Mo, We', 'Tu-Th', 'PH', 'SH', 'Fr']
+    hours = ['08:00-18:00', '10:00 - 14:00, 15:00-19:00', 'off', '', '00:00-24:00', '12:00-02:00']
+    others = ['wet', 'axles=2 AND weight&lt;40 st', 'weight &gt;= 7.5', 'destination', 'snow']
+    keys = ['yes', 'no', 'no_left_turn', 'destination', '60', 'delivery']
+
+    def condition():
+      if rng.random() < 0.2:
+        return rng.choice(others)
+      return (rng.choice(days) + ' ' + rng.choice(hours)).strip()
+
+    for i in range(5000):
+      if rng.random() < 0.5:
+        value, node_key = '; '.join(condition() for j in range(rng.randint(1, 4))), 'opening_hours'
+      else:
+        rules = ['{0} @ ({1})'.format(rng.choice(keys), '; '.join(condition() for j in range(rng.randint(1, 3))))
+                 for k in range(rng.randint(1, 4))]
+        value, node_key = rng.choice([';', '; ']).join(rules), 'maxspeed:conditional'
+      self.assertEqual(parse(value, node_key), baseline(value, node_key), value)
+
+  def test_malformed_values_do_not_raise(self):
+    rng = random.Random(11)
+    pieces = ['Mo', 'Tu-Fr', 'Sa', 'yes', 'no', '08:00-18:00', ' ', ';', ');', '(', ')', '@', ',', '-', '&lt;']
+    for i in range(20000):
+      value = ''.join(rng.choice(pieces) for j in range(rng.randint(0, 12)))
+      for node_key in ('opening_hours', 'maxspeed:conditional'):
+        self.assertIsInstance(parse(value, node_key), (dict, str, type(None)), value)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import data_insert_in_mongodb as loader
+
+DOCUMENTS = [
+  {'id': '1', 'type': 'node', 'name': 'a, [b] {c}', 'pos': [40.7, -74.0]},
+  {'id': '2', 'type': 'way', 'node_refs': ['1', '3'], 'name': 'quote " and \\\\ ]'},
+  None,
+  {'id': '3', 'type': 'relation', 'members': [{'type': 'way', 'ref': '2', 'role': ''}], 'name': 'ç'},
+]
+
+
+class FailingCollection(object):
+  """Adds the _id like the pymongo and fails the documents of the indexes, or every one with error"""
+
+  def __init__(self, indexes=(), error=None):
+    self.indexes = indexes
+    self.error = error
+
+  def insert_many(self, documents, ordered=True):
+    for i, document in enumerate(documents):
+      document.setdefault('_id', i)
+    if self.error is not None:
+      raise self.error
+    raise loader.BulkWriteError({'nInserted': len(documents) - len(self.indexes),
+                                 'writeErrors': [{'index': i, 'errmsg': 'duplicate'} for i in self.indexes]})
+
+
+class IterJsonArrayTest(unittest.TestCase):
+
+  def test_small_read_windows(self):
+    text = json.dumps(DOCUMENTS, ensure_ascii=False)
+    for read_size in [1, 2, 3, 7, 64, len(text) + 1]:
+      self.assertEqual(list(loader.iter_json_array(io.StringIO(text), read_size)), DOCUMENTS)
+
+  def test_spaces_and_empty_array(self):
+    self.assertEqual(list(loader.iter_json_array(io.StringIO('  [ ]  '), 1)), [])
+    self.assertEqual(list(loader.iter_json_array(io.StringIO('\n[ {"a": 1} ,\n {"b": [2]} ]\n'), 2)),
+                     [{'a': 1}, {'b': [2]}])
+
+  def test_invalid_json(self):
+    with self.assertRaises(ValueError):
+      list(loader.iter_json_array(io.StringIO('{"a": 1}'), 4))
+    with self.assertRaises(ValueError):
+      list(loader.iter_json_array(io.StringIO('[{"a": 1}, {"b"'), 4))
+
+  def test_rejected_like_json_load(self):
+    for text in ['[1 2]', '[,,1,,]', '[{"a":1}{"b":2}]', '[1,]', '[,1]', '[1,,2]', '[', '[1', '[1,', '[1] 2',
+                 '[1]]', '']:
+      with self.assertRaises(ValueError):
+        json.loads(text)
+      for read_size in [1, 2, 64]:
+        with self.assertRaises(ValueError, msg=(text, read_size)):
+          list(loader.iter_json_array(io.StringIO(text), read_size))
+
+  def test_accepted_like_json_load(self):
+    for text in ['[1,2]', ' [ 1 , 2 ] ', '[\n1,\n2\n]\n', '[[1,2],{"a":[3]}]', '[]', '[ ]', '[null]']:
+      for read_size in [1, 2, 64]:
+        self.assertEqual(list(loader.iter_json_array(io.StringIO(text), read_size)), json.loads(text), text)
+
+
+class ReadDocumentsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def write(self, name, text):
+    path = os.path.join(self.directory, name)
+    with io.open(path, 'w', encoding='utf-8') as fo:
+      fo.write(text)
+    return path
+
+  def test_json_and_ndjson_skip_null(self):
+    expected = [d for d in DOCUMENTS if d is not None]
+    path = self.write('map.osm.json', json.dumps(DOCUMENTS))
+    self.assertEqual(list(loader.read_documents(path)), expected)
+    path = self.write('map.osm.ndjson', '\n'.join(json.dumps(d) for d in DOCUMENTS) + '\n\n')
+    self.assertEqual(list(loader.read_documents(path)), expected)
+
+  def test_compressed_file_opened_once(self):
+    expected = [d for d in DOCUMENTS if d is not None]
+    path = os.path.join(self.directory, 'map.osm.json.gz')
+    with gzip.open(path, 'wt', encoding='utf-8') as fo:
+      fo.write(' ' * (3 * loader.READ_SIZE) + json.dumps(DOCUMENTS))
+    opened = []
+    open_input = loader.osm_io.open_input
+
+    def counted(file_in):
+      opened.append(file_in)
+      return open_input(file_in)
+    loader.osm_io.open_input = counted
+    try:
+      self.assertEqual(list(loader.read_documents(path)), expected)
+    finally:
+      loader.osm_io.open_input = open_input
+    self.assertEqual(opened, [path])
+
+  def test_first_char_consumes_the_spaces(self):
+    f = io.TextIOWrapper(io.BufferedReader(io.BytesIO(b'\n\n  {"a": 1}\n')), encoding='utf-8')
+    self.assertEqual(loader.first_char(f), '{')
+    self.assertEqual(f.read(), '{"a": 1}\n')
+
+
+class GetBatchesTest(unittest.TestCase):
+
+  def test_batch_sizes(self):
+    self.assertEqual([len(b) for b in loader.get_batches(range(7), 3)], [3, 3, 1])
+    self.assertEqual([len(b) for b in loader.get_batches(range(6), 3)], [3, 3])
+    self.assertEqual(list(loader.get_batches([], 3)), [])
+    self.assertEqual([b for b in loader.get_batches(range(5), 2)], [[0, 1], [2, 3], [4]])
+
+
+class InsertBatchTest(unittest.TestCase):
+
+  def test_inserted(self):
+    collection = loader.MemoryCollection(keep_documents=True)
+    self.assertEqual(loader.insert_batch(collection, [{'id': '1'}, {'id': '2'}]), (2, []))
+    self.assertEqual([d['id'] for d in collection.documents], ['1', '2'])
+
+  def test_bulk_write_error_logs_the_documents_read(self):
+    batch = [{'id': '1'}, {'id': '2'}, {'id': '3', '_id': 'own'}]
+    inserted, failed = loader.insert_batch(FailingCollection(indexes=[1, 2]), batch)
+    self.assertEqual(inserted, 1)
+    self.assertEqual(failed, [({'id': '2'}, 'duplicate'), ({'id': '3', '_id': 'own'}, 'duplicate')])
+
+  def test_duplicate_id_in_memory_collection(self):
+    collection = loader.MemoryCollection(keep_documents=True)
+    loader.insert_batch(collection, [{'_id': 1, 'id': '1'}])
+    inserted, failed = loader.insert_batch(collection, [{'_id': 1, 'id': '1'}, {'_id': 2, 'id': '2'}])
+    self.assertEqual(inserted, 1)
+    self.assertEqual(len(failed), 1)
+    self.assertEqual(failed[0][0], {'_id': 1, 'id': '1'})
+    self.assertEqual(collection.count, 2)
+
+  def test_other_error_fails_the_whole_batch(self):
+    batch = [{'id': '1'}, {'id': '2'}]
+    inserted, failed = loader.insert_batch(FailingCollection(error=RuntimeError('connection')), batch)
+    self.assertEqual(inserted, 0)
+    self.assertEqual(failed, [({'id': '1'}, 'connection'), ({'id': '2'}, 'connection')])
+
+  def test_write_batch_errors(self):
+    fo = io.StringIO()
+    loader.write_batch_errors(fo, 3, [({'id': '2'}, 'duplicate')])
+    self.assertEqual(fo.getvalue(), str({'batch': 3, 'error': 'duplicate', 'document': {'id': '2'}}) + '\n')
+
+
+class MainTest(unittest.TestCase):
+
+  def test_main_with_memory_collection(self):
+    directory = tempfile.mkdtemp()
+    try:
+      path = os.path.join(directory, 'map.osm.json')
+      documents = [{'id': str(i), 'type': 'node'} for i in range(25)]
+      with open(path, 'w') as fo:
+        json.dump(documents, fo)
+      collection = loader.MemoryCollection(keep_documents=True)
+      loader.main(path, batch_size=4, connections=2, collection=collection)
+      self.assertEqual(sorted(int(d['id']) for d in collection.documents), list(range(25)))
+      with open(path + '-error-to-insert-json.log') as fi:
+        self.assertEqual(fi.read(), '')
+    finally:
+      shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import ast
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import data_wrangling
+import osm_state
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n'
+NODE = ' <node id="{0}" version="{1}" lat="40.7{0}" lon="-74.0{0}">\n{2} </node>\n'
+TAG = '  <tag k="{0}" v="{1}"/>\n'
+
+BEFORE = {
+  '1': ('1', [('name', 'Joe\'s Pizza'), ('addr:street', 'Broadway St')]),
+  '2': ('1', [('amenity', 'cafe'), ('wheelchair', 'yes')]),
+  '3': ('1', [('shop', 'books')]),
+  '5': ('1', [('highway', 'crossing'), ('crossing', 'zebra')]),
+}
+AFTER = {
+  '1': ('2', [('name', 'Joe\'s Pizza'), ('addr:street', 'Broadway Ave'), ('addr:postcode', '10001')]),
+  '3': ('1', [('shop', 'books')]),
+  '4': ('1', [('opening_hours', 'Mo-Fr 08:00-18:00'), ('amenity', 'bank')]),
+  '5': ('1', [('highway', 'crossing'), ('crossing', 'zebra')]),
+}
+
+
+def write_osm(path, nodes):
+  with io.open(path, 'w', encoding='utf-8') as fo:
+    fo.write(HEADER)
+    for id in sorted(nodes, key=int):
+      version, tags = nodes[id]
+      fo.write(NODE.format(id, version, ''.join(TAG.format(k, v.replace("'", '&apos;')) for k, v in tags)))
+    fo.write('</osm>\n')
+
+
+def auditing_sections(path):
+  """The sections of the auditing log without the cache of normalization, with the dicts and sets sorted"""
+  with open(path) as fi:
+    sections = re.split(r'=+\n=+[^\n]*=+\n=+\n', fi.read())[1:]
+
+  def normalize(value):
+    if isinstance(value, dict):
+      return sorted((repr(k), normalize(v)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+      return sorted(repr(v) for v in value)
+    if isinstance(value, list):
+      return [normalize(v) for v in value]
+    return value
+  return [normalize(ast.literal_eval(section.strip())) for section in sections if 'stats' not in section]
+
+
+class IncrementalTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def run_main(self, filename, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(filename, **kwargs)
+    with open(filename + '.json') as fi:
+      return json.load(fi)
+
+  def test_incremental_has_the_documents_of_a_full_execution(self):
+    incremental = os.path.join(self.directory, 'map.osm')
+    state = os.path.join(self.directory, 'state.db')
+    write_osm(incremental, BEFORE)
+    self.run_main(incremental, state_file=state)
+    write_osm(incremental, AFTER)
+    documents = self.run_main(incremental, state_file=state, incremental=True)
+
+    full = os.path.join(self.directory, 'full.osm')
+    write_osm(full, AFTER)
+    full_documents = self.run_main(full)
+
+    def key(document):
+      return json.dumps(document, sort_keys=True)
+    self.assertEqual(sorted(map(key, documents)), sorted(map(key, full_documents)))
+    # os criados ficam depois dos outros, nao na posicao do arquivo
+    self.assertEqual([d['id'] for d in full_documents], ['1', '3', '4', '5'])
+    self.assertEqual([d['id'] for d in documents], ['1', '3', '5', '4'])
+    self.assertEqual(auditing_sections(incremental + '-auditing.log'), auditing_sections(full + '-auditing.log'))
+
+    with open(incremental + '-changes.ndjson') as fi:
+      changes = [json.loads(line) for line in fi]
+    self.assertEqual(sorted((c['action'], c['id']) for c in changes), [('delete', '2'), ('upsert', '1'), ('upsert', '4')])
+
+
+class Interrupted(Exception):
+  pass
+
+
+class StateFileTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, 'map.osm')
+    self.state_file = os.path.join(self.directory, 'state.db')
+    write_osm(self.filename, BEFORE)
+    self.closed = []
+    self.close = osm_state.OSMState.close
+    closed = self.closed
+    close = self.close
+
+    def counted(state, commit=True):
+      closed.append(commit)
+      close(state, commit)
+    osm_state.OSMState.close = counted
+
+  def tearDown(self):
+    osm_state.OSMState.close = self.close
+    shutil.rmtree(self.directory)
+
+  def run_main(self, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(self.filename, state_file=self.state_file, **kwargs)
+
+  def test_options_checked_before_the_state_is_opened(self):
+    with self.assertRaises(ValueError):
+      self.run_main(checkpoint=True)
+    self.assertFalse(os.path.exists(self.state_file))
+
+  def test_state_closed_without_the_changes_after_an_error(self):
+    self.run_main()
+    self.assertEqual(self.closed, [True])
+    write_osm(self.filename, AFTER)
+
+    def write_json_documents(*args, **kwargs):
+      raise Interrupted()
+    original = data_wrangling.write_json_documents
+    data_wrangling.write_json_documents = write_json_documents
+    try:
+      with self.assertRaises(Interrupted):
+        self.run_main(incremental=True)
+    finally:
+      data_wrangling.write_json_documents = original
+    self.assertEqual(self.closed, [True, False])
+
+    state = osm_state.OSMState(self.state_file)
+    try:
+      self.assertEqual(state.keys(), ['node/1', 'node/2', 'node/3', 'node/5'])
+      self.assertEqual(state.get_version('node/1'), '1')
+    finally:
+      state.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import data_wrangling
+
+OSM = ('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n'
+       ' <node id="1" version="1" lat="40.71" lon="-74.01">\n  <tag k="amenity" v="cafe"/>\n </node>\n'
+       '</osm>\n')
+
+
+class Interrupted(Exception):
+  pass
+
+
+class MetricsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, 'map.osm')
+    with io.open(self.filename, 'w', encoding='utf-8') as fo:
+      fo.write(OSM)
+    self.functions = dict((name, getattr(data_wrangling, name)) for name in data_wrangling.INSTRUMENTED_FUNCTIONS)
+
+  def tearDown(self):
+    for name, function in self.functions.items():
+      setattr(data_wrangling, name, function)
+    shutil.rmtree(self.directory)
+
+  def run_main(self, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(self.filename, **kwargs)
+
+  def assert_restored(self):
+    self.assertIsNone(data_wrangling.metrics)
+    for name, function in self.functions.items():
+      self.assertIs(getattr(data_wrangling, name), function, name)
+
+  def test_without_options_nothing_is_measured(self):
+    set_metrics = data_wrangling.set_metrics
+    data_wrangling.set_metrics = None  # falha se o main instalar as metricas
+    try:
+      self.run_main()
+    finally:
+      data_wrangling.set_metrics = set_metrics
+    self.assertFalse(os.path.exists(self.filename + '-metrics.json'))
+
+  def test_metrics_file(self):
+    self.run_main(write_metrics=True)
+    with open(self.filename + '-metrics.json') as fi:
+      self.assertEqual(json.load(fi)['counters']['documents'], 1)
+    self.assert_restored()
+
+  def test_functions_restored_after_an_error(self):
+    def write_json_documents(*args, **kwargs):
+      raise Interrupted()
+    original = data_wrangling.write_json_documents
+    data_wrangling.write_json_documents = write_json_documents
+    try:
+      with self.assertRaises(Interrupted):
+        self.run_main(write_metrics=True)
+    finally:
+      data_wrangling.write_json_documents = original
+    self.assert_restored()
+    self.assertFalse(os.path.exists(self.filename + '-metrics.json'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import data_wrangling
+import osm_columnar
+
+OSM = '''<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+ <node id="1" visible="true" version="2" changeset="10" timestamp="2017-10-27T23:03:48Z" user="ana" uid="7" lat="40.71" lon="-74.01">
+  <tag k="name" v="Joe's Pizza"/>
+  <tag k="addr:street" v="Broadway St"/>
+  <tag k="addr:housenumber" v="12"/>
+  <tag k="addr:unit" v="3B"/>
+  <tag k="amenity" v="restaurant"/>
+  <tag k="opening_hours" v="Mo-Fr 08:00-18:00"/>
+ </node>
+ <node id="2" version="1" changeset="11" timestamp="2017-10-28T10:00:00Z" user="bia" uid="8" lat="40.72" lon="-74.02">
+  <tag k="addr:postcode" v="10001"/>
+ </node>
+ <node id="3" version="1" changeset="11" timestamp="2017-10-28T10:00:00Z" user="bia" uid="8" lat="40.73" lon="-74.03"/>
+ <way id="10" version="1" changeset="12" timestamp="2017-10-29T10:00:00Z" user="ana" uid="7">
+  <nd ref="1"/>
+  <nd ref="2"/>
+  <tag k="highway" v="residential"/>
+  <tag k="name" v="Broadway"/>
+ </way>
+ <relation id="20" version="1" changeset="13" timestamp="2017-10-30T10:00:00Z" user="ana" uid="7">
+  <member type="way" ref="10" role="outer"/>
+  <member type="node" ref="3" role=""/>
+  <tag k="type" v="route"/>
+ </relation>
+</osm>
+'''
+
+DOCUMENTS = [
+  {'id': '1', 'type': 'node', 'address': {'unit': '3B', 'street': 'MAIN'}, 'pos': [1.0, 2.0], 'name': 'a'},
+  {'id': '2', 'type': 'node', 'name': 'no created and no pos'},
+  {'type': 'way', 'id': '3', 'created': {'user': 'u', 'version': '1'}, 'node_refs': ['1', '2']},
+  {'id': '4', 'type': 'node', 'address': 'not a dict', 'pos': 'not a list', 'visible': 'true'},
+  {'id': '5', 'type': 'node', 'created': {'uid': '1', 'user': 'u', 'timestamp': 't', 'changeset': '2', 'version': '3'},
+   'address': {'street': 'BROADWAY'}},
+]
+
+
+def dumps(documents):
+  return [json.dumps(d) for d in documents]
+
+
+class ColumnarTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def write(self, documents, use_arrow):
+    path = os.path.join(self.directory, 'documents.' + ('parquet' if use_arrow else 'osmcol'))
+    writer = osm_columnar.ColumnarWriter(path, row_group_size=2, use_arrow=use_arrow)
+    for document in documents:
+      writer.add(document)
+    writer.close()
+    return path
+
+  def test_same_documents_of_the_json(self):
+    filename = os.path.join(self.directory, 'map.osm')
+    with io.open(filename, 'w', encoding='utf-8') as fo:
+      fo.write(OSM)
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(filename, columnar=True)
+    with open(filename + '.json') as fi:
+      documents = [d for d in json.load(fi) if d is not None]
+    self.assertTrue(any('address' in d and len(d) > 3 for d in documents))
+
+    read = list(osm_columnar.iter_documents(osm_columnar.columnar_filename(filename)))
+    self.assertEqual(dumps(read), dumps(documents))
+
+  def test_round_trip_without_arrow(self):
+    path = self.write(DOCUMENTS, use_arrow=False)
+    with open(path, 'rb') as fi:
+      self.assertEqual(fi.read(len(osm_columnar.MAGIC)), osm_columnar.MAGIC)
+    self.assertEqual(dumps(osm_columnar.iter_documents(path)), dumps(DOCUMENTS))
+
+  @unittest.skipIf(osm_columnar.pyarrow is None, 'pyarrow is not installed')
+  def test_round_trip_with_arrow(self):
+    path = self.write(DOCUMENTS, use_arrow=True)
+    self.assertEqual(dumps(osm_columnar.iter_documents(path)), dumps(DOCUMENTS))
+
+  @unittest.skipIf(osm_columnar.pyarrow is not None, 'pyarrow is installed')
+  def test_parquet_without_arrow(self):
+    path = os.path.join(self.directory, 'documents.parquet')
+    with open(path, 'wb') as fo:
+      fo.write(osm_columnar.PARQUET_MAGIC + b'\0' * 16)
+    with self.assertRaises(ValueError):
+      list(osm_columnar.iter_documents(path))
+
+  def test_columns_read(self):
+    path = self.write(DOCUMENTS, use_arrow=False)
+    rows = list(osm_columnar.iter_rows(path, ['id', 'lat', 'lon']))
+    self.assertEqual(rows[0], {'id': '1', 'lat': 1.0, 'lon': 2.0})
+    self.assertEqual(rows[1], {'id': '2', 'lat': None, 'lon': None})
+
+  def test_rows_written_before_the_keys_column(self):
+    document = DOCUMENTS[4]
+    split = osm_columnar.split_document(document)
+    row = dict((name, split.get(name)) for name, kind in osm_columnar.COLUMNS if name != 'keys')
+    self.assertEqual(osm_columnar.join_row(row), document)
+    self.assertEqual(list(osm_columnar.join_row(row))[-1], 'address')
+
+
+if __name__ == '__main__':
+  unittest.main()
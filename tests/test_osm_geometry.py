@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import osm_geometry
+
+
+def build_index(way_bbox_cache_size=osm_geometry.WAY_BBOX_CACHE_SIZE):
+  index = osm_geometry.GeometryIndex(way_bbox_cache_size=way_bbox_cache_size)
+  index.nodes.add(1, 1.0, 10.0)
+  index.nodes.add(2, 2.0, 20.0)
+  index.nodes.add(3, 3.0, 30.0)
+  index.ways.add(10, [1, 2])
+  index.ways.add(11, [2, 3])
+  index.relations[100] = [('way', 10, 'outer'), ('way', 11, 'outer'), ('relation', 101, '')]
+  index.relations[101] = [('way', 11, ''), ('node', 3, '')]
+  index.finish()
+  return index
+
+
+def count_geometries(index):
+  calls = []
+  way_geometry = index.way_geometry
+
+  def counted(id):
+    calls.append(id)
+    return way_geometry(id)
+  index.way_geometry = counted
+  return calls
+
+
+class ResolveDocumentTest(unittest.TestCase):
+
+  def test_way_bbox_from_its_geometry(self):
+    index = build_index()
+    calls = count_geometries(index)
+    document = osm_geometry.resolve_document({'type': 'way', 'id': '10'}, index)
+    self.assertEqual(document['geometry'], [[1.0, 10.0], [2.0, 20.0]])
+    self.assertEqual(document['bbox'], [1.0, 10.0, 2.0, 20.0])
+    self.assertEqual(calls, [10])
+
+  def test_relation_builds_each_way_once(self):
+    index = build_index()
+    calls = count_geometries(index)
+    members = [{'type': 'way', 'ref': '10', 'role': 'outer'}, {'type': 'way', 'ref': '11', 'role': 'outer'},
+               {'type': 'relation', 'ref': '101', 'role': ''}]
+    document = osm_geometry.resolve_document({'type': 'relation', 'id': '100', 'members': members}, index)
+    self.assertEqual(document['bbox'], [1.0, 10.0, 3.0, 30.0])
+    self.assertEqual(members[2]['bbox'], [2.0, 20.0, 3.0, 30.0])
+    self.assertEqual(sorted(calls), [10, 11])
+
+  def test_way_bbox_cache_is_bounded(self):
+    index = build_index(way_bbox_cache_size=1)
+    self.assertEqual(index.way_bbox(10), [1.0, 10.0, 2.0, 20.0])
+    self.assertEqual(index.way_bbox(11), [2.0, 20.0, 3.0, 30.0])
+    self.assertEqual(list(index.way_bboxes), [11])
+    self.assertIsNone(index.way_bbox(12))
+
+  def test_geometry_bbox_of_empty_geometry(self):
+    self.assertIsNone(osm_geometry.geometry_bbox([]))
+    self.assertIsNone(osm_geometry.geometry_bbox(None))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import osm_io
+
+OSM = b'<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n</osm>\n'
+
+
+class OpenInputZipTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'map.osm.zip')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def write_zip(self, members):
+    with zipfile.ZipFile(self.path, 'w') as archive:
+      for name, data in members:
+        archive.writestr(name, data)
+
+  def test_reads_the_osm_member(self):
+    self.write_zip([('readme.txt', b'leia'), ('map.osm', OSM)])
+    with osm_io.open_input(self.path) as fi:
+      self.assertEqual(fi.read(), OSM)
+
+  def test_close_closes_the_zip(self):
+    self.write_zip([('map.osm', OSM)])
+    fi = osm_io.open_input(self.path)
+    raw = fi.raw
+    self.assertEqual(fi.read(5), OSM[:5])
+    fi.close()
+    self.assertTrue(raw.member.closed)
+    self.assertIsNone(raw.archive.fp)
+
+  def test_zip_without_files(self):
+    self.write_zip([('data/', b'')])
+    with self.assertRaises(ValueError):
+      osm_io.open_input(self.path)
+
+
+if __name__ == '__main__':
+  unittest.main()
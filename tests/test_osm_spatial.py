@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import osm_spatial
+
+SQUARE = [(0.0, 0.0), (0.0, 10.0), (10.0, 10.0), (10.0, 0.0)]
+HOLE = [(4.0, 4.0), (4.0, 6.0), (6.0, 6.0), (6.0, 4.0)]
+
+
+class AreaTest(unittest.TestCase):
+
+  def test_bbox(self):
+    bbox = osm_spatial.parse_bbox('40.70,-74.02,40.80,-73.93')
+    self.assertTrue(bbox.contains(40.75, -73.98))
+    self.assertTrue(bbox.contains(40.70, -74.02))
+    self.assertFalse(bbox.contains(40.81, -73.98))
+    self.assertFalse(bbox.contains(40.75, -73.92))
+    with self.assertRaises(ValueError):
+      osm_spatial.parse_bbox('40.70,-74.02,40.80')
+
+  def test_polygon_with_hole(self):
+    polygon = osm_spatial.Polygon([SQUARE], [HOLE])
+    self.assertTrue(polygon.contains(2.0, 2.0))
+    self.assertFalse(polygon.contains(5.0, 5.0))
+    self.assertFalse(polygon.contains(11.0, 5.0))
+    self.assertFalse(polygon.contains(-1.0, -1.0))
+
+  def test_load_polygon(self):
+    directory = tempfile.mkdtemp()
+    try:
+      poly = os.path.join(directory, 'area.poly')
+      with open(poly, 'w') as fo:
+        fo.write('area\n1\n')
+        fo.writelines('  {1} {0}\n'.format(lat, lon) for lat, lon in SQUARE)
+        fo.write('END\n!2\n')
+        fo.writelines('  {1} {0}\n'.format(lat, lon) for lat, lon in HOLE)
+        fo.write('END\nEND\n')
+      geojson = os.path.join(directory, 'area.geojson')
+      with open(geojson, 'w') as fo:
+        json.dump({'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [
+          [[lon, lat] for lat, lon in SQUARE], [[lon, lat] for lat, lon in HOLE]]}}, fo)
+
+      for filename in (poly, geojson):
+        polygon = osm_spatial.load_polygon(filename)
+        self.assertTrue(polygon.contains(2.0, 2.0), filename)
+        self.assertFalse(polygon.contains(5.0, 5.0), filename)
+        self.assertFalse(polygon.contains(2.0, 12.0), filename)
+    finally:
+      shutil.rmtree(directory)
+
+
+class SpatialGridTest(unittest.TestCase):
+
+  def brute_force(self, points, lat, lon, metres):
+    found = [(osm_spatial.distance(lat, lon, p[0], p[1]), i) for i, p in enumerate(points)]
+    return sorted(i for d, i in found if d <= metres)
+
+  def grid_of(self, points, cell_size=osm_spatial.CELL_SIZE):
+    grid = osm_spatial.SpatialGrid(cell_size)
+    for i, (lat, lon) in enumerate(points):
+      grid.add(lat, lon, i)
+    return grid
+
+  def test_nearest_first(self):
+    grid = self.grid_of([(40.7484, -73.9857), (40.7490, -73.9857), (40.7600, -73.9857)])
+    found = grid.within(40.7484, -73.9857, 200)
+    self.assertEqual([item for d, item in found], [0, 1])
+    self.assertEqual(found[0][0], 0.0)
+
+  def test_near_the_pole(self):
+    points = [(89.9995, 0.0), (89.9995, 180.0), (89.995, -90.0), (-89.9995, 45.0)]
+    grid = self.grid_of(points)
+    self.assertEqual(sorted(item for d, item in grid.within(89.999, 0.0, 1000)), [0, 1, 2])
+    self.assertEqual([item for d, item in grid.within(-90.0, 0.0, 1000)], [3])
+
+  def test_across_the_antimeridian(self):
+    grid = self.grid_of([(0.0, 179.99), (0.0, -179.99), (0.0, 179.0)])
+    self.assertEqual([item for d, item in grid.within(0.0, 179.99, 5000)], [0, 1])
+    self.assertEqual([item for d, item in grid.within(0.0, -179.99, 5000)], [1, 0])
+
+  def test_same_items_of_the_brute_force(self):
+    rng = random.Random(42)
+    points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(300)]
+    points += [(rng.uniform(89, 90), rng.uniform(-180, 180)) for i in range(100)]
+    points += [(rng.uniform(-1, 1), rng.choice([-1, 1]) * rng.uniform(179, 180)) for i in range(100)]
+    grid = self.grid_of(points, cell_size=50000)
+    queries = [(rng.uniform(-90, 90), rng.uniform(-180, 180), rng.choice([1e4, 2e5, 3e6])) for i in range(30)]
+    queries += [(89.99, 10.0, 2e5), (0.0, 179.9, 2e5), (0.0, -179.9, 2e5), (10.0, 0.0, 2.5e7)]
+    for lat, lon, metres in queries:
+      self.assertEqual(sorted(item for d, item in grid.within(lat, lon, metres)),
+                       self.brute_force(points, lat, lon, metres), (lat, lon, metres))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import data_insert_in_mongodb
+import data_wrangling
+import osm_typed
+
+OSM = '''<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+ <node id="1" version="2" changeset="10" timestamp="2017-10-27T23:03:48Z" user="ana" uid="7" lat="40.71" lon="-74.01">
+  <tag k="amenity" v="cafe"/>
+ </node>
+ <node id="2" version="1" changeset="11" timestamp="2017-10-28T10:00:00Z" user="bia" uid="8" lat="40.72" lon="-74.02"/>
+ <way id="10" version="1" changeset="12" timestamp="2017-10-29T10:00:00Z" user="ana" uid="7">
+  <nd ref="1"/>
+  <nd ref="2"/>
+  <tag k="highway" v="residential"/>
+ </way>
+ <relation id="20" version="1" changeset="13" timestamp="2017-10-30T10:00:00Z" user="ana" uid="7">
+  <member type="way" ref="10" role="outer"/>
+  <member type="node" ref="2" role=""/>
+  <tag k="type" v="route"/>
+ </relation>
+</osm>
+'''
+
+DOCUMENT = {
+  'id': '20', 'type': 'relation',
+  'created': {'version': '3', 'changeset': '45', 'timestamp': '2017-10-27T23:03:48Z', 'user': 'ana', 'uid': '7'},
+  'node_refs': ['1', '2'],
+  'members': [{'type': 'way', 'ref': '10', 'role': 'outer'}, {'type': 'node', 'ref': '2', 'role': ''}],
+  'member_refs': {'way': ['10'], 'node': ['2'], 'roles': ['outer', '']},
+  'name': '12',
+}
+
+
+class TypedDocumentTest(unittest.TestCase):
+
+  def test_int_values(self):
+    typed = osm_typed.typed_document(DOCUMENT)
+    self.assertEqual(typed['id'], 20)
+    self.assertEqual(typed['created']['version'], 3)
+    self.assertEqual(typed['created']['changeset'], 45)
+    self.assertEqual(typed['created']['uid'], 7)
+    self.assertEqual(typed['created']['user'], 'ana')
+    self.assertEqual(typed['node_refs'], [1, 2])
+    self.assertEqual([m['ref'] for m in typed['members']], [10, 2])
+    self.assertEqual([m['role'] for m in typed['members']], ['outer', ''])
+    self.assertEqual(typed['member_refs'], {'way': [10], 'node': [2], 'roles': ['outer', '']})
+    # as tags continuam texto
+    self.assertEqual(typed['name'], '12')
+    # a ordem das chaves e o documento original nao mudam
+    self.assertEqual(list(typed), list(DOCUMENT))
+    self.assertEqual(list(typed['created']), list(DOCUMENT['created']))
+    self.assertEqual(DOCUMENT['id'], '20')
+    self.assertEqual(DOCUMENT['members'][0]['ref'], '10')
+
+  def test_texts_not_written_as_int(self):
+    document = {'id': '007', 'created': {'version': '+1', 'uid': ' 7', 'changeset': 'x'}, 'node_refs': ['01', '2']}
+    typed = osm_typed.typed_document(document)
+    self.assertEqual(typed['id'], '007')
+    self.assertEqual(typed['created'], {'version': '+1', 'uid': ' 7', 'changeset': 'x'})
+    self.assertEqual(typed['node_refs'], ['01', 2])
+
+  def test_timestamp(self):
+    typed = osm_typed.typed_document(DOCUMENT)
+    self.assertEqual(typed['created']['timestamp'], 1509145428)
+    typed = osm_typed.typed_document(DOCUMENT, native_datetime=True)
+    self.assertEqual(typed['created']['timestamp'], datetime(2017, 10, 27, 23, 3, 48))
+
+    self.assertEqual(osm_typed.parse_timestamp('1970-01-01T00:00:00Z'), 0)
+    for value in ['2017-02-30T10:00:00Z', '2017-10-27 23:03:48', '2017-10-27T23:03:48Z ', '']:
+      self.assertEqual(osm_typed.parse_timestamp(value), value)
+      self.assertEqual(osm_typed.to_datetime(value), value)
+    self.assertEqual(osm_typed.to_datetime(0), datetime(1970, 1, 1))
+    self.assertIs(osm_typed.to_datetime(True), True)
+
+  def test_typed_document_again(self):
+    typed = osm_typed.typed_document(DOCUMENT)
+    self.assertEqual(osm_typed.typed_document(typed), typed)
+    self.assertEqual(osm_typed.typed_document(typed, native_datetime=True),
+                     osm_typed.typed_document(DOCUMENT, native_datetime=True))
+
+  def test_not_documents(self):
+    self.assertIsNone(osm_typed.typed_document(None))
+    document = {'id': '1', 'created': 'x', 'node_refs': 'x', 'members': ['x', {'type': 'node'}], 'member_refs': []}
+    self.assertEqual(osm_typed.typed_document(document), dict(document, id=1))
+
+
+class ConvertFileTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.filename = os.path.join(self.directory, 'map.osm')
+    with io.open(self.filename, 'w', encoding='utf-8') as fo:
+      fo.write(OSM)
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(self.filename)
+    with open(self.filename + '.json') as fi:
+      self.documents = json.load(fi)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_output_format(self):
+    self.assertEqual(osm_typed.output_format_of('map.ndjson'), 'ndjson')
+    self.assertEqual(osm_typed.output_format_of('map.ndjson.gz'), 'ndjson')
+    self.assertEqual(osm_typed.output_format_of('map.json.bz2'), 'json')
+    self.assertEqual(osm_typed.output_format_of('map.ndjson.txt'), 'json')
+
+  def test_convert_file(self):
+    expected = [osm_typed.typed_document(d) for d in self.documents]
+    self.assertEqual([d['id'] for d in expected if d is not None], [1, 2, 10, 20])
+
+    for name in ['typed.json', 'typed.ndjson', 'typed.ndjson.gz']:
+      file_out = os.path.join(self.directory, name)
+      self.assertEqual(osm_typed.convert_file(self.filename + '.json', file_out), len(self.documents))
+      self.assertEqual(list(data_insert_in_mongodb.read_documents(file_out)), expected, name)
+    with open(os.path.join(self.directory, 'typed.ndjson')) as fi:
+      self.assertEqual(len(fi.read().splitlines()), len(self.documents))
+
+  def test_same_json_of_the_typed_export(self):
+    typed = os.path.join(self.directory, 'typed.osm')
+    shutil.copy(self.filename, typed)
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(typed, typed=True)
+    file_out = os.path.join(self.directory, 'converted.json')
+    osm_typed.convert_file(self.filename + '.json', file_out)
+    with open(file_out) as fi, open(typed + '.json') as fe:
+      self.assertEqual(fi.read(), fe.read())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import os
+import random
+import re
+import shutil
+import tempfile
+import unittest
+
+import data_wrangling
+from test_incremental import auditing_sections
+
+TAGS = [('name', "Joe's Pizza"), ('addr:street', 'Broadway St'), ('addr:postcode', '10001'), ('amenity', 'cafe'),
+        ('wheelchair', 'yes'), ('opening_hours', 'Mo-Fr 08:00-18:00'), ('highway', 'residential'),
+        ('maxspeed:conditional', '30 @ (Mo-Fr 07:00-09:00)'), ('name:en', 'Joe')]
+
+
+def write_osm(path, rng):
+  """Elements of several lines, so the byte offsets split by the number of shards fall inside them"""
+  with io.open(path, 'w', encoding='utf-8') as fo:
+    fo.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+    fo.write(' <bounds minlat="40.7" minlon="-74.1" maxlat="40.8" maxlon="-74.0"/>\n')
+    for id in range(1, 81):
+      tags = ''.join('  <tag k="{0}" v="{1}"/>\n'.format(k, v.replace("'", '&apos;'))
+                     for k, v in rng.sample(TAGS, rng.randint(0, 5)))
+      fo.write(' <node id="{0}" version="1" lat="40.7{0}" lon="-74.0{0}">\n{1} </node>\n'.format(id, tags))
+    for id in range(100, 120):
+      refs = ''.join('  <nd ref="{0}"/>\n'.format(ref) for ref in rng.sample(range(1, 81), 4))
+      fo.write(' <way id="{0}" version="1">\n{1}  <tag k="highway" v="residential"/>\n </way>\n'.format(id, refs))
+    for id in range(200, 206):
+      fo.write(' <relation id="{0}" version="1">\n  <member type="way" ref="{1}" role="outer"/>\n'
+               '  <tag k="type" v="route"/>\n </relation>\n'.format(id, 100 + id % 20))
+    fo.write('</osm>\n')
+
+
+class ParallelTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def write(self, name):
+    path = os.path.join(self.directory, name)
+    write_osm(path, random.Random(9))
+    return path
+
+  def test_shard_ranges_start_at_the_elements(self):
+    filename = self.write('map.osm')
+    with open(filename, 'rb') as fi:
+      data = fi.read()
+    starts = set(m.start() for m in re.finditer(rb'<(node|way|relation)[ >]', data))
+
+    for shards in [2, 3, 5, 8]:
+      ranges = data_wrangling.find_shard_ranges(filename, shards)
+      self.assertEqual(ranges[0][0], min(starts))
+      self.assertEqual(ranges[-1][1], data.rfind(b'</osm>'))
+      for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        self.assertEqual(end, next_start)
+      self.assertTrue(all(start in starts for start, end in ranges), shards)
+      # as divisoes pelo tamanho caem dentro dos elementos
+      step = (ranges[-1][1] - ranges[0][0]) // shards
+      self.assertFalse(all(ranges[0][0] + i * step in starts for i in range(1, shards)), shards)
+
+  def test_workers_same_documents(self):
+    shards = 3 * data_wrangling.SHARDS_PER_WORKER
+    self.assertEqual(len(data_wrangling.find_shard_ranges(self.write('map.osm'), shards)), shards)
+    single = self.write('single.osm')
+    parallel = self.write('parallel.osm')
+    with contextlib.redirect_stdout(io.StringIO()):
+      data_wrangling.main(single)
+      data_wrangling.main(parallel, workers=3)
+
+    with open(single + '.json') as fi:
+      expected = fi.read()
+    with open(parallel + '.json') as fi:
+      self.assertEqual(fi.read(), expected)
+    self.assertTrue(auditing_sections(single + '-auditing.log'))
+    self.assertEqual(auditing_sections(parallel + '-auditing.log'), auditing_sections(single + '-auditing.log'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+import data_wrangling
+from data_wrangling import lower, lower_colon, lower_dot, problemchars
+
+KEYS = ['amenity', 'addr:street', 'name:en', 'building.part', 'Bad Key', 'FIXME', 'a=b', 'note_1', 'x:y:z',
+        'tiger:name_base', 'is_in', '', 'a.b.c', 'ref:nyc.gov', 'name_1:en', 'é', 'a.b:c']
+
+
+def expected_category(key):
+  """The category by the three regexes tested by is_valid_key_from_tag before the key classes"""
+  if problemchars.search(key) is not None:
+    return 'problemchars'
+  for category, regex in (('lower', lower), ('lower_colon', lower_colon), ('lower_dot', lower_dot)):
+    if regex.search(key):
+      return category
+  return 'other'
+
+
+class TagKeyClassTest(unittest.TestCase):
+
+  def keys(self):
+    rng = random.Random(3)
+    alphabet = 'ab_:.Z1 -=é'
+    return KEYS + [''.join(rng.choice(alphabet) for i in range(rng.randint(1, 6))) for j in range(3000)]
+
+  def test_same_category_of_the_regexes(self):
+    for key in self.keys():
+      valid = bool(problemchars.search(key) is None and
+                   (lower.search(key) or lower_colon.search(key) or lower_dot.search(key)))
+      self.assertEqual(data_wrangling.get_key_category(key), expected_category(key), key)
+      # a segunda chamada vem do cache das classes
+      for i in range(2):
+        self.assertEqual(data_wrangling.get_tag_key_class(key)[0], expected_category(key), key)
+        self.assertEqual(data_wrangling.is_valid_key_from_tag(key), valid, key)
+      self.assertEqual(data_wrangling.get_tag_key_class(key)[1] is not None, valid, key)
+
+  def test_tag_key_stats(self):
+    # o ponto do lower_dot aceita qualquer caractere, o '.' e um problemchar
+    stats = data_wrangling.get_tag_key_stats({'amenity': 3, 'name:en': 2, 'note_1': 1, 'Bad Key': 4,
+                                              'building.part': 2, 'highway': 1})
+    self.assertEqual(stats['lower'], {'keys': 2, 'tags': 4})
+    self.assertEqual(stats['lower_colon'], {'keys': 1, 'tags': 2})
+    self.assertEqual(stats['lower_dot'], {'keys': 1, 'tags': 1})
+    self.assertEqual(stats['problemchars'], {'keys': 2, 'tags': 6})
+    self.assertEqual(stats['other'], {'keys': 0, 'tags': 0})
+
+
+if __name__ == '__main__':
+  unittest.main()